@@ -23,6 +23,14 @@ def load_actions() -> dict:
     with actions_path.open("r", encoding="utf-8") as f:
         return json.load(f)
 
+def load_canonical_schema() -> dict:
+    """
+    Lee configs/schema_canonico.json: columnas canónicas y sus alias normalizados.
+    """
+    schema_path = BASE_DIR / "configs" / "schema_canonico.json"
+    with schema_path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
 def load_env() -> dict:
     """
     Carga variables desde .env (si existe) y devuelve un diccionario
@@ -38,10 +46,12 @@ def load_env() -> dict:
     download_root = os.getenv("DOWNLOAD_ROOT", "./data/raw")
     staging_dir = os.getenv("STAGING_DIR", "./data/staging")
     final_dir = os.getenv("FINAL_DIR", "./data/final")
+    state_dir = os.getenv("STATE_DIR", "./data/state")
 
     return {
         "HEADLESS": headless,
         "DOWNLOAD_ROOT": download_root,
         "STAGING_DIR": staging_dir,
         "FINAL_DIR": final_dir,
+        "STATE_DIR": state_dir,
     }
@@ -0,0 +1,119 @@
+"""
+Consulta y reconstrucción del cubo de agregados (ver src/utils/aggregate_cube.py).
+
+  consultar:    suma dotación y remuneraciones agrupando por las dimensiones de
+                --por, sin abrir ningún CSV.
+  reconstruir:  recalcula todas las celdas desde los CSV en disco (mismo
+                recorrido por particiones que src.query) y las compara con el
+                cubo incremental; con --solo-verificar no escribe nada.
+
+Uso:
+    python -m src.cube consultar --por org year
+    python -m src.cube consultar --por mes --orgs MU322 --years 2023 --json
+    python -m src.cube reconstruir --solo-verificar
+"""
+import argparse
+import json
+from typing import Dict, Optional
+
+from src.config import load_env
+from src.query import iter_files
+from src.utils.aggregate_cube import DIMENSIONES, MEDIDAS, CuboAgregados, calcular_celda
+from src.utils.delta_store import leer_csv
+
+TOLERANCIA_MONTO = 0.005
+
+
+def _celdas_distintas(a: Dict, b: Dict) -> bool:
+    for medida in MEDIDAS:
+        x, y = a.get(medida, 0), b.get(medida, 0)
+        if medida in ("bruta", "liquida"):
+            if abs(x - y) > TOLERANCIA_MONTO * max(1.0, abs(y)):
+                return True
+        elif x != y:
+            return True
+    return False
+
+
+def reconstruir(cubo: CuboAgregados, orgs=None, tipos=None, years=None, months=None,
+                solo_verificar: bool = False, download_root: Optional[str] = None) -> Dict[str, int]:
+    """
+    Recalcula desde cero las celdas seleccionadas. Informa las que faltaban en
+    el cubo, las que difieren y las que sobran (su CSV ya no existe).
+    """
+    stats = {"archivos": 0, "iguales": 0, "distintas": 0, "faltantes": 0, "sobrantes": 0, "errores": 0}
+    vistas = set()
+    for archivo in iter_files(orgs, tipos, years, months, root=download_root or load_env()["DOWNLOAD_ROOT"]):
+        stats["archivos"] += 1
+        clave = cubo.clave(archivo.org, archivo.tipo, archivo.year, archivo.mes)
+        vistas.add(clave)
+        try:
+            nueva = calcular_celda(leer_csv(archivo.path))
+        except Exception as e:
+            stats["errores"] += 1
+            print(f"[WARN] No se pudo leer {archivo.path}: {e}")
+            continue
+        actual = cubo.celdas.get(clave)
+        if actual is None:
+            stats["faltantes"] += 1
+            print(f"[DIFF] {clave}: no estaba en el cubo")
+        elif _celdas_distintas(actual, nueva):
+            stats["distintas"] += 1
+            print(f"[DIFF] {clave}: " + ", ".join(f"{m} {actual.get(m, 0)} -> {nueva[m]}"
+                                                   for m in MEDIDAS if actual.get(m, 0) != nueva[m]))
+        else:
+            stats["iguales"] += 1
+            continue
+        if not solo_verificar:
+            cubo.fijar(clave, nueva)
+
+    filtros = [None if f is None else {str(v).upper() for v in f} for f in (orgs, tipos, years, months)]
+    for clave in list(cubo.celdas):
+        if clave in vistas:
+            continue
+        valores = clave.split("|")
+        if any(f is not None and v.upper() not in f for v, f in zip(valores, filtros)):
+            continue
+        stats["sobrantes"] += 1
+        print(f"[DIFF] {clave}: su CSV ya no existe")
+        if not solo_verificar:
+            cubo.quitar(clave)
+
+    if not solo_verificar:
+        cubo.guardar()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cubo de dotación y remuneraciones por org, tipo, año y mes.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_con = sub.add_parser("consultar", help="Agregar celdas del cubo")
+    p_rec = sub.add_parser("reconstruir", help="Recalcular el cubo desde los CSV y compararlo")
+    for p in (p_con, p_rec):
+        p.add_argument("--orgs", nargs="*", default=None)
+        p.add_argument("--tipos", nargs="*", default=None)
+        p.add_argument("--years", nargs="*", default=None)
+        p.add_argument("--months", nargs="*", default=None)
+    p_con.add_argument("--por", nargs="*", default=["org", "tipo", "year"], choices=DIMENSIONES,
+                       help="Dimensiones por las que agrupar")
+    p_con.add_argument("--json", action="store_true", help="Una fila JSON por línea")
+    p_rec.add_argument("--solo-verificar", action="store_true", help="Solo informar diferencias")
+    args = parser.parse_args()
+
+    cubo = CuboAgregados(load_env()["STATE_DIR"])
+    if args.comando == "reconstruir":
+        stats = reconstruir(cubo, args.orgs, args.tipos, args.years, args.months, args.solo_verificar)
+        print(f"\n[INFO] CSV: {stats['archivos']} | iguales: {stats['iguales']} | distintas: {stats['distintas']} | "
+              f"faltantes: {stats['faltantes']} | sobrantes: {stats['sobrantes']} | errores: {stats['errores']}")
+        return
+
+    for fila in cubo.consultar(args.por, args.orgs, args.tipos, args.years, args.months):
+        if args.json:
+            print(json.dumps(fila, ensure_ascii=False))
+        else:
+            print(" ".join(str(fila[d]) for d in args.por) + f" | celdas: {fila['celdas']} | filas: {fila['filas']} | "
+                  f"bruta: {fila['bruta']:,.0f} | líquida: {fila['liquida']:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Herramienta del almacén delta (ver src/utils/delta_store.py).
+
+  convertir:    pasa los CSV crudos ya descargados al almacén delta, mes a mes
+                en orden de calendario, y borra cada crudo una vez verificado
+                (salvo --keep-raw).
+  verificar:    reconstruye cada mes guardado y lo compara con su sha256 y, si el
+                crudo sigue en disco, byte a byte con él.
+  reconstruir:  escribe un mes reconstruido en --out (o en su ruta original).
+
+Uso:
+    python -m src.delta convertir --orgs MU322 --years 2023
+    python -m src.delta verificar
+    python -m src.delta reconstruir --org MU322 --tipo PLANTA --year 2023 --mes Enero --out /tmp/enero.csv
+"""
+import argparse
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Optional
+
+from src.config import load_env, load_settings
+from src.query import _normalizar, _subcarpetas, iter_files
+from src.utils.delta_store import (CARPETA_DELTA, DEFAULTS_DELTA_STORE, DeltaInvalido, GrupoDelta,
+                                   almacenar_csv)
+
+
+def convertir(orgs=None, tipos=None, years=None, download_root: Optional[str] = None,
+              keep_raw: bool = False) -> Dict[str, int]:
+    settings = load_settings()
+    config = {**DEFAULTS_DELTA_STORE, **(settings.get("delta_store") or {}), "keep_raw": keep_raw}
+    orden_meses = {m.upper(): i for i, m in enumerate(settings.get("months", []))}
+
+    grupos = defaultdict(list)
+    for archivo in iter_files(orgs, tipos, years, root=download_root or load_env()["DOWNLOAD_ROOT"]):
+        if archivo.path.exists():
+            grupos[archivo.path.parent].append(archivo)
+
+    stats = {"archivos": 0, "fallidos": 0, "bytes_crudos": 0, "bytes_delta": 0}
+    for carpeta, archivos in sorted(grupos.items()):
+        archivos.sort(key=lambda a: orden_meses.get(a.mes.upper(), len(orden_meses)))
+        for archivo in archivos:
+            largo = archivo.path.stat().st_size
+            if almacenar_csv(archivo.path, config):
+                stats["archivos"] += 1
+                stats["bytes_crudos"] += largo
+            else:
+                stats["fallidos"] += 1
+        meses = GrupoDelta(carpeta).meses
+        stats["bytes_delta"] += sum(meses[a.path.name].get("comprimido", 0) for a in archivos if a.path.name in meses)
+    return stats
+
+
+def verificar(orgs=None, tipos=None, years=None, download_root: Optional[str] = None) -> Dict[str, int]:
+    base = Path(download_root or load_env()["DOWNLOAD_ROOT"])
+    stats = {"meses": 0, "iguales_al_crudo": 0, "errores": 0}
+    for dir_org in _subcarpetas(base, _normalizar(orgs)):
+        for dir_tipo in _subcarpetas(dir_org, _normalizar(tipos)):
+            for dir_year in _subcarpetas(dir_tipo, _normalizar(years)):
+                if not (dir_year / CARPETA_DELTA).is_dir():
+                    continue
+                grupo = GrupoDelta(dir_year)
+                for nombre in grupo.manifiesto["orden"]:
+                    stats["meses"] += 1
+                    try:
+                        datos = grupo.reconstruir(nombre, desde_disco=True)
+                    except (OSError, ValueError, DeltaInvalido) as e:
+                        stats["errores"] += 1
+                        print(f"[ERROR] {dir_year / nombre}: {e}")
+                        continue
+                    crudo = dir_year / nombre
+                    if crudo.exists():
+                        if crudo.read_bytes() == datos:
+                            stats["iguales_al_crudo"] += 1
+                        else:
+                            stats["errores"] += 1
+                            print(f"[ERROR] {crudo}: el crudo difiere de la reconstrucción")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Almacén delta de los CSV mensuales.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_conv = sub.add_parser("convertir", help="Pasar los CSV crudos al almacén delta")
+    p_ver = sub.add_parser("verificar", help="Reconstruir y verificar todos los meses guardados")
+    for p in (p_conv, p_ver):
+        p.add_argument("--orgs", nargs="*", default=None)
+        p.add_argument("--tipos", nargs="*", default=None)
+        p.add_argument("--years", nargs="*", default=None)
+    p_conv.add_argument("--keep-raw", action="store_true", help="No borrar los CSV crudos")
+
+    p_rec = sub.add_parser("reconstruir", help="Escribir un mes reconstruido")
+    p_rec.add_argument("--org", required=True)
+    p_rec.add_argument("--tipo", required=True)
+    p_rec.add_argument("--year", required=True, type=int)
+    p_rec.add_argument("--mes", required=True)
+    p_rec.add_argument("--out", default=None, help="Archivo de salida (por defecto la ruta original del CSV)")
+    args = parser.parse_args()
+
+    if args.comando == "convertir":
+        stats = convertir(args.orgs, args.tipos, args.years, keep_raw=args.keep_raw)
+        ahorro = 1 - stats["bytes_delta"] / stats["bytes_crudos"] if stats["bytes_crudos"] else 0.0
+        print(f"\n[INFO] {stats['archivos']} CSV convertidos ({stats['fallidos']} fallidos) | "
+              f"{stats['bytes_crudos']} bytes crudos -> {stats['bytes_delta']} en delta ({ahorro:.1%} menos)")
+    elif args.comando == "verificar":
+        stats = verificar(args.orgs, args.tipos, args.years)
+        print(f"\n[INFO] Meses verificados: {stats['meses']} | iguales al crudo en disco: "
+              f"{stats['iguales_al_crudo']} | errores: {stats['errores']}")
+    else:
+        carpeta = Path(load_env()["DOWNLOAD_ROOT"]) / args.org / args.tipo / str(args.year)
+        nombre = f"{args.org}_{args.tipo}_{args.year}_{args.mes}.csv"
+        destino = Path(args.out) if args.out else carpeta / nombre
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        destino.write_bytes(GrupoDelta(carpeta).reconstruir(nombre))
+        print(f"[OK] {nombre} reconstruido en {destino}")
+
+
+if __name__ == "__main__":
+    main()
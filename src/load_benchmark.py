@@ -0,0 +1,174 @@
+"""
+Benchmark de la espera de carga (src/utils/page_readiness.py).
+
+Carga las mismas páginas con cada modo y mide desde driver.get hasta que la
+página se considera lista:
+
+  - readystate: pageLoadStrategy "normal" + sondeo de document.readyState,
+                como esperar_carga_municipio por defecto;
+  - eager:      pageLoadStrategy "eager" + MutationObserver;
+  - none:       pageLoadStrategy "none" + MutationObserver.
+
+Tras cada carga se comprueba que los enlaces de tipo de personal ya estén en
+el DOM (si no, la espera "terminó" antes de lo que la siguiente acción
+necesita). Por defecto se usan los primeros municipios de settings; con
+--sintetico, un servidor local sirve la página sintética de
+selector_benchmark con imágenes que tardan --retraso segundos.
+
+Uso:
+    python -m src.load_benchmark --orgs MU322 MU001 --rondas 3
+    python -m src.load_benchmark --sintetico --retraso 2
+"""
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+from src.config import load_actions, load_settings
+from src.selector_benchmark import pagina_sintetica
+from src.utils.navigation_helpers import obtener_modulo_generico
+from src.utils.page_readiness import esperar_nodos, marcar_documento, xpaths_de_carga
+
+MODOS = {
+    "readystate": "normal",
+    "eager": "eager",
+    "none": "none",
+}
+
+
+def servidor_sintetico(html: str, retraso: float, imagenes: int = 6) -> ThreadingHTTPServer:
+    """
+    Sirve la página en / y cada /lento/N responde tras `retraso` segundos. Las
+    imágenes se piden a "localhost" y la página a 127.0.0.1, como los recursos
+    de terceros del portal: así no ocupan las conexiones por host del documento.
+    """
+    cuerpo = html.replace("</body>", "".join(
+        f"<img src='//localhost:{{puerto}}/lento/{i}' width='1' height='1'>"
+        for i in range(imagenes)) + "</body>")
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/lento/"):
+                time.sleep(retraso)
+                datos, tipo = b"GIF89a", "image/gif"
+            else:
+                datos = cuerpo.replace("{puerto}", str(self.server.server_address[1])).encode("utf-8")
+                tipo = "text/html; charset=utf-8"
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", tipo)
+                self.send_header("Content-Length", str(len(datos)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(datos)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # el navegador ya se fue a la página siguiente
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def medir_carga(driver, modo: str, url: str, xpaths: List[str], xpaths_tipo: List[str],
+                timeout: float) -> Dict[str, Any]:
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    inicio = time.perf_counter()
+    try:
+        if modo == "readystate":
+            driver.get(url)
+            WebDriverWait(driver, timeout).until(
+                lambda d: d.execute_script("return document.readyState") == "complete"
+            )
+            motivo = "load"
+        else:
+            marcar_documento(driver)
+            driver.get(url)
+            motivo = esperar_nodos(driver, xpaths, timeout)
+    except Exception as e:
+        print(f"   [WARN] {modo}: {e}")
+        motivo = None
+    duracion = time.perf_counter() - inicio
+    tipo_listo = any(driver.find_elements(By.XPATH, xp) for xp in xpaths_tipo)
+    return {"t": duracion, "ok": motivo is not None, "motivo": motivo, "tipo_listo": tipo_listo}
+
+
+def resumir(modo: str, mediciones: List[Dict[str, Any]], base: Optional[float]) -> float:
+    tiempos = [m["t"] for m in mediciones if m["ok"]]
+    if not tiempos:
+        print(f"   [{modo:10}] sin cargas exitosas")
+        return 0.0
+    mediana = statistics.median(tiempos)
+    sin_tipo = sum(1 for m in mediciones if m["ok"] and not m["tipo_listo"])
+    motivos = {}
+    for m in mediciones:
+        motivos[m["motivo"]] = motivos.get(m["motivo"], 0) + 1
+    comparacion = f" | x{base / mediana:.1f} vs readystate" if base and mediana else ""
+    print(f"   [{modo:10}] mediana {mediana:.2f}s | media {statistics.mean(tiempos):.2f}s | "
+          f"máx {max(tiempos):.2f}s | {len(tiempos)}/{len(mediciones)} ok | "
+          f"sin enlaces de tipo: {sin_tipo} | {motivos}{comparacion}")
+    return mediana
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la espera por readyState con la espera por MutationObserver.")
+    parser.add_argument("--orgs", nargs="*", default=None, help="Municipios a cargar (por defecto los 3 primeros de settings)")
+    parser.add_argument("--sintetico", action="store_true", help="Usar un servidor local con recursos lentos")
+    parser.add_argument("--retraso", type=float, default=2.0, help="Segundos que tarda cada imagen sintética")
+    parser.add_argument("--rondas", type=int, default=3, help="Cargas por página y modo")
+    parser.add_argument("--timeout", type=float, default=30, help="Plazo de cada carga")
+    parser.add_argument("--modos", nargs="*", default=list(MODOS), choices=list(MODOS))
+    args = parser.parse_args()
+
+    from src.utils.browser_helpers import build_driver
+
+    settings = load_settings()
+    modulo = obtener_modulo_generico(load_actions())
+    xpaths = xpaths_de_carga(modulo)
+    xpaths_tipo = xpaths[:-1]
+
+    servidor = None
+    if args.sintetico:
+        years = list(range(settings["start_year"], settings["end_year"] + 1))
+        servidor = servidor_sintetico(pagina_sintetica(years, settings.get("months", [])), args.retraso)
+        urls = [("sintetica", f"http://127.0.0.1:{servidor.server_address[1]}/")]
+    else:
+        orgs = args.orgs or [o for o in settings.get("orgs", [])][:3]
+        if not orgs:
+            parser.error("No hay municipios: usa --orgs o --sintetico")
+        urls = [(org, modulo["url_pattern"].format(org=org)) for org in orgs]
+
+    print("=== BENCHMARK DE ESPERA DE CARGA ===")
+    print(f"Páginas: {len(urls)} | rondas: {args.rondas} | XPaths de espera: {len(xpaths)}")
+    resultados: Dict[str, List[Dict[str, Any]]] = {m: [] for m in args.modos}
+    try:
+        for modo in args.modos:
+            driver = build_driver(headless=True, download_root=tempfile.mkdtemp(),
+                                  page_load_strategy=MODOS[modo])
+            driver.set_page_load_timeout(args.timeout)
+            try:
+                for nombre, url in urls:
+                    for _ in range(args.rondas):
+                        resultados[modo].append(medir_carga(driver, modo, url, xpaths, xpaths_tipo, args.timeout))
+            finally:
+                driver.quit()
+    finally:
+        if servidor is not None:
+            servidor.shutdown()
+
+    print("\n[RESULTADO]")
+    base = resumir("readystate", resultados["readystate"], None) if "readystate" in resultados else None
+    for modo in args.modos:
+        if modo != "readystate":
+            resumir(modo, resultados[modo], base)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,52 @@
-from src.utils.browser_helpers import build_driver
-from src.utils.navigation_helpers import procesar_municipio, get_meses_para_year
+from src.utils.browser_helpers import build_driver, finalizar_registros
+from src.utils.navigation_helpers import procesar_municipio, obtener_modulo_generico
 from src.utils.logging_helpers import setup_detailed_logger, log_resumen_terminal
 from src.utils.logging_helpers import log_detallado_municipio
+from src.utils.http_engine import MotorHTTP
+from src.utils.rate_control import configurar_controlador
+from src.utils.snapshots import configurar_snapshots
+from src.utils.org_index import cargar_indice
+from src.utils.metrics import configurar_metricas
+from src.utils.selector_optimizer import configurar_optimizador
+from src.utils.delta_store import configurar_delta
+from src.utils.search_index import cargar_indice_busqueda
+from src.utils.aggregate_cube import cargar_cubo, guardar_cubo
+from src.utils.schema_registry import cargar_registro_esquemas, guardar_registro_esquemas
+from src.utils.postprocess import configurar_postproceso, cerrar_postproceso
+from src.utils.http_archive import configurar_archivo_http, iniciar_proxy_archivo, cerrar_archivo_http
+from src.utils.page_readiness import configuracion_carga, configurar_espera_carga
+from src.utils.negative_cache import cargar_cache_negativa
+from src.utils.download_journal import recuperar_descargas
+from src.utils.browser_profile import preparar_perfil, liberar_perfil
+from src.utils.planner import planificar, priorizar, imprimir_plan, registrar_tarea
 from src.config import load_settings, load_actions, load_env
 from pathlib import Path
-import os
+import argparse
 import time 
 import signal
 import sys 
 
-def obtener_lista_municipios(settings: dict) -> list[str]:
+def obtener_lista_municipios(settings: dict, indice=None) -> list[str]:
     orgs_config = settings.get("orgs") or []
     excluded = set(settings.get("excluded_orgs") or [])
 
     if orgs_config:
-        return [org for org in orgs_config if org not in excluded]
+        candidatos = [org for org in orgs_config if org not in excluded]
+    else:
+        org_start = settings.get("org_start")
+        org_end = settings.get("org_end")
+        todos=[f"MU{n:03d}" for n in range(org_start, org_end + 1)]
+        candidatos = [org for org in todos if org not in excluded]
 
-    org_start = settings.get("org_start")
-    org_end = settings.get("org_end")
-    todos=[f"MU{n:03d}" for n in range(org_start, org_end + 1)]
+    if indice is None:
+        return candidatos
 
-    return [org for org in todos if org not in excluded]
+    # Municipios clasificados como muertos (y aún dentro del TTL) no cuestan nada
+    vigentes = [org for org in candidatos if indice.estado_vigente(org) is None]
+    omitidos = len(candidatos) - len(vigentes)
+    if omitidos:
+        print(f"[INDICE] {omitidos} municipios omitidos por clasificación vigente: {indice.resumen()}")
+    return vigentes
 
 def safe_file_check(file_path):
     try:
@@ -47,32 +73,44 @@ def safe_file_check(file_path):
         print(f"[WARN] Error verificando archivo {file_path}: {e}")
         return False
 
-def limpiar_archivos_temporales(download_root: str):
-    download_dir = Path(download_root)
-    if not download_dir.exists():
-        return
-        
-    extensiones_temporales = [".crdownload", ".tmp", ".part", ".bak"]
-    archivos_eliminados = 0
-    
-    for archivo in download_dir.rglob("*"):
-        if archivo.is_file():
-            if any(archivo.name.endswith(ext) for ext in extensiones_temporales):
-                try:
-                    archivo.unlink()
-                    archivos_eliminados += 1
-                except:
-                    pass
-            elif archivo.suffix.lower() == ".csv":
-                try:
-                    if archivo.stat().st_size == 0:
-                        archivo.unlink()
-                        archivos_eliminados += 1
-                except:
-                    pass
-                    
-    if archivos_eliminados > 0:
-        print(f"[INFO] Se limpiaron {archivos_eliminados} archivos temporales")
+def _registrar_resultado(logger_detallado, org_code: str, year: int, duracion: float, resultados: dict):
+    detalle_por_tipo = resultados.get("detalle_por_tipo", {})
+    tipos_personal_resumen = {}
+
+    for tipo, datos_por_anio in detalle_por_tipo.items():
+        datos = datos_por_anio.get(year, {}) if isinstance(datos_por_anio, dict) else {}
+        meses_detalle = datos.get("meses_detalle", {}) or {}
+
+        algun_csv_ok = any(
+            (info.get("csv_status") == "ÉXITO")
+            for info in meses_detalle.values()
+        ) if meses_detalle else False
+
+        if meses_detalle:
+            csv_resumen = "ÉXITO" if algun_csv_ok else "FALLÓ"
+        else:
+            csv_resumen = "N/A"
+
+        tipos_personal_resumen[tipo] = {
+            'personal': 'ÉXITO' if datos.get('tipo_personal_ok') else 'FALLÓ',
+            'area': 'ÉXITO' if datos.get('area_municipal_ok') else 'FALLÓ',
+            'año': 'ÉXITO' if datos.get('anio_ok') else 'FALLÓ',
+            'meses': 'ÉXITO' if datos.get('meses_ok') else 'FALLÓ',
+            'CSV': csv_resumen,
+            'xpath_tipo': datos.get('xpath_tipo'),
+            'xpath_area': datos.get('xpath_area'),
+            'xpath_anio': datos.get('xpath_anio'),
+            'meses_detalle': meses_detalle,
+        }
+
+    resumen_dict = {
+        'acceso_municipio_exitoso': resultados.get('acceso_municipio_exitoso'),
+        'tipo_municipio_detectado': resultados.get('tipo_municipio_detectado'),
+        'tipos_personal': tipos_personal_resumen
+    }
+
+    log_detallado_municipio(logger_detallado, org_code, year, duracion, resumen_dict)
+    log_resumen_terminal(org_code, year, resumen_dict)
 
 def signal_handler(sig, frame):
     print(f"\n[INFO] Interrupción recibida. Cerrando...")
@@ -85,14 +123,18 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 def main():
+    parser = argparse.ArgumentParser(description="Scraper del Portal de Transparencia.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Mostrar el plan y la duración estimada sin abrir el navegador")
+    args = parser.parse_args()
+
     signal.signal(signal.SIGINT, signal_handler)
     
     settings = load_settings()
     actions = load_actions()
     env = load_env()
-    orgs = obtener_lista_municipios(settings)
-
-    logger_detallado = setup_detailed_logger()
+    indice = cargar_indice(settings, env["STATE_DIR"])
+    orgs = obtener_lista_municipios(settings, indice)
 
     print("=== CONFIGURACIÓN ===")
     print(f"Municipios a procesar: {len(orgs)}")
@@ -101,116 +143,135 @@ def main():
     print(f"Modo HEADLESS: {env['HEADLESS']}")
     print(f"Directorio descargas: {env['DOWNLOAD_ROOT']}")
 
-    limpiar_archivos_temporales(env["DOWNLOAD_ROOT"])
+    if not orgs:
+        print("[WARN] No hay municipios configurados.")
+        return
+
+    # Rehacer o limpiar lo que quedó en vuelo según el diario (sin recorrer el archivo)
+    if not args.dry_run:
+        configurar_delta(settings)
+        cargar_indice_busqueda(settings, env["STATE_DIR"])
+        cargar_cubo(settings, env["STATE_DIR"])
+        cargar_registro_esquemas(settings, env["STATE_DIR"])
+        recuperacion = recuperar_descargas(env["DOWNLOAD_ROOT"], env["STATE_DIR"])
+        # Los CSV recuperados pasan por los mismos registros que una descarga normal
+        for ruta in recuperacion["rutas"]:
+            finalizar_registros(ruta, env["DOWNLOAD_ROOT"])
+        guardar_registro_esquemas()
+        guardar_cubo()
+
+    # Planificar antes de lanzar Chrome: si no hay nada pendiente no se abre el navegador
+    plan = planificar(orgs, settings, env["DOWNLOAD_ROOT"],
+                      cargar_cache_negativa(settings, env["STATE_DIR"]))
+    priorizar(plan, settings, env["STATE_DIR"])
+    imprimir_plan(plan, settings, env["STATE_DIR"])
+    if args.dry_run:
+        return
+    if not plan.tareas:
+        print("[INFO] No hay trabajo pendiente. No se inicia el navegador.")
+        return
+
+    logger_detallado = setup_detailed_logger()
+
+    configurar_snapshots(settings)
+    configurar_optimizador(settings)
+    configurar_postproceso(settings)
+    configurar_archivo_http(settings)
+    configurar_espera_carga(settings, obtener_modulo_generico(actions))
+    metricas = configurar_metricas(settings)
+    controlador = configurar_controlador(settings)
+    if controlador is not None:
+        print(f"Control adaptativo: workers {controlador.min_workers}-{controlador.max_workers}, "
+              f"espaciado {controlador.min_delay}-{controlador.max_delay}s")
+
+    engine = settings.get("engine", "selenium")
+    if engine not in ("selenium", "http"):
+        print(f"[WARN] Motor desconocido '{engine}'; se usa selenium.")
+        engine = "selenium"
+    driver = None
+    perfil = preparar_perfil(settings)
+
+    def obtener_driver():
+        # El motor HTTP solo abre Chrome si algún municipio necesita el respaldo
+        nonlocal driver
+        if driver is None:
+            driver = build_driver(
+                headless=env["HEADLESS"],
+                download_root=env["DOWNLOAD_ROOT"],
+                user_data_dir=perfil["user_data_dir"] if perfil else None,
+                disk_cache_mb=perfil["disk_cache_mb"] if perfil else None,
+                proxy_server=iniciar_proxy_archivo(settings),
+                page_load_strategy=configuracion_carga(settings)["strategy"],
+            )
+            globals()['driver'] = driver
+            if metricas is not None:
+                metricas.driver(+1)
+            print("Driver inicializado correctamente.")
+        return driver
 
-    driver = build_driver(
-        headless=env["HEADLESS"],
-        download_root=env["DOWNLOAD_ROOT"],
-    )
-    
-    globals()['driver'] = driver
-    
     try:
-        print("Driver inicializado correctamente.")
+        if engine != "http":
+            obtener_driver()
         print("[INFO] Presiona Ctrl+C para detener.")
-        
-        if not orgs:
-            print("[WARN] No hay municipios configurados.")
-            return
+
+        tareas = plan.tareas
+        if metricas is not None:
+            metricas.planificar(len(tareas))
 
         tiempo_inicio = time.time()
         municipios_procesados = 0
         
-        for year in range(settings["start_year"], settings["end_year"] + 1):
-            print(f"\n[INFO] Procesando año: {year}")
-            meses_para_year = get_meses_para_year(year, settings)
-            if not meses_para_year:
-                print(f"[INFO] Año {year} no tiene meses completos. Se omite.")
-                continue
-            
-            for org_code in orgs:
-                try:
-                    print(f"\n[INFO] {'='*50}")
-                    print(f"[INFO] Municipio: {org_code} | Año: {year}")
-                    print(f"[INFO] Meses a procesar: {len(meses_para_year)}")
-                    
-                    tipos_personal = ["CONTRATA", "PLANTA"]
-                    archivos_completos = True
-
-                    # Verificar archivos existentes
-                    for tipo in tipos_personal:
-                        for mes in meses_para_year:
-                            nombre_csv = f"{org_code}_{tipo}_{year}_{mes}.csv"
-                            ruta_csv = os.path.join(env["DOWNLOAD_ROOT"], org_code, tipo, str(year), nombre_csv)
-                            
-                            if not safe_file_check(ruta_csv):
-                                archivos_completos = False
-                                break
-                        if not archivos_completos:
-                            break
-
-                    if archivos_completos:
-                        print(f"[SKIP] Todos los CSV ya existen para {org_code} en {year}.")
-                        continue
-
-                    # Procesar municipio
-                    t_inicio_muni = time.time()
-                    resultados = procesar_municipio(
-                        driver, org_code, settings, actions, 
-                        year=year, meses=meses_para_year
-                    )
-                    t_final_muni = time.time()
-                    duracion = t_final_muni - t_inicio_muni
-
-                    # Logging
-                    detalle_por_tipo = resultados.get("detalle_por_tipo", {})
-                    tipos_personal_resumen = {}
-
-                    for tipo, datos_por_anio in detalle_por_tipo.items():
-                        datos = datos_por_anio.get(year, {}) if isinstance(datos_por_anio, dict) else {}
-                        meses_detalle = datos.get("meses_detalle", {}) or {}
-
-                        algun_csv_ok = any(
-                            (info.get("csv_status") == "ÉXITO")
-                            for info in meses_detalle.values()
-                        ) if meses_detalle else False
-
-                        if meses_detalle:
-                            csv_resumen = "ÉXITO" if algun_csv_ok else "FALLÓ"
-                        else:
-                            csv_resumen = "N/A"
-
-                        tipos_personal_resumen[tipo] = {
-                            'personal': 'ÉXITO' if datos.get('tipo_personal_ok') else 'FALLÓ',
-                            'area': 'ÉXITO' if datos.get('area_municipal_ok') else 'FALLÓ',
-                            'año': 'ÉXITO' if datos.get('anio_ok') else 'FALLÓ',
-                            'meses': 'ÉXITO' if datos.get('meses_ok') else 'FALLÓ',
-                            'CSV': csv_resumen,
-                            'xpath_tipo': datos.get('xpath_tipo'),
-                            'xpath_area': datos.get('xpath_area'),
-                            'xpath_anio': datos.get('xpath_anio'),
-                            'meses_detalle': meses_detalle,
-                        }
-
-                    resumen_dict = {
-                        'acceso_municipio_exitoso': resultados.get('acceso_municipio_exitoso'),
-                        'tipo_municipio_detectado': resultados.get('tipo_municipio_detectado'),
-                        'tipos_personal': tipos_personal_resumen
-                    }
-
-                    log_detallado_municipio(logger_detallado, org_code, year, duracion, resumen_dict)
-                    log_resumen_terminal(org_code, year, resumen_dict)
-                    
-                    municipios_procesados += 1
-                    print(f"[TIEMPO] Municipio {org_code}: {duracion:.2f}s")
-                    print(f"[PROGRESO] {municipios_procesados}/{len(orgs)} municipios")
-
-                except KeyboardInterrupt:
-                    raise  # Re-lanzar para manejo global
-                except Exception as e:
-                    print(f"[ERROR] Error en {org_code}: {e}")
+        if engine == "http":
+            procesar_tarea = MotorHTTP(settings, actions, obtener_driver).procesar
+        else:
+            def procesar_tarea(org_code, year, meses):
+                return procesar_municipio(driver, org_code, settings, actions, year=year, meses=meses)
+
+        year_actual = None
+        for n_tarea, (org_code, year, meses_para_year) in enumerate(tareas, start=1):
+            if year != year_actual:
+                year_actual = year
+                print(f"\n[INFO] Procesando año: {year}")
+            try:
+                print(f"\n[INFO] {'='*50}")
+                print(f"[INFO] Municipio: {org_code} | Año: {year}")
+                print(f"[INFO] Meses a procesar: {len(meses_para_year)}")
+
+                if indice is not None and indice.estado_vigente(org_code):
+                    print(f"[SKIP] {org_code} clasificado como '{indice.estado_vigente(org_code)}'.")
+                    if metricas is not None:
+                        metricas.tarea_terminada(iniciada=False)
                     continue
 
+                # Procesar municipio
+                if metricas is not None:
+                    metricas.tarea_iniciada()
+                t_inicio_muni = time.time()
+                resultados = None
+                try:
+                    resultados = procesar_tarea(org_code, year, meses_para_year)
+                finally:
+                    if metricas is not None:
+                        metricas.tarea_terminada(year, resultados)
+                t_final_muni = time.time()
+                duracion = t_final_muni - t_inicio_muni
+
+                _registrar_resultado(logger_detallado, org_code, year, duracion, resultados)
+                if indice is not None:
+                    indice.registrar_resultado(org_code, resultados)
+                registrar_tarea(env["STATE_DIR"], org_code, year, duracion,
+                                plan.meses_pendientes[(org_code, year)], resultados)
+
+                municipios_procesados += 1
+                print(f"[TIEMPO] Municipio {org_code}: {duracion:.2f}s")
+                print(f"[PROGRESO] {n_tarea}/{len(tareas)} tareas (municipio, año)")
+
+            except KeyboardInterrupt:
+                raise  # Re-lanzar para manejo global
+            except Exception as e:
+                print(f"[ERROR] Error en {org_code}: {e}")
+                continue
+
         tiempo_final = time.time()
         total = tiempo_final - tiempo_inicio
         horas = int(total // 3600)
@@ -227,9 +288,15 @@ def main():
     except Exception as e:
         print(f"[ERROR] Error general: {e}")
     finally:
-        print("\nCerrando navegador...")
-        driver.quit()
-        print("Navegador cerrado. Fin.")
+        cerrar_postproceso()
+        if driver is not None:
+            print("\nCerrando navegador...")
+            driver.quit()
+            if metricas is not None:
+                metricas.driver(-1)
+            print("Navegador cerrado. Fin.")
+        liberar_perfil(perfil)
+        cerrar_archivo_http()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
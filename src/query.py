@@ -0,0 +1,123 @@
+"""
+API de consulta perezosa sobre el árbol de CSV descargados.
+
+    DOWNLOAD_ROOT/{org}/{tipo}/{year}/{org}_{tipo}_{year}_{mes}.csv
+
+iter_records() recorre solo las carpetas y archivos que coinciden con los
+filtros de partición (orgs, tipos, years, months), abre cada CSV de a uno y
+entrega las filas como diccionarios a medida que se leen, así que la memoria
+usada no depende de cuántos municipios se seleccionen.
+
+Ejemplo:
+
+    from src.query import iter_records
+
+    for fila in iter_records(orgs=["MU322"], tipos=["PLANTA"], years=[2023],
+                             months=["Enero", "Febrero"],
+                             columns=["Nombres", "Cargo o función"]):
+        print(fila["_mes"], fila["Nombres"])
+"""
+import csv
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from src.config import load_env
+from src.utils.csv_format import abrir_csv
+from src.utils.delta_store import nombres_en_delta
+
+@dataclass(frozen=True)
+class ArchivoCSV:
+    path: Path
+    org: str
+    tipo: str
+    year: int
+    mes: str
+
+
+def _normalizar(valores: Optional[Iterable]) -> Optional[set]:
+    if valores is None:
+        return None
+    return {str(v).upper() for v in valores}
+
+
+def _subcarpetas(carpeta: Path, permitidos: Optional[set]) -> List[Path]:
+    """Subcarpetas a recorrer; con filtro se accede directo a las pedidas sin listar el resto."""
+    if not carpeta.is_dir():
+        return []
+    if permitidos is not None:
+        directas = [carpeta / v for v in sorted(permitidos) if (carpeta / v).is_dir()]
+        if len(directas) == len(permitidos):
+            return directas
+    return sorted(
+        p for p in carpeta.iterdir()
+        if p.is_dir() and not p.name.startswith("_")
+        and (permitidos is None or p.name.upper() in permitidos)
+    )
+
+
+def iter_files(orgs=None, tipos=None, years=None, months=None,
+               root: Optional[str] = None) -> Iterator[ArchivoCSV]:
+    """Archivos CSV finales que coinciden con los filtros de partición."""
+    base = Path(root or load_env()["DOWNLOAD_ROOT"])
+    f_orgs = _normalizar(orgs)
+    f_tipos = _normalizar(tipos)
+    f_years = _normalizar(years)
+    f_meses = _normalizar(months)
+
+    for dir_org in _subcarpetas(base, f_orgs):
+        for dir_tipo in _subcarpetas(dir_org, f_tipos):
+            for dir_year in _subcarpetas(dir_tipo, f_years):
+                prefijo = f"{dir_org.name}_{dir_tipo.name}_{dir_year.name}_"
+                # Meses sin crudo porque quedaron solo en el almacén delta
+                nombres = {a.name for a in dir_year.glob(f"{prefijo}*.csv")}
+                nombres.update(n for n in nombres_en_delta(dir_year) if n.startswith(prefijo))
+                for archivo in (dir_year / n for n in sorted(nombres)):
+                    mes = archivo.stem[len(prefijo):]
+                    if f_meses is not None and mes.upper() not in f_meses:
+                        continue
+                    try:
+                        year = int(dir_year.name)
+                    except ValueError:
+                        continue
+                    yield ArchivoCSV(archivo, dir_org.name, dir_tipo.name, year, mes)
+
+
+def leer_filas(archivo: ArchivoCSV) -> Iterator[Dict[str, str]]:
+    _, dialecto, texto = abrir_csv(archivo.path)
+    with texto as f:
+        lector = csv.reader(f, dialecto)
+        encabezado = next(lector, None)
+        if not encabezado:
+            return
+        encabezado = [c.strip() for c in encabezado]
+        for fila in lector:
+            if not fila:
+                continue
+            yield dict(zip(encabezado, fila))
+
+
+def iter_records(orgs=None, tipos=None, years=None, months=None,
+                 columns: Optional[List[str]] = None,
+                 where: Optional[Callable[[Dict[str, str]], bool]] = None,
+                 root: Optional[str] = None,
+                 include_partition: bool = True) -> Iterator[Dict[str, object]]:
+    """
+    Itera las filas de los CSV seleccionados.
+
+    - orgs/tipos/years/months filtran por la ruta antes de abrir nada.
+    - columns proyecta las columnas pedidas (las ausentes quedan en None).
+    - where filtra filas ya proyectadas.
+    - include_partition agrega _org, _tipo, _year y _mes a cada fila.
+    """
+    for archivo in iter_files(orgs, tipos, years, months, root=root):
+        particion = {"_org": archivo.org, "_tipo": archivo.tipo,
+                     "_year": archivo.year, "_mes": archivo.mes}
+        for fila in leer_filas(archivo):
+            if columns is not None:
+                fila = {c: fila.get(c) for c in columns}
+            if include_partition:
+                fila.update(particion)
+            if where is not None and not where(fila):
+                continue
+            yield fila
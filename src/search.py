@@ -0,0 +1,90 @@
+"""
+Búsqueda de personas y cargos en todos los municipios (ver src/utils/search_index.py).
+
+  actualizar: indexa los CSV descargados que aún no están en el índice o que
+              cambiaron (mismo recorrido por particiones que src.query).
+  buscar:     devuelve las filas que contienen todas las palabras de cada filtro.
+
+Uso:
+    python -m src.search actualizar
+    python -m src.search actualizar --orgs MU322 --years 2023 2024
+    python -m src.search buscar --persona "juan perez" --years 2023
+    python -m src.search buscar --cargo "director obras" --tipos PLANTA --limite 20 --json
+"""
+import argparse
+import json
+import time
+from typing import Dict, Optional
+
+from src.config import load_env, load_settings
+from src.query import iter_files
+from src.utils.search_index import IndiceBusqueda, abrir_indice_busqueda
+
+
+def actualizar(indice: IndiceBusqueda, orgs=None, tipos=None, years=None, months=None,
+               download_root: Optional[str] = None) -> Dict[str, int]:
+    download_root = download_root or load_env()["DOWNLOAD_ROOT"]
+    stats = {"archivos": 0, "indexados": 0, "sin_cambios": 0, "filas": 0, "errores": 0}
+    for archivo in iter_files(orgs, tipos, years, months, root=download_root):
+        stats["archivos"] += 1
+        try:
+            filas = indice.indexar_archivo(archivo.path, download_root)
+        except Exception as e:
+            stats["errores"] += 1
+            print(f"[WARN] No se pudo indexar {archivo.path}: {e}")
+            continue
+        if filas is None:
+            stats["sin_cambios"] += 1
+        else:
+            stats["indexados"] += 1
+            stats["filas"] += filas
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice invertido de personas y cargos.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_act = sub.add_parser("actualizar", help="Indexar CSV nuevos o modificados")
+    p_bus = sub.add_parser("buscar", help="Buscar filas por persona, cargo, grado o calificación")
+    for p in (p_act, p_bus):
+        p.add_argument("--orgs", nargs="*", default=None)
+        p.add_argument("--tipos", nargs="*", default=None)
+        p.add_argument("--years", nargs="*", default=None)
+        p.add_argument("--months", nargs="*", default=None)
+    p_bus.add_argument("--persona", default=None, help="Palabras del nombre o apellidos")
+    p_bus.add_argument("--cargo", default=None)
+    p_bus.add_argument("--grado", default=None)
+    p_bus.add_argument("--calificacion", default=None)
+    p_bus.add_argument("--limite", type=int, default=50)
+    p_bus.add_argument("--json", action="store_true", help="Una fila JSON por línea")
+    args = parser.parse_args()
+
+    env = load_env()
+    indice = abrir_indice_busqueda(load_settings(), env["STATE_DIR"])
+    try:
+        if args.comando == "actualizar":
+            inicio = time.time()
+            stats = actualizar(indice, args.orgs, args.tipos, args.years, args.months)
+            print(f"[INFO] {stats['indexados']} CSV indexados ({stats['filas']} filas), "
+                  f"{stats['sin_cambios']} sin cambios, {stats['errores']} errores "
+                  f"en {time.time() - inicio:.1f}s | índice: {indice.estadisticas()}")
+            return
+
+        inicio = time.time()
+        filas = list(indice.buscar(env["DOWNLOAD_ROOT"], limite=args.limite, orgs=args.orgs,
+                                   tipos=args.tipos, years=args.years, months=args.months,
+                                   persona=args.persona, cargo=args.cargo, grado=args.grado,
+                                   calificacion=args.calificacion))
+        for fila in filas:
+            if args.json:
+                print(json.dumps(fila, ensure_ascii=False))
+            else:
+                print(f"{fila['_org']} {fila['_tipo']} {fila['_year']} {fila['_mes']} | "
+                      + " | ".join(f"{k}: {v}" for k, v in fila.items() if not k.startswith("_") and v))
+        print(f"[INFO] {len(filas)} filas en {1000 * (time.time() - inicio):.0f} ms")
+    finally:
+        indice.cerrar()
+
+
+if __name__ == "__main__":
+    main()
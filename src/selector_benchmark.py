@@ -0,0 +1,197 @@
+"""
+Micro-benchmark del optimizador de selectores (src/utils/selector_optimizer.py).
+
+Por cada página de prueba evalúa todos los XPaths expandidos de
+actions_transparencia.json de dos formas y compara costo y resultados:
+
+  - xpath:     etree.XPath del patrón original, como hoy en cada sondeo;
+  - compilado: índice por página (candidatos del alcance con su texto
+               normalizado, construido una vez) + filtro de la condición.
+
+Cada página se sondea --rondas veces, igual que WebDriverWait repite la
+búsqueda mientras espera. Las páginas son los snapshots HTML del scraper o,
+si no hay, una página sintética con la estructura del portal.
+
+Con --browser se repite la medición en Chrome headless: find_elements(By.XPATH)
+contra execute_script(JS_BUSCAR) sobre la misma página.
+
+Uso:
+    python -m src.selector_benchmark
+    python -m src.selector_benchmark --snapshots snapshots/ --rondas 20
+    python -m src.selector_benchmark --sintetico --ruido 5000 --browser
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+from lxml import etree
+from lxml import html as lxml_html
+
+from src.config import load_actions, load_settings
+from src.selector_harness import listar_grupos, _expansiones
+from src.utils.navigation_helpers import obtener_modulo_generico
+from src.utils.selector_optimizer import compilar_xpath, IndiceLxml, JS_BUSCAR
+from src.utils.snapshots import leer_snapshot
+
+
+def xpaths_expandidos(modulo: Dict[str, Any], years: List[int], meses: List[str]) -> List[str]:
+    vistos = {}
+    for tipo_accion, valor in listar_grupos(modulo):
+        for xpaths in _expansiones(modulo, tipo_accion, valor, years, meses):
+            for xp in xpaths:
+                vistos.setdefault(xp, None)
+    return list(vistos)
+
+
+def pagina_sintetica(years: List[int], meses: List[str], ruido: int = 2000) -> str:
+    """HTML con la forma del portal: menú, pestañas de años/meses y mucho contenido ajeno."""
+    partes = ["<html><head><title>Portal</title></head><body>",
+              "<div class='menu'>"]
+    partes += [f"<a href='#m{i}'>Organismo número {i} - Dirección de Área {i % 37}</a>" for i in range(ruido // 4)]
+    partes.append("</div><div class='contenido'>")
+    partes.append("<div class='ui-tabs tabs-content'>"
+                  "<a href='#c'>Personal a Contrata</a> <a href='#p'>Personal de Planta</a>"
+                  "<a href='#mun'>Municipal</a></div>")
+    partes.append("<div class='ui-tabs-panel tab-content year-selector'>")
+    partes += [f"<a href='#y{y}'> Año {y} </a><a href='#m{y}'>Municipal {y}</a>" for y in years]
+    partes.append("</div><div class='ui-tabs-panel tab-content month-selector'>")
+    partes += [f"<a href='#{m}'>{m}</a>" for m in meses]
+    partes.append("<a href='#rh'>Registro Histórico</a></div>")
+    for i in range(ruido):
+        partes.append(f"<div class='fila f{i % 13}'><span>Registro {i}</span>"
+                      f"<p>Texto de relleno ÁÉÍÓÚ {i} con   espacios\n y saltos</p>"
+                      f"<a href='#r{i}'>Ver detalle {i}</a></div>")
+    partes.append("<button type='button'>Descargar CSV</button></div></body></html>")
+    return "".join(partes)
+
+
+def cargar_fixtures(carpeta: Path, sintetico: bool, years, meses, ruido: int) -> List[Tuple[str, str]]:
+    archivos = [] if sintetico else sorted(carpeta.glob("*.html"))
+    if not archivos:
+        if not sintetico:
+            print(f"[INFO] No hay snapshots en {carpeta}; se usa una página sintética.")
+        return [("sintetica", pagina_sintetica(years, meses, ruido))]
+    return [(a.name, leer_snapshot(a)[1]) for a in archivos]
+
+
+def medir_lxml(contenido: str, xpaths: List[str], rondas: int) -> Dict[str, Any]:
+    arbol = lxml_html.fromstring(contenido)
+    compilados = {xp: compilar_xpath(xp) for xp in xpaths}
+    originales = {xp: etree.XPath(xp) for xp in xpaths}
+
+    inicio = time.perf_counter()
+    for _ in range(rondas):
+        for xp in xpaths:
+            originales[xp](arbol)
+    t_xpath = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    indice = IndiceLxml(arbol)  # una vez por página, como el índice JS por versión del DOM
+    for _ in range(rondas):
+        for xp in xpaths:
+            if compilados[xp] is None:
+                originales[xp](arbol)
+            else:
+                indice.buscar(compilados[xp])
+    t_compilado = time.perf_counter() - inicio
+
+    distintos = [xp for xp, c in compilados.items()
+                 if c is not None and originales[xp](arbol) != indice.buscar(c)]
+    return {"t_xpath": t_xpath, "t_compilado": t_compilado, "distintos": distintos}
+
+
+def medir_navegador(driver, contenido: str, xpaths: List[str], rondas: int) -> Dict[str, Any]:
+    from selenium.webdriver.common.by import By
+
+    with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False, encoding="utf-8") as f:
+        f.write(contenido)
+    try:
+        driver.get(Path(f.name).resolve().as_uri())
+        compilados = {xp: compilar_xpath(xp) for xp in xpaths}
+
+        inicio = time.perf_counter()
+        for _ in range(rondas):
+            for xp in xpaths:
+                driver.find_elements(By.XPATH, xp)
+        t_xpath = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for _ in range(rondas):
+            for xp in xpaths:
+                if compilados[xp] is None:
+                    driver.find_elements(By.XPATH, xp)
+                else:
+                    driver.execute_script(JS_BUSCAR, compilados[xp])
+        t_compilado = time.perf_counter() - inicio
+
+        distintos = [xp for xp, c in compilados.items()
+                     if c is not None and len(driver.find_elements(By.XPATH, xp))
+                     != len(driver.execute_script(JS_BUSCAR, c) or [])]
+    finally:
+        Path(f.name).unlink(missing_ok=True)
+    return {"t_xpath": t_xpath, "t_compilado": t_compilado, "distintos": distintos}
+
+
+def imprimir_medicion(titulo: str, m: Dict[str, Any], evaluaciones: int):
+    por_eval = lambda t: 1e6 * t / max(1, evaluaciones)
+    aceleracion = m["t_xpath"] / m["t_compilado"] if m["t_compilado"] else float("inf")
+    print(f"   [{titulo}] xpath: {m['t_xpath']:.3f}s ({por_eval(m['t_xpath']):.0f} µs/eval) | "
+          f"compilado: {m['t_compilado']:.3f}s ({por_eval(m['t_compilado']):.0f} µs/eval) | x{aceleracion:.1f}")
+    for xp in m["distintos"][:5]:
+        print(f"      [WARN] resultado distinto: {xp}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el costo de los XPaths originales y compilados.")
+    parser.add_argument("--snapshots", default=None, help="Carpeta de snapshots (por defecto settings.snapshots.dir)")
+    parser.add_argument("--sintetico", action="store_true", help="Usar solo la página sintética")
+    parser.add_argument("--ruido", type=int, default=2000, help="Bloques de contenido ajeno en la página sintética")
+    parser.add_argument("--rondas", type=int, default=10, help="Sondeos por página")
+    parser.add_argument("--browser", action="store_true", help="Medir también en Chrome headless")
+    args = parser.parse_args()
+
+    settings = load_settings()
+    modulo = obtener_modulo_generico(load_actions())
+    years = list(range(settings["start_year"], settings["end_year"] + 1))
+    meses = settings.get("months", [])
+    xpaths = xpaths_expandidos(modulo, years, meses)
+    n_compilables = sum(1 for xp in xpaths if compilar_xpath(xp) is not None)
+    print("=== BENCHMARK DE SELECTORES ===")
+    print(f"XPaths expandidos: {len(xpaths)} | compilables: {n_compilables} "
+          f"| se evalúan como XPath: {len(xpaths) - n_compilables}")
+
+    carpeta = Path(args.snapshots or (settings.get("snapshots") or {}).get("dir", "snapshots"))
+    fixtures = cargar_fixtures(carpeta, args.sintetico, years, meses, args.ruido)
+    evaluaciones = len(xpaths) * args.rondas
+
+    total = {"t_xpath": 0.0, "t_compilado": 0.0, "distintos": []}
+    for nombre, contenido in fixtures:
+        try:
+            m = medir_lxml(contenido, xpaths, args.rondas)
+        except (etree.ParserError, ValueError) as e:
+            print(f"[WARN] {nombre}: HTML inválido ({e})")
+            continue
+        if len(fixtures) <= 20:
+            print(f"\n[PÁGINA] {nombre}")
+            imprimir_medicion("lxml", m, evaluaciones)
+        total["t_xpath"] += m["t_xpath"]
+        total["t_compilado"] += m["t_compilado"]
+        total["distintos"] += [f"{nombre}: {xp}" for xp in m["distintos"]]
+    print(f"\n[TOTAL] {len(fixtures)} páginas")
+    imprimir_medicion("lxml", total, evaluaciones * len(fixtures))
+
+    if args.browser:
+        from src.utils.browser_helpers import build_driver
+        driver = build_driver(headless=True, download_root=tempfile.mkdtemp())
+        try:
+            for nombre, contenido in fixtures[:5]:
+                print(f"\n[PÁGINA] {nombre}")
+                imprimir_medicion("chrome", medir_navegador(driver, contenido, xpaths, args.rondas), evaluaciones)
+        finally:
+            driver.quit()
+
+
+if __name__ == "__main__":
+    main()
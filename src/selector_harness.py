@@ -0,0 +1,244 @@
+"""
+Arnés offline de regresión de selectores.
+
+Evalúa todos los XPaths configurados en actions_transparencia.json contra los
+snapshots HTML que guarda el scraper (ver src/utils/snapshots.py) usando lxml,
+sin abrir ningún navegador, y reporta la tasa de acierto de cada patrón.
+
+{YEAR} y {MONTH} se expanden con el año/mes del encabezado del snapshot; si
+el snapshot no los trae, se prueban todos los años y meses de settings.json y
+cuenta como acierto si alguna expansión encuentra nodos.
+
+Cada snapshot se evalúa solo con las acciones que aplican a la página que
+capturó (ACCIONES_POR_PASO): un snapshot "paso" se toma tras completar ese
+paso (o al fallarlo), así que en él aplican la acción del paso y las que
+siguen. Las tasas de cada acción se calculan sobre los snapshots donde aplica;
+los snapshots sin paso conocido se evalúan con todas.
+
+Nota: lxml no evalúa visibilidad ni si el elemento es clickeable, así que un
+acierto aquí significa "el XPath encuentra nodos", condición necesaria para
+que espera_click funcione.
+
+Uso:
+    python -m src.selector_harness
+    python -m src.selector_harness --snapshots snapshots/ --workers 8 --json reporte.json
+    python -m src.selector_harness --actions otra_version_actions.json
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from lxml import etree
+from lxml import html as lxml_html
+
+from src.config import load_actions, load_settings
+from src.utils.navigation_helpers import obtener_modulo_generico, obtener_xpaths_accion
+from src.utils.snapshots import leer_snapshot
+
+_XPATH_COMPILADOS: Dict[str, Any] = {}
+
+# paso del snapshot -> acciones que aplican a esa página (la del paso, si falló,
+# y las siguientes, si se completó)
+ACCIONES_POR_PASO = {
+    "carga": ("open_tipo_personal",),
+    "tipo": ("open_tipo_personal", "select_area", "select_anio"),
+    "anio": ("select_anio", "select_historico", "select_mes"),
+    "mes": ("select_mes", "download_csv"),
+    "csv": ("download_csv",),
+}
+
+
+def acciones_aplicables(paso: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Acciones que aplican a un snapshot de `paso`; None si el paso no se conoce (aplican todas)."""
+    return ACCIONES_POR_PASO.get(paso) if paso else None
+
+
+def listar_grupos(modulo: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    """Devuelve (acción, valor) para cada lista de XPaths configurada."""
+    grupos = []
+    for sa in modulo.get("scraping_actions", []):
+        tipo_accion = sa.get("type")
+        if "options" in sa:
+            for opt in sa.get("options", []):
+                grupos.append((tipo_accion, opt.get("value")))
+        else:
+            grupos.append((tipo_accion, None))
+    return grupos
+
+
+def _expansiones(modulo, tipo_accion: str, valor, years: List[int], meses: List[str]) -> List[List[str]]:
+    """Lista de expansiones posibles; cada una es la lista de XPaths en orden de prioridad."""
+    if tipo_accion == "select_anio":
+        return [obtener_xpaths_accion(modulo, tipo_accion, y) for y in years]
+    if tipo_accion == "select_mes":
+        return [obtener_xpaths_accion(modulo, tipo_accion, m) for m in meses]
+    return [obtener_xpaths_accion(modulo, tipo_accion, valor)]
+
+
+def _plantillas(modulo, tipo_accion: str, valor) -> List[str]:
+    """Patrones sin expandir, tal como están en actions_transparencia.json."""
+    for sa in modulo.get("scraping_actions", []):
+        if sa.get("type") == tipo_accion:
+            if tipo_accion == "select_anio":
+                return list(sa.get("year_patterns", []))
+            if tipo_accion == "select_mes":
+                return list(sa.get("month_patterns", []))
+    return obtener_xpaths_accion(modulo, tipo_accion, valor)
+
+
+def _coincide(arbol, xpath: str) -> bool:
+    compilado = _XPATH_COMPILADOS.get(xpath)
+    if compilado is None:
+        compilado = etree.XPath(xpath)
+        _XPATH_COMPILADOS[xpath] = compilado
+    resultado = compilado(arbol)
+    return bool(resultado) if isinstance(resultado, list) else bool(resultado)
+
+
+def evaluar_snapshot(args) -> Optional[Dict[str, Any]]:
+    path, modulo, years_default, meses_default, paso = args
+    contexto, contenido = leer_snapshot(path)
+    if paso and contexto.get("paso") != paso:
+        return None
+    salida = {"path": str(path), "paso": contexto.get("paso"), "aciertos": {}, "errores": []}
+
+    try:
+        arbol = lxml_html.fromstring(contenido)
+    except (etree.ParserError, ValueError) as e:
+        salida["errores"].append(f"HTML inválido: {e}")
+        return salida
+
+    years = [contexto["year"]] if contexto.get("year") else years_default
+    meses = [contexto["mes"]] if contexto.get("mes") else meses_default
+    aplicables = acciones_aplicables(contexto.get("paso"))
+
+    for tipo_accion, valor in listar_grupos(modulo):
+        if aplicables is not None and tipo_accion not in aplicables:
+            continue
+        clave = f"{tipo_accion}:{valor}" if valor is not None else tipo_accion
+        expansiones = _expansiones(modulo, tipo_accion, valor, years, meses)
+        n_patrones = max((len(e) for e in expansiones), default=0)
+        hits = [False] * n_patrones
+        for xpaths in expansiones:
+            for i, xp in enumerate(xpaths):
+                if hits[i]:
+                    continue
+                try:
+                    hits[i] = _coincide(arbol, xp)
+                except etree.XPathError as e:
+                    salida["errores"].append(f"{clave} #{i + 1}: {e}")
+        salida["aciertos"][clave] = hits
+    return salida
+
+
+def construir_reporte(resultados: List[Dict[str, Any]], modulo: Dict[str, Any]) -> Dict[str, Any]:
+    reporte: Dict[str, Any] = {"snapshots": len(resultados), "grupos": {}, "errores": []}
+    for tipo_accion, valor in listar_grupos(modulo):
+        clave = f"{tipo_accion}:{valor}" if valor is not None else tipo_accion
+        plantillas = _plantillas(modulo, tipo_accion, valor)
+        hits = defaultdict(int)
+        ganadores = defaultdict(int)
+        sin_acierto = []
+        evaluados = 0
+        for r in resultados:
+            fila = r["aciertos"].get(clave)
+            if fila is None:
+                continue
+            evaluados += 1
+            for i, h in enumerate(fila):
+                if h:
+                    hits[i] += 1
+            primero = next((i for i, h in enumerate(fila) if h), None)
+            if primero is None:
+                sin_acierto.append(r["path"])
+            else:
+                ganadores[primero] += 1
+
+        reporte["grupos"][clave] = {
+            "patrones": [
+                {
+                    "indice": i + 1,
+                    "xpath": xp,
+                    "aciertos": hits[i],
+                    "tasa": hits[i] / evaluados if evaluados else 0.0,
+                    "gana": ganadores[i],
+                }
+                for i, xp in enumerate(plantillas)
+            ],
+            "snapshots": evaluados,
+            "sin_acierto": len(sin_acierto),
+            "ejemplos_sin_acierto": sin_acierto[:5],
+        }
+    for r in resultados:
+        for err in r["errores"]:
+            reporte["errores"].append(f"{r['path']}: {err}")
+    return reporte
+
+
+def imprimir_reporte(reporte: Dict[str, Any]):
+    total = reporte["snapshots"]
+    print(f"=== REPORTE DE SELECTORES ({total} snapshots) ===")
+    for clave, grupo in reporte["grupos"].items():
+        evaluados = grupo["snapshots"]
+        print(f"\n[GRUPO] {clave} | snapshots donde aplica: {evaluados} | "
+              f"sin acierto: {grupo['sin_acierto']}/{evaluados}")
+        for p in grupo["patrones"]:
+            print(f"   #{p['indice']:<2} {p['tasa']:6.1%} ({p['aciertos']}/{evaluados}) "
+                  f"gana: {p['gana']:<5} {p['xpath']}")
+        for ejemplo in grupo["ejemplos_sin_acierto"]:
+            print(f"      - sin acierto: {ejemplo}")
+    if reporte["errores"]:
+        print(f"\n[WARN] {len(reporte['errores'])} errores de evaluación (se muestran 10):")
+        for err in reporte["errores"][:10]:
+            print(f"   - {err}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evalúa XPaths configurados contra snapshots HTML.")
+    parser.add_argument("--snapshots", default=None, help="Carpeta de snapshots (por defecto settings.snapshots.dir)")
+    parser.add_argument("--actions", default=None, help="actions_transparencia.json alternativo a evaluar")
+    parser.add_argument("--paso", default=None, help="Evaluar solo snapshots de este paso (carga, tipo, anio, mes, ...)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--json", default=None, help="Guardar el reporte completo en este archivo")
+    args = parser.parse_args()
+
+    settings = load_settings()
+    if args.actions:
+        with open(args.actions, "r", encoding="utf-8") as f:
+            actions = json.load(f)
+    else:
+        actions = load_actions()
+    modulo = obtener_modulo_generico(actions)
+
+    carpeta = Path(args.snapshots or (settings.get("snapshots") or {}).get("dir", "snapshots"))
+    archivos = sorted(carpeta.glob("*.html"))
+    if not archivos:
+        print(f"[WARN] No hay snapshots en {carpeta}")
+        return
+
+    years = list(range(settings["start_year"], settings["end_year"] + 1))
+    meses = settings.get("months", [])
+    tareas = [(a, modulo, years, meses, args.paso) for a in archivos]
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            resultados = list(pool.map(evaluar_snapshot, tareas, chunksize=32))
+    else:
+        resultados = [evaluar_snapshot(t) for t in tareas]
+    resultados = [r for r in resultados if r is not None]
+
+    reporte = construir_reporte(resultados, modulo)
+    imprimir_reporte(reporte)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+        print(f"\n[INFO] Reporte guardado en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Staging: consolida los CSV descargados al esquema canónico.
+
+Cada CSV final ya tiene su huella de encabezado en STATE_DIR/schema_archivos.json
+(ver src/utils/schema_registry.py), así que aquí solo se aplica el mapeo
+compilado de esa variante, sin volver a inferir columnas archivo por archivo.
+Los CSV que no pasaron por el registro (descargas anteriores) se registran al
+vuelo la primera vez.
+
+Salida: STAGING_DIR/{org}/{tipo}/{year}/{org}_{tipo}_{year}.csv con las
+columnas canónicas más org, tipo, year y mes_publicacion.
+
+Uso:
+    python -m src.staging
+    python -m src.staging --orgs MU322 MU331 --years 2023 2024
+    python -m src.staging --report
+"""
+import argparse
+import csv
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.config import load_env
+from src.query import iter_files
+from src.utils.csv_format import abrir_csv
+from src.utils.schema_registry import RegistroEsquemas
+
+COLUMNAS_PARTICION = ["org", "tipo", "year", "mes_publicacion"]
+
+
+def _reportar_variantes(registro: RegistroEsquemas, nuevas: List[str]):
+    incompletas = registro.variantes_incompletas()
+    print(f"\n[ESQUEMA] Variantes conocidas: {len(registro.variantes)} | "
+          f"con columnas sin mapear: {len(incompletas)}")
+    for huella in nuevas:
+        v = registro.variantes[huella]
+        print(f"  [NUEVA] {huella} ({len(v['encabezado'])} columnas) ej: {v.get('ejemplo')}")
+    for huella, v in sorted(incompletas.items(), key=lambda kv: -kv[1].get("archivos", 0)):
+        print(f"  [INCOMPLETA] {huella} en {v.get('archivos', 0)} archivos | "
+              f"sin mapear: {v['sin_mapear']} | ej: {v.get('ejemplo')}")
+
+
+def consolidar(orgs=None, tipos=None, years=None, months=None,
+               download_root: Optional[str] = None, staging_dir: Optional[str] = None,
+               registro: Optional[RegistroEsquemas] = None, solo_reporte: bool = False) -> Dict[str, int]:
+    env = load_env()
+    download_root = download_root or env["DOWNLOAD_ROOT"]
+    staging_dir = Path(staging_dir or env["STAGING_DIR"])
+    registro = registro or RegistroEsquemas(env["STATE_DIR"])
+
+    huellas_previas = set(registro.variantes)
+    # Agrupar por (org, tipo, year) para escribir un CSV por partición
+    grupos = defaultdict(list)
+    for archivo in iter_files(orgs, tipos, years, months, root=download_root):
+        grupos[(archivo.org, archivo.tipo, archivo.year)].append(archivo)
+
+    stats = {"archivos": 0, "filas": 0, "sin_encabezado": 0}
+    columnas = registro.columnas_canonicas + COLUMNAS_PARTICION
+
+    for (org, tipo, year), archivos in sorted(grupos.items()):
+        writer = None
+        salida = None
+        destino = staging_dir / org / tipo / str(year) / f"{org}_{tipo}_{year}.csv"
+        try:
+            for archivo in archivos:
+                huella = registro.huella_de_archivo(archivo.path, download_root)
+                if huella is None:
+                    huella = registro.registrar_archivo(archivo.path, download_root)
+                if huella is None:
+                    stats["sin_encabezado"] += 1
+                    continue
+                stats["archivos"] += 1
+                if solo_reporte:
+                    continue
+
+                mapeo = registro.mapeo(huella)
+                particion = [org, tipo, year, archivo.mes]
+                if writer is None:
+                    destino.parent.mkdir(parents=True, exist_ok=True)
+                    salida = destino.with_suffix(".csv.tmp").open("w", encoding="utf-8", newline="")
+                    writer = csv.writer(salida)
+                    writer.writerow(columnas)
+
+                _, dialecto, texto = abrir_csv(archivo.path)
+                with texto as f:
+                    lector = csv.reader(f, dialecto)
+                    next(lector, None)
+                    for fila in lector:
+                        if not fila:
+                            continue
+                        canonica = mapeo.aplicar(fila)
+                        writer.writerow([canonica[c] for c in registro.columnas_canonicas] + particion)
+                        stats["filas"] += 1
+        except BaseException:
+            # El consolidado anterior queda intacto; se descarta el parcial
+            if salida is not None:
+                salida.close()
+                destino.with_suffix(".csv.tmp").unlink(missing_ok=True)
+            raise
+        else:
+            if salida is not None:
+                salida.close()
+                destino.with_suffix(".csv.tmp").replace(destino)
+
+    registro.guardar()
+    _reportar_variantes(registro, [h for h in registro.variantes if h not in huellas_previas])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consolida los CSV descargados al esquema canónico.")
+    parser.add_argument("--orgs", nargs="*", default=None)
+    parser.add_argument("--tipos", nargs="*", default=None)
+    parser.add_argument("--years", nargs="*", default=None)
+    parser.add_argument("--months", nargs="*", default=None)
+    parser.add_argument("--report", action="store_true",
+                        help="Solo registrar huellas y reportar variantes, sin escribir staging")
+    args = parser.parse_args()
+
+    stats = consolidar(args.orgs, args.tipos, args.years, args.months, solo_reporte=args.report)
+    print(f"\n[OK] Archivos: {stats['archivos']} | filas: {stats['filas']} | "
+          f"sin encabezado: {stats['sin_encabezado']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Cubo materializado de dotación y remuneraciones por org × tipo × año × mes.
+
+Cada celda resume un CSV final:
+
+    "MU322|PLANTA|2023|Enero": {"filas": 812, "con_bruta": 810, "bruta": 1.2e9,
+                                "con_liquida": 810, "liquida": 9.1e8, "sha256": ...}
+
+Se actualiza solo la celda del CSV que acaba de finalizarse (actualizar_cubo,
+llamado desde mover_csv_final); si el sha256 del archivo no cambió no se vuelve
+a leer. Se guarda en STATE_DIR/cubo_agregados.json al terminar cada municipio,
+igual que el registro de esquemas. consultar() suma celdas por las dimensiones
+pedidas sin abrir ningún CSV.
+"""
+import csv
+import hashlib
+import io
+import re
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from .csv_format import formato_de_muestra
+from .delta_store import leer_csv
+from .schema_registry import alias_canonicos, normalizar_columna
+from .state_store import leer_json, guardar_json
+
+DIMENSIONES = ("org", "tipo", "year", "mes")
+MEDIDAS = ("filas", "con_bruta", "bruta", "con_liquida", "liquida")
+
+_RE_NOMBRE_CSV = re.compile(r"^(?P<org>[^_]+)_(?P<tipo>[^_]+)_(?P<year>\d{4})_(?P<mes>.+)\.csv$")
+_RE_MILES_PUNTO = re.compile(r"^-?\d{1,3}(\.\d{3})+$")
+_RE_MILES_COMA = re.compile(r"^-?\d{1,3}(,\d{3})+$")
+
+
+def parsear_monto(texto: Optional[str]) -> Optional[float]:
+    """'$ 1.234.567' -> 1234567.0; '1234567,5' -> 1234567.5; vacío o no numérico -> None."""
+    limpio = re.sub(r"[^\d,.\-]", "", texto or "")
+    if not re.search(r"\d", limpio):
+        return None
+    if "," in limpio and "." in limpio:
+        limpio = limpio.replace(".", "").replace(",", ".")
+    elif "," in limpio:
+        limpio = limpio.replace(",", "") if _RE_MILES_COMA.match(limpio) else limpio.replace(",", ".")
+    elif _RE_MILES_PUNTO.match(limpio):
+        limpio = limpio.replace(".", "")
+    try:
+        return float(limpio)
+    except ValueError:
+        return None
+
+
+def calcular_celda(datos: bytes) -> Dict[str, Any]:
+    """Medidas de un CSV: filas con datos y suma de remuneraciones bruta y líquida."""
+    encoding, dialecto = formato_de_muestra(datos[:8192])
+    lector = csv.reader(io.StringIO(datos.decode(encoding, errors="replace"), newline=""), dialecto)
+    encabezado = next(lector, None) or []
+    alias = alias_canonicos()
+    canonicas = [alias.get(normalizar_columna(c)) for c in encabezado]
+    i_bruta = canonicas.index("remuneracion_bruta") if "remuneracion_bruta" in canonicas else None
+    i_liquida = canonicas.index("remuneracion_liquida") if "remuneracion_liquida" in canonicas else None
+
+    celda = dict.fromkeys(MEDIDAS, 0)
+    celda["bruta"] = celda["liquida"] = 0.0
+    for fila in lector:
+        if not any(c.strip() for c in fila):
+            continue
+        celda["filas"] += 1
+        for indice, medida, contador in ((i_bruta, "bruta", "con_bruta"), (i_liquida, "liquida", "con_liquida")):
+            if indice is not None and indice < len(fila):
+                monto = parsear_monto(fila[indice])
+                if monto is not None:
+                    celda[medida] += monto
+                    celda[contador] += 1
+    celda["sha256"] = hashlib.sha256(datos).hexdigest()
+    return celda
+
+
+class CuboAgregados:
+    def __init__(self, state_dir: str):
+        self.path = Path(state_dir) / "cubo_agregados.json"
+        self.celdas: Dict[str, Dict[str, Any]] = leer_json(self.path, default={}) or {}
+        self._sucio = False
+
+    @staticmethod
+    def clave(org: str, tipo: str, year: int, mes: str) -> str:
+        return f"{org}|{tipo}|{year}|{mes}"
+
+    def actualizar(self, org: str, tipo: str, year: int, mes: str, datos: bytes) -> bool:
+        """Recalcula la celda si el archivo cambió. Devuelve True si se actualizó."""
+        clave = self.clave(org, tipo, year, mes)
+        actual = self.celdas.get(clave)
+        if actual is not None and actual.get("sha256") == hashlib.sha256(datos).hexdigest():
+            return False
+        self.fijar(clave, calcular_celda(datos))
+        return True
+
+    def fijar(self, clave: str, celda: Dict[str, Any]):
+        celda["actualizado"] = datetime.now().isoformat(timespec="seconds")
+        self.celdas[clave] = celda
+        self._sucio = True
+
+    def quitar(self, clave: str):
+        if self.celdas.pop(clave, None) is not None:
+            self._sucio = True
+
+    def actualizar_archivo(self, ruta_csv) -> bool:
+        m = _RE_NOMBRE_CSV.match(Path(ruta_csv).name)
+        if not m:
+            return False
+        return self.actualizar(m["org"], m["tipo"], int(m["year"]), m["mes"], leer_csv(ruta_csv))
+
+    def guardar(self):
+        if self._sucio:
+            guardar_json(self.path, self.celdas)
+            self._sucio = False
+
+    def consultar(self, por: Optional[List[str]] = None, orgs=None, tipos=None, years=None,
+                  months=None) -> List[Dict[str, Any]]:
+        """
+        Suma las celdas que pasan los filtros agrupando por las dimensiones de
+        `por` (subconjunto de org, tipo, year, mes; por defecto las cuatro).
+        """
+        por = list(por or DIMENSIONES)
+        for d in por:
+            if d not in DIMENSIONES:
+                raise ValueError(f"Dimensión desconocida: {d} (disponibles: {DIMENSIONES})")
+        filtros = {d: {str(v).upper() for v in f} for d, f in zip(DIMENSIONES, (orgs, tipos, years, months))
+                   if f is not None}
+
+        grupos: Dict[tuple, Dict[str, Any]] = defaultdict(lambda: {**dict.fromkeys(MEDIDAS, 0), "celdas": 0})
+        for clave, celda in self.celdas.items():
+            valores = dict(zip(DIMENSIONES, clave.split("|")))
+            if any(valores[d].upper() not in f for d, f in filtros.items()):
+                continue
+            grupo = grupos[tuple(valores[d] for d in por)]
+            grupo["celdas"] += 1
+            for medida in MEDIDAS:
+                grupo[medida] += celda.get(medida, 0)
+
+        filas = []
+        for llave, medidas in sorted(grupos.items()):
+            fila = dict(zip(por, llave))
+            if "year" in fila:
+                fila["year"] = int(fila["year"])
+            fila.update(medidas)
+            filas.append(fila)
+        return filas
+
+
+_CUBO: Optional[CuboAgregados] = None
+
+
+def cargar_cubo(settings: Dict[str, Any], state_dir: str) -> Optional[CuboAgregados]:
+    global _CUBO
+    config = settings.get("aggregate_cube") or {}
+    if not config.get("enabled"):
+        _CUBO = None
+        return None
+    if _CUBO is None or _CUBO.path.parent != Path(state_dir):
+        _CUBO = CuboAgregados(state_dir)
+    return _CUBO
+
+
+def actualizar_cubo(ruta_csv):
+    """Gancho para cuando un CSV queda en su ruta final. No lanza excepciones."""
+    if _CUBO is None:
+        return
+    try:
+        _CUBO.actualizar_archivo(ruta_csv)
+    except Exception as e:
+        print(f"[WARN] No se pudo actualizar el cubo con {ruta_csv}: {e}")
+
+
+def guardar_cubo():
+    if _CUBO is not None:
+        _CUBO.guardar()
@@ -7,14 +7,51 @@ from selenium.webdriver.support import expected_conditions as EC
 import time
 import os
 import shutil
+import threading
+from typing import Optional
 
-def build_driver(headless: bool = True, download_root: str = "./data/raw"):
+from .snapshots import snapshot_fallo
+from .timeouts import registrar_latencia
+from .schema_registry import registrar_csv_final
+from .metrics import registrar_descarga
+from .download_journal import obtener_diario
+from .delta_store import registrar_csv_delta
+from .search_index import indexar_csv_final
+from .aggregate_cube import actualizar_cubo
+from .selector_optimizer import buscar_elementos, compilar_xpath, optimizador_habilitado
+
+# Esquemas, índice de búsqueda, cubo y delta no son thread-safe: con el
+# postproceso en segundo plano (src/utils/postprocess.py) cada uno se actualiza
+# de a un archivo, con su propio lock, así varios hilos avanzan en registros distintos
+_LOCK_ESQUEMAS = threading.Lock()
+_LOCK_INDICE = threading.Lock()
+_LOCK_CUBO = threading.Lock()
+_LOCK_DELTA = threading.Lock()
+
+def build_driver(headless: bool = True, download_root: str = "./data/raw",
+                 user_data_dir: str = None, disk_cache_mb: int = None, proxy_server: str = None,
+                 page_load_strategy: str = "normal"):
     download_dir = Path(download_root).resolve()
     download_dir.mkdir(parents=True, exist_ok=True)
+    inicio = time.time()
     
     options = Options()
     if headless:
         options.add_argument("--headless=new")
+    if user_data_dir:
+        # Perfil persistente: caché HTTP y cookies del portal se reutilizan entre ejecuciones
+        options.add_argument(f"--user-data-dir={user_data_dir}")
+        options.add_argument("--profile-directory=Default")
+    if disk_cache_mb:
+        options.add_argument(f"--disk-cache-size={int(disk_cache_mb) * 1024 * 1024}")
+    if proxy_server:
+        # Proxy de grabación/reproducción (src/utils/http_archive.py): termina el TLS con un certificado propio
+        options.add_argument(f"--proxy-server=http://{proxy_server}")
+        options.add_argument("--ignore-certificate-errors")
+    
+    if page_load_strategy != "normal":
+        # driver.get no espera todos los recursos; la espera la hace src/utils/page_readiness.py
+        options.page_load_strategy = page_load_strategy
     
     options.add_argument(
         "--user-agent="
@@ -52,12 +89,31 @@ def build_driver(headless: bool = True, download_root: str = "./data/raw"):
         print(f"[WARN] No se pudo ajustar navigator.webdriver:{e}")
     
     driver.set_page_load_timeout(60)
+    registrar_latencia("driver_inicio", None, time.time() - inicio)
+    print(f"[INFO] Chrome iniciado en {time.time() - inicio:.2f}s"
+          f"{' (perfil persistente)' if user_data_dir else ''}")
     return driver
 
-def espera_click(driver, xpath: str, timeout: int = 2, scroll: bool = True) -> bool:
+def _clickeable_compilado(xpath: str):
+    """Como EC.element_to_be_clickable, pero buscando con el selector compilado."""
+    def condicion(driver):
+        elementos = buscar_elementos(driver, xpath)
+        if elementos and elementos[0].is_displayed() and elementos[0].is_enabled():
+            return elementos[0]
+        return False
+    return condicion
+
+def espera_click(driver, xpath: str, timeout: int = 2, scroll: bool = True,
+                 paso: str = None, org_code: str = None) -> bool:
     try:
+        inicio = time.time()
         wait = WebDriverWait(driver, timeout)
-        elemento = wait.until(EC.element_to_be_clickable((By.XPATH, xpath)))
+        if optimizador_habilitado() and compilar_xpath(xpath) is not None:
+            elemento = wait.until(_clickeable_compilado(xpath))
+        else:
+            elemento = wait.until(EC.element_to_be_clickable((By.XPATH, xpath)))
+        if paso:
+            registrar_latencia(paso, org_code, time.time() - inicio)
         if scroll:
             driver.execute_script(
                 "arguments[0].scrollIntoView({behavior: 'auto', block: 'center'});",
@@ -76,54 +132,51 @@ def _guardar_screenshot(driver, org_code: str, sufijo: str):
     filename = screenshots_dir / f"{org_code}_{sufijo}.png"
     driver.save_screenshot(str(filename))
     print(f"[DEBUG] Screenshot guardado: {filename}")
+    snapshot_fallo(driver, org_code, sufijo)
 
-def esperar_y_mover_csv(download_root: str, municipio: str, tipo_personal: str, 
-                       year: int, mes: str, timeout: int = 15) -> str:
-    download_dir = Path(download_root)
-    inicio = time.time()
-    temporales = [".crdownload", ".tmp", ".part"]
-    archivo_descargado = None
-    
-    print(f"[INFO] Esperando CSV para {municipio} - {tipo_personal} - {year}-{mes}")
-    
-    while time.time() - inicio < timeout:
-        try:
-            archivos = list(download_dir.iterdir())
-            for f in archivos:
-                if f.is_file():
-                    try:
-                        if f.stat().st_size == 0:
-                            continue
-                            
-                        if f.suffix.lower() == ".csv":
-                            with open(f, 'r', encoding='utf-8', errors='ignore') as test_file:
-                                test_file.read(1024)
-                            archivo_descargado = f
-                            print(f"[INFO] CSV encontrado: {f.name} ({f.stat().st_size} bytes)")
-                            break
-                    except:
-                        continue
+def buscar_csv_descargado(download_dir: Path):
+    """Devuelve el primer CSV completo (no vacío y legible) en download_dir, o None."""
+    for f in download_dir.iterdir():
+        if f.is_file():
+            try:
+                if f.stat().st_size == 0:
+                    continue
 
-            if archivo_descargado:
-                break
-                
-            time.sleep(0.5)
-        except Exception as e:
-            print(f"[WARN] Error escaneando archivos: {e}")
-            time.sleep(0.5)
-    
-    if not archivo_descargado:
-        print(f"[ERROR] No se encontró CSV para {municipio} en {timeout}s.")
-        return None
+                if f.suffix.lower() == ".csv":
+                    with open(f, 'r', encoding='utf-8', errors='ignore') as test_file:
+                        test_file.read(1024)
+                    print(f"[INFO] CSV encontrado: {f.name} ({f.stat().st_size} bytes)")
+                    return f
+            except:
+                continue
+    return None
+
+def finalizar_registros(ruta_final, download_root: str):
+    """Ganchos de un CSV que quedó en su ruta final (esquemas, índice, cubo y delta)."""
+    # El delta va último: puede borrar el crudo que leen los anteriores
+    with _LOCK_ESQUEMAS:
+        registrar_csv_final(ruta_final, download_root)
+    with _LOCK_INDICE:
+        indexar_csv_final(ruta_final, download_root)
+    with _LOCK_CUBO:
+        actualizar_cubo(ruta_final)
+    with _LOCK_DELTA:
+        registrar_csv_delta(ruta_final)
 
-    destino = download_dir / municipio / tipo_personal / str(year)
+def mover_csv_final(archivo_descargado: Path, download_root: str, municipio: str,
+                    tipo_personal: str, year: int, mes: str, id_diario: str = None) -> str:
+    destino = Path(download_root) / municipio / tipo_personal / str(year)
     destino.mkdir(parents=True, exist_ok=True)
 
     nombre_final = f"{municipio}_{tipo_personal}_{year}_{mes}.csv"
     ruta_final = destino / nombre_final
+    temp_final = None
 
     try:
         temp_final = ruta_final.with_suffix('.tmp')
+        diario = obtener_diario()
+        if diario is not None and id_diario:
+            diario.mover(id_diario, archivo_descargado, temp_final, ruta_final)
         shutil.copy2(archivo_descargado, temp_final)
         
         if temp_final.stat().st_size > 0:
@@ -132,11 +185,13 @@ def esperar_y_mover_csv(download_root: str, municipio: str, tipo_personal: str,
             
             temp_final.rename(ruta_final)
             print(f"[OK] CSV movido a: {ruta_final}")
+            registrar_descarga()
             
             try:
                 archivo_descargado.unlink()
             except:
                 pass
+            finalizar_registros(ruta_final, download_root)
                 
             return str(ruta_final)
         else:
@@ -151,4 +206,54 @@ def esperar_y_mover_csv(download_root: str, municipio: str, tipo_personal: str,
                     temp_file.unlink()
                 except:
                     pass
-        return None
\ No newline at end of file
+        return None
+
+def _esperar_descarga(download_dir: Path, municipio: str, timeout: int) -> Optional[Path]:
+    inicio = time.time()
+    while time.time() - inicio < timeout:
+        try:
+            archivo_descargado = buscar_csv_descargado(download_dir)
+            if archivo_descargado:
+                return archivo_descargado
+                
+            time.sleep(0.5)
+        except Exception as e:
+            print(f"[WARN] Error escaneando archivos: {e}")
+            time.sleep(0.5)
+    
+    print(f"[ERROR] No se encontró CSV para {municipio} en {timeout}s.")
+    return None
+
+def esperar_y_mover_csv(download_root: str, municipio: str, tipo_personal: str, 
+                       year: int, mes: str, timeout: int = 15) -> str:
+    diario = obtener_diario()
+    id_diario = diario.iniciar(Path(download_root), municipio, tipo_personal, year, mes) if diario else None
+    
+    print(f"[INFO] Esperando CSV para {municipio} - {tipo_personal} - {year}-{mes}")
+    archivo_descargado = _esperar_descarga(Path(download_root), municipio, timeout)
+    if not archivo_descargado:
+        ruta_final = None
+    else:
+        ruta_final = mover_csv_final(archivo_descargado, download_root, municipio, tipo_personal,
+                                     year, mes, id_diario=id_diario)
+    if diario is not None:
+        diario.terminar(id_diario, bool(ruta_final))
+    return ruta_final
+
+def esperar_y_encolar_csv(postproceso, download_root: str, municipio: str, tipo_personal: str,
+                          year: int, mes: str, timeout: int = 15):
+    """
+    Como esperar_y_mover_csv, pero la finalización queda en el postproceso:
+    devuelve un Future con la ruta final, o None si el CSV no llegó.
+    """
+    diario = obtener_diario()
+    id_diario = diario.iniciar(Path(download_root), municipio, tipo_personal, year, mes) if diario else None
+    
+    print(f"[INFO] Esperando CSV para {municipio} - {tipo_personal} - {year}-{mes}")
+    archivo_descargado = _esperar_descarga(Path(download_root), municipio, timeout)
+    if not archivo_descargado:
+        if diario is not None:
+            diario.terminar(id_diario, False)
+        return None
+    return postproceso.encolar(archivo_descargado, download_root, municipio, tipo_personal,
+                               year, mes, id_diario=id_diario)
@@ -0,0 +1,114 @@
+"""
+Perfiles persistentes de Chrome por worker.
+
+Con settings["browser_profile"]["enabled"] cada ejecución usa un
+user-data-dir fijo (dir/w0, dir/w1, ...) en vez de un perfil temporal, de modo
+que la caché HTTP de recursos estáticos del portal, las cookies y el
+consentimiento sobreviven entre ejecuciones. Cada slot se toma con un archivo
+.lock (pid); si hay otra instancia del scraper corriendo se usa el siguiente
+slot libre, y un lock de un proceso muerto se recupera.
+
+Antes de arrancar se limpia lo que no debe persistir: locks de Chrome, sesiones
+para restaurar y volcados de crash, y se marca la salida anterior como normal
+para que no aparezca el aviso de "restaurar páginas".
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+DEFAULTS_BROWSER_PROFILE = {
+    "enabled": False,
+    "dir": "./data/profiles",
+    "max_workers": 8,
+    "disk_cache_mb": 256,
+}
+
+# Lo que Chrome deja de una ejecución anterior y no queremos arrastrar
+_RESIDUOS = ("SingletonLock", "SingletonSocket", "SingletonCookie", "Crashpad",
+             "Default/Sessions", "Default/Current Session", "Default/Current Tabs",
+             "Default/Last Session", "Default/Last Tabs")
+
+
+def _pid_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _tomar_lock(lock: Path) -> bool:
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            pid = int(lock.read_text().strip() or 0)
+        except (OSError, ValueError):
+            pid = 0
+        if pid and _pid_vivo(pid):
+            return False
+        # Lock huérfano de una ejecución que murió
+        lock.unlink(missing_ok=True)
+        return _tomar_lock(lock)
+    with os.fdopen(fd, "w") as f:
+        f.write(str(os.getpid()))
+    return True
+
+
+def _limpiar_perfil(perfil: Path):
+    for relativo in _RESIDUOS:
+        ruta = perfil / relativo
+        if ruta.is_dir() and not ruta.is_symlink():
+            shutil.rmtree(ruta, ignore_errors=True)
+        elif ruta.exists() or ruta.is_symlink():
+            try:
+                ruta.unlink()
+            except OSError:
+                pass
+
+    preferencias = perfil / "Default" / "Preferences"
+    if preferencias.exists():
+        try:
+            datos = json.loads(preferencias.read_text(encoding="utf-8"))
+            datos.setdefault("profile", {})["exit_type"] = "Normal"
+            datos["profile"]["exited_cleanly"] = True
+            preferencias.write_text(json.dumps(datos), encoding="utf-8")
+        except (OSError, ValueError):
+            pass
+
+
+def preparar_perfil(settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Reserva un slot de perfil libre y lo deja limpio. Devuelve
+    {"user_data_dir", "disk_cache_mb", "lock"} o None si está deshabilitado
+    o no hay slots libres.
+    """
+    config = {**DEFAULTS_BROWSER_PROFILE, **(settings.get("browser_profile") or {})}
+    if not config.get("enabled"):
+        return None
+    base = Path(config["dir"]).resolve()
+    base.mkdir(parents=True, exist_ok=True)
+
+    for i in range(int(config["max_workers"])):
+        perfil = base / f"w{i}"
+        lock = base / f"w{i}.lock"
+        if not _tomar_lock(lock):
+            continue
+        perfil.mkdir(exist_ok=True)
+        _limpiar_perfil(perfil)
+        print(f"[INFO] Perfil de Chrome persistente: {perfil}")
+        return {"user_data_dir": str(perfil), "disk_cache_mb": config.get("disk_cache_mb"), "lock": str(lock)}
+
+    print(f"[WARN] No hay perfiles libres en {base}; se usa un perfil temporal.")
+    return None
+
+
+def liberar_perfil(perfil: Optional[Dict[str, Any]]):
+    if perfil:
+        Path(perfil["lock"]).unlink(missing_ok=True)
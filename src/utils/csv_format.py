@@ -0,0 +1,103 @@
+"""
+Detección de encoding y separador de los CSV del portal.
+
+Los archivos vienen en UTF-8 o Latin-1 y con ';' o ',' según el año y el
+municipio; se decide mirando solo los primeros KB.
+"""
+import codecs
+import csv
+import io
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+
+class _DialectoPuntoYComa(csv.excel):
+    delimiter = ";"
+
+
+def detectar_formato(path: Path):
+    """Devuelve (encoding, dialecto) mirando solo los primeros KB del archivo."""
+    with Path(path).open("rb") as f:
+        muestra = f.read(8192)
+    return formato_de_muestra(muestra)
+
+
+def formato_de_muestra(muestra: bytes):
+    encoding = "utf-8-sig"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(muestra, final=False)
+    except UnicodeDecodeError:
+        encoding = "latin-1"
+
+    texto = muestra.decode(encoding, errors="ignore")
+    try:
+        dialecto = csv.Sniffer().sniff(texto, delimiters=";,\t|")
+    except csv.Error:
+        dialecto = _DialectoPuntoYComa if texto.count(";") > texto.count(",") else csv.excel
+    return encoding, dialecto
+
+
+def abrir_csv(path: Path):
+    """
+    (encoding, dialecto, archivo de texto) del CSV. Si el crudo ya no está
+    porque se guardó en el almacén delta, se reconstruye en memoria.
+    """
+    path = Path(path)
+    if path.exists():
+        encoding, dialecto = detectar_formato(path)
+        return encoding, dialecto, path.open("r", encoding=encoding, errors="replace", newline="")
+    from .delta_store import leer_csv
+
+    datos = leer_csv(path)
+    encoding, dialecto = formato_de_muestra(datos[:8192])
+    return encoding, dialecto, io.TextIOWrapper(io.BytesIO(datos), encoding=encoding,
+                                                errors="replace", newline="")
+
+
+def leer_encabezado(path: Path) -> Optional[List[str]]:
+    _, dialecto, archivo = abrir_csv(path)
+    with archivo as f:
+        encabezado = next(csv.reader(f, dialecto), None)
+    if not encabezado:
+        return None
+    return [c.strip() for c in encabezado]
+
+
+def _fin_registro(datos: bytes, pos: int) -> int:
+    """Fin (exclusivo) del registro que empieza en pos; un campo entre comillas puede abarcar varias líneas."""
+    comillas = 0
+    while True:
+        salto = datos.find(b"\n", pos)
+        if salto < 0:
+            return len(datos)
+        comillas += datos.count(b'"', pos, salto)
+        pos = salto + 1
+        if comillas % 2 == 0:
+            return pos
+
+
+def registros_con_offset(datos: bytes, encoding: Optional[str] = None,
+                         dialecto=None) -> Iterator[Tuple[int, List[str]]]:
+    """(offset en bytes, campos) de cada registro del CSV; el primero es el encabezado."""
+    if encoding is None:
+        encoding, dialecto = formato_de_muestra(datos[:8192])
+    pos = 0
+    while pos < len(datos):
+        fin = _fin_registro(datos, pos)
+        fila = next(csv.reader([datos[pos:fin].decode(encoding, errors="replace")], dialecto), None)
+        yield pos, fila or []
+        pos = fin
+
+
+def leer_registro(f, offset: int, encoding: str, dialecto) -> List[str]:
+    """Campos del registro que empieza en `offset` de un archivo binario abierto, leyendo solo esas líneas."""
+    f.seek(offset)
+    partes = []
+    comillas = 0
+    for linea in iter(f.readline, b""):
+        partes.append(linea)
+        comillas += linea.count(b'"')
+        if comillas % 2 == 0:
+            break
+    texto = b"".join(partes).decode(encoding, errors="replace")
+    return next(csv.reader([texto], dialecto), None) or []
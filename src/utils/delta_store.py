@@ -0,0 +1,383 @@
+"""
+Almacenamiento delta mes a mes de los CSV de personal.
+
+El CSV de un mes repite casi completa la nómina del mes anterior. Con
+settings["delta_store"]["enabled"] cada CSV final se guarda en
+DOWNLOAD_ROOT/{org}/{tipo}/{year}/_delta/ como:
+
+  - una base (el archivo completo, gzip), o
+  - un delta contra el último mes guardado del grupo: operaciones por línea
+    ["=", i, j] (copiar líneas i..j-1 del mes de referencia) y ["+", [líneas]]
+    (insertar), también en gzip.
+
+Cada fila repite columnas que cambian de un mes a otro pero son iguales en
+todo el archivo (mes, año, organismo). Antes de comparar, en cada mes el valor
+más frecuente de esas columnas se reemplaza por un marcador (\x00), así la
+fila de una persona sin cambios es idéntica entre meses; al reconstruir se
+restituye el valor del mes. Se hace sobre el texto dividido por el separador
+(no con el parser CSV), de modo que dividir y volver a unir es exacto.
+
+manifest.json registra por archivo su referencia, el sha256 y largo del crudo y
+el resumen de cambios (altas, bajas y modificados según las columnas clave).
+Las líneas se guardan tal cual (bytes decodificados como latin-1), así que la
+reconstrucción es exacta byte a byte; reconstruir() lo verifica contra el
+sha256. Antes de borrar el crudo que dejó esperar_y_mover_csv, almacenar_csv()
+reconstruye el mes y lo compara con ese archivo.
+
+Las cadenas de deltas se cortan cada max_chain meses con una base nueva.
+"""
+import csv
+import difflib
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from .csv_format import formato_de_muestra
+from .schema_registry import alias_canonicos, normalizar_columna
+from .state_store import leer_json, guardar_json
+
+CARPETA_DELTA = "_delta"
+
+DEFAULTS_DELTA_STORE = {
+    "enabled": False,
+    "keep_raw": False,
+    "max_chain": 6,
+    "key_columns": ["apellido_paterno", "apellido_materno", "nombres"],
+}
+
+
+class DeltaInvalido(Exception):
+    """La reconstrucción de un mes no coincide con el sha256 registrado."""
+
+
+def _sha256(datos: bytes) -> str:
+    return hashlib.sha256(datos).hexdigest()
+
+
+MARCADOR = "\x00"
+MIN_COBERTURA_CONSTANTE = 0.5
+
+
+def _lineas(datos: bytes) -> List[str]:
+    return [l.decode("latin-1") for l in datos.splitlines(keepends=True)]
+
+
+def _unir(lineas: List[str]) -> bytes:
+    return "".join(lineas).encode("latin-1")
+
+
+def _constantes(lineas: List[str], separador: str) -> Dict[int, str]:
+    """Columnas cuyo valor más frecuente cubre al menos la mitad de las filas de datos."""
+    if not separador or any(MARCADOR in l for l in lineas):
+        return {}
+    filas = [l.split(separador) for l in lineas[1:]]
+    if not filas:
+        return {}
+    constantes = {}
+    for k in range(max(len(f) for f in filas)):
+        valor, n = Counter(f[k] for f in filas if len(f) > k).most_common(1)[0]
+        if valor.strip() and n >= MIN_COBERTURA_CONSTANTE * len(filas):
+            constantes[k] = valor
+    return constantes
+
+
+def _plantilla(lineas: List[str], separador: str, constantes: Dict[int, str]) -> List[str]:
+    if not constantes:
+        return lineas
+    salida = []
+    for linea in lineas:
+        partes = linea.split(separador)
+        for k, valor in constantes.items():
+            if k < len(partes) and partes[k] == valor:
+                partes[k] = MARCADOR
+        salida.append(separador.join(partes))
+    return salida
+
+
+def _restituir(lineas: List[str], separador: str, constantes: Dict[int, str]) -> List[str]:
+    if not constantes:
+        return lineas
+    salida = []
+    for linea in lineas:
+        partes = linea.split(separador)
+        for k, valor in constantes.items():
+            if k < len(partes) and partes[k] == MARCADOR:
+                partes[k] = valor
+        salida.append(separador.join(partes))
+    return salida
+
+
+def _plantilla_de(entrada: Dict[str, Any]):
+    return entrada.get("separador", ""), {int(k): v for k, v in (entrada.get("constantes") or {}).items()}
+
+
+def _diferencias(ref: List[str], nuevas: List[str]) -> List[list]:
+    ops: List[list] = []
+    matcher = difflib.SequenceMatcher(None, ref, nuevas, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            if ops and ops[-1][0] == "=" and ops[-1][2] == i1:
+                ops[-1][2] = i2
+            else:
+                ops.append(["=", i1, i2])
+        elif tag in ("replace", "insert"):
+            if ops and ops[-1][0] == "+":
+                ops[-1][1].extend(nuevas[j1:j2])
+            else:
+                ops.append(["+", nuevas[j1:j2]])
+    return ops
+
+
+def _aplicar(ref: List[str], ops: List[list]) -> List[str]:
+    salida: List[str] = []
+    for op in ops:
+        if op[0] == "=":
+            salida.extend(ref[op[1]:op[2]])
+        else:
+            salida.extend(op[1])
+    return salida
+
+
+def _funcion_clave(encabezado: str, muestra: bytes, columnas_clave: List[str]):
+    """Clave de registro (columnas de identidad) para una línea; la línea completa si no se encuentran."""
+    encoding, dialecto = formato_de_muestra(muestra)
+    alias = alias_canonicos()
+    campos = next(csv.reader([encabezado.encode("latin-1").decode(encoding, errors="replace")], dialecto), [])
+    indices = [i for i, c in enumerate(campos) if alias.get(normalizar_columna(c)) in columnas_clave]
+    if not indices:
+        return lambda linea: linea.strip()
+
+    def clave(linea: str):
+        fila = next(csv.reader([linea.encode("latin-1").decode(encoding, errors="replace")], dialecto), [])
+        return tuple(fila[i].strip().upper() if i < len(fila) else "" for i in indices)
+    return clave
+
+
+def _resumen_cambios(ref: List[str], ops: List[list], clave) -> Dict[str, int]:
+    copiadas = set()
+    insertadas: List[str] = []
+    posicion = 0
+    for op in ops:
+        if op[0] == "=":
+            copiadas.update(range(op[1], op[2]))
+            posicion += op[2] - op[1]
+        else:
+            # La línea 0 de cada archivo es el encabezado, no un registro
+            insertadas.extend(op[1][1:] if posicion == 0 else op[1])
+            posicion += len(op[1])
+    bajas = Counter(clave(l) for i, l in enumerate(ref) if i and i not in copiadas and l.strip())
+    altas = Counter(clave(l) for l in insertadas if l.strip())
+    modificados = sum((bajas & altas).values())
+    return {"altas": sum(altas.values()) - modificados,
+            "bajas": sum(bajas.values()) - modificados,
+            "modificados": modificados}
+
+
+# Últimas líneas escritas (carpeta, mes, sha256, líneas): los meses de un grupo
+# llegan uno tras otro y así el siguiente delta no tiene que recorrer la cadena
+# para reconstruir su referencia. Se guarda solo el del último grupo escrito.
+_ULTIMO: Optional[tuple] = None
+
+
+class GrupoDelta:
+    """Meses de un (org, tipo, year) guardados como base + deltas."""
+
+    def __init__(self, carpeta_year, memorizar: bool = False):
+        self.dir = Path(carpeta_year) / CARPETA_DELTA
+        self.path_manifiesto = self.dir / "manifest.json"
+        self.manifiesto = leer_json(self.path_manifiesto, default=None) or {"version": 1, "orden": [], "meses": {}}
+        # Con memorizar, leer varios meses del grupo reconstruye cada eslabón de la cadena una sola vez
+        self._memo: Optional[Dict[str, List[str]]] = {} if memorizar else None
+
+    @property
+    def meses(self) -> Dict[str, Dict[str, Any]]:
+        return self.manifiesto["meses"]
+
+    def _profundidad(self, nombre: str) -> int:
+        n = 0
+        while self.meses[nombre].get("ref"):
+            nombre = self.meses[nombre]["ref"]
+            n += 1
+        return n
+
+    def _lineas_de(self, nombre: str, desde_disco: bool = False) -> List[str]:
+        entrada = self.meses[nombre]
+        ultimo = _ULTIMO
+        if not desde_disco and ultimo is not None and ultimo[:3] == (str(self.dir), nombre, entrada["sha256"]):
+            return ultimo[3]
+        if self._memo is not None and nombre in self._memo:
+            return self._memo[nombre]
+        contenido = gzip.decompress((self.dir / entrada["archivo"]).read_bytes())
+        if entrada.get("ref") is None:
+            lineas = _lineas(contenido)
+        else:
+            ops = json.loads(contenido.decode("utf-8"))["ops"]
+            ref = _plantilla(self._lineas_de(entrada["ref"]), *_plantilla_de(self.meses[entrada["ref"]]))
+            lineas = _restituir(_aplicar(ref, ops), *_plantilla_de(entrada))
+        if self._memo is not None:
+            self._memo[nombre] = lineas
+        return lineas
+
+    def reconstruir(self, nombre: str, desde_disco: bool = False) -> bytes:
+        """Bytes exactos del CSV original; DeltaInvalido si no coincide con su sha256."""
+        if nombre not in self.meses:
+            raise FileNotFoundError(f"{nombre} no está en {self.dir}")
+        datos = _unir(self._lineas_de(nombre, desde_disco))
+        if _sha256(datos) != self.meses[nombre]["sha256"]:
+            raise DeltaInvalido(f"{self.dir / nombre}: la reconstrucción no coincide con el original")
+        return datos
+
+    def _escribir(self, nombre: str, datos: bytes, ref: Optional[str], config: Dict[str, Any]):
+        global _ULTIMO
+        nuevas = _lineas(datos)
+        separador = formato_de_muestra(datos[:8192])[1].delimiter
+        entrada: Dict[str, Any] = {"ref": ref, "sha256": _sha256(datos), "bytes": len(datos),
+                                   "lineas": len(nuevas), "separador": separador,
+                                   "constantes": _constantes(nuevas, separador)}
+        if ref is None:
+            carga = datos
+            sufijo = "base"
+        else:
+            anteriores = _plantilla(self._lineas_de(ref), *_plantilla_de(self.meses[ref]))
+            ops = _diferencias(anteriores, _plantilla(nuevas, *_plantilla_de(entrada)))
+            clave = _funcion_clave(nuevas[0] if nuevas else "", datos[:8192], config["key_columns"])
+            entrada["cambios"] = _resumen_cambios(anteriores, ops, clave)
+            carga = json.dumps({"ops": ops}, ensure_ascii=False).encode("utf-8")
+            sufijo = "delta"
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        entrada["archivo"] = f"{Path(nombre).stem}.{uuid.uuid4().hex[:8]}.{sufijo}.gz"
+        temporal = self.dir / (entrada["archivo"] + ".tmp")
+        temporal.write_bytes(gzip.compress(carga, compresslevel=6))
+        os.replace(temporal, self.dir / entrada["archivo"])
+        entrada["comprimido"] = (self.dir / entrada["archivo"]).stat().st_size
+
+        self.meses[nombre] = entrada
+        if nombre in self.manifiesto["orden"]:
+            self.manifiesto["orden"].remove(nombre)
+        self.manifiesto["orden"].append(nombre)
+        _ULTIMO = (str(self.dir), nombre, entrada["sha256"], nuevas)
+        return entrada
+
+    def _referencia(self, config: Dict[str, Any]) -> Optional[str]:
+        if not self.manifiesto["orden"]:
+            return None
+        ultimo = self.manifiesto["orden"][-1]
+        if self._profundidad(ultimo) + 1 >= int(config["max_chain"]):
+            return None
+        return ultimo
+
+    def agregar(self, nombre: str, datos: bytes, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Guarda (o reemplaza) un mes. Solo cambia el manifiesto en memoria hasta guardar()."""
+        actual = self.meses.get(nombre)
+        if actual is not None and actual["sha256"] == _sha256(datos):
+            return actual
+        dependientes = actual is not None and any(e.get("ref") == nombre for e in self.meses.values())
+        if not dependientes:
+            if actual is not None:
+                self.manifiesto["orden"].remove(nombre)
+                del self.meses[nombre]
+            return self._escribir(nombre, datos, self._referencia(config), config)
+
+        # Un mes ya referenciado cambió: se recodifica el grupo completo en el mismo orden
+        contenidos = {n: self.reconstruir(n) for n in self.manifiesto["orden"]}
+        contenidos[nombre] = datos
+        self.manifiesto["orden"] = []
+        self.manifiesto["meses"] = {}
+        self._olvidar_ultimo()
+        for n, d in contenidos.items():
+            self._escribir(n, d, self._referencia(config), config)
+        return self.meses[nombre]
+
+    def guardar(self):
+        """Publica el manifiesto y borra los archivos que ya no referencia."""
+        guardar_json(self.path_manifiesto, self.manifiesto)
+        vigentes = {e["archivo"] for e in self.meses.values()} | {self.path_manifiesto.name}
+        for archivo in self.dir.iterdir():
+            if archivo.name not in vigentes:
+                archivo.unlink(missing_ok=True)
+
+    def descartar_cambios(self):
+        self.manifiesto = leer_json(self.path_manifiesto, default=None) or {"version": 1, "orden": [], "meses": {}}
+        self._olvidar_ultimo()
+
+    def _olvidar_ultimo(self):
+        global _ULTIMO
+        if _ULTIMO is not None and _ULTIMO[0] == str(self.dir):
+            _ULTIMO = None
+
+
+# ----------------------------------------------------------------------
+# API del módulo
+# ----------------------------------------------------------------------
+_CONFIG: Dict[str, Any] = dict(DEFAULTS_DELTA_STORE)
+
+
+def configurar_delta(settings: Dict[str, Any]) -> Dict[str, Any]:
+    global _CONFIG
+    _CONFIG = {**DEFAULTS_DELTA_STORE, **(settings.get("delta_store") or {})}
+    return _CONFIG
+
+
+def almacenar_csv(ruta_csv, config: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Guarda el CSV final en el almacén delta de su carpeta, verifica que se
+    reconstruye idéntico y, salvo keep_raw, borra el crudo. No lanza excepciones.
+    """
+    config = {**DEFAULTS_DELTA_STORE, **(config or _CONFIG)}
+    ruta_csv = Path(ruta_csv)
+    grupo = GrupoDelta(ruta_csv.parent)
+    try:
+        datos = ruta_csv.read_bytes()
+        entrada = grupo.agregar(ruta_csv.name, datos, config)
+        if grupo.reconstruir(ruta_csv.name, desde_disco=True) != datos:
+            raise DeltaInvalido(f"{ruta_csv.name}: la reconstrucción difiere del crudo")
+        grupo.guardar()
+    except Exception as e:
+        print(f"[WARN] No se pudo guardar {ruta_csv.name} en el almacén delta: {e}. Se conserva el CSV.")
+        grupo.descartar_cambios()
+        return False
+
+    cambios = entrada.get("cambios")
+    detalle = (f"delta vs {entrada['ref']} (+{cambios['altas']} -{cambios['bajas']} ~{cambios['modificados']})"
+               if cambios else "base")
+    print(f"[DELTA] {ruta_csv.name}: {detalle}, {entrada['bytes']} -> {entrada['comprimido']} bytes")
+    if not config.get("keep_raw"):
+        ruta_csv.unlink(missing_ok=True)
+    return True
+
+
+def registrar_csv_delta(ruta_csv) -> bool:
+    """Gancho para cuando un CSV queda en su ruta final (solo con delta_store.enabled)."""
+    if not _CONFIG.get("enabled"):
+        return False
+    return almacenar_csv(ruta_csv, _CONFIG)
+
+
+def nombres_en_delta(carpeta_year) -> Dict[str, int]:
+    """{nombre del CSV: bytes del original} de los meses guardados en la carpeta."""
+    manifiesto = leer_json(Path(carpeta_year) / CARPETA_DELTA / "manifest.json", default=None)
+    if not manifiesto:
+        return {}
+    return {n: e.get("bytes", 0) for n, e in manifiesto.get("meses", {}).items()}
+
+
+def csv_existente(ruta_csv, minimo: int = 1024) -> bool:
+    """El CSV final existe con más de `minimo` bytes, como crudo o en el almacén delta."""
+    ruta_csv = Path(ruta_csv)
+    if ruta_csv.exists():
+        return ruta_csv.stat().st_size > minimo
+    return nombres_en_delta(ruta_csv.parent).get(ruta_csv.name, 0) > minimo
+
+
+def leer_csv(ruta_csv) -> bytes:
+    """Bytes del CSV: el crudo si existe, si no se reconstruye desde el almacén delta."""
+    ruta_csv = Path(ruta_csv)
+    if ruta_csv.exists():
+        return ruta_csv.read_bytes()
+    return GrupoDelta(ruta_csv.parent).reconstruir(ruta_csv.name)
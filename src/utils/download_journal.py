@@ -0,0 +1,215 @@
+"""
+Diario (write-ahead) de descargas en curso.
+
+Cada descarga deja líneas JSON en STATE_DIR/diario_descargas.jsonl antes de
+cada paso que puede quedar a medias:
+
+    {"ev": "inicio", "id": ..., "dir": carpeta de descargas, "org", "tipo", "year", "mes"}
+    {"ev": "mover",  "id": ..., "origen": csv descargado, "tmp": ..., "final": ...}
+    {"ev": "fin",    "id": ..., "ok": true|false}
+
+Al arrancar, recuperar_descargas() lee solo este archivo: las entradas sin
+"fin" se rehacen (un CSV ya completo en la carpeta de descargas se mueve a su
+ruta final) o se limpian (.tmp a medio copiar, .crdownload, finales vacíos).
+Luego el diario se trunca. Nunca se recorre el árbol de DOWNLOAD_ROOT.
+"""
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+EXTENSIONES_TEMPORALES = (".crdownload", ".tmp", ".part")
+
+
+class DiarioDescargas:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._archivo = None
+        self._lock = threading.Lock()  # el postproceso escribe desde sus propios hilos
+
+    def _escribir(self, evento: Dict[str, Any]):
+        linea = json.dumps(evento, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._archivo is None:
+                self._archivo = self.path.open("a", encoding="utf-8")
+            self._archivo.write(linea)
+            self._archivo.flush()
+            os.fsync(self._archivo.fileno())
+
+    def iniciar(self, download_dir, org_code: str, tipo: str, year: int, mes: str) -> str:
+        id_entrada = uuid.uuid4().hex[:12]
+        self._escribir({"ev": "inicio", "id": id_entrada, "dir": str(download_dir),
+                        "org": org_code, "tipo": tipo, "year": year, "mes": mes})
+        return id_entrada
+
+    def mover(self, id_entrada: str, origen, tmp, final):
+        self._escribir({"ev": "mover", "id": id_entrada, "origen": str(origen),
+                        "tmp": str(tmp), "final": str(final)})
+
+    def terminar(self, id_entrada: str, ok: bool):
+        self._escribir({"ev": "fin", "id": id_entrada, "ok": bool(ok)})
+
+    def pendientes(self) -> Dict[str, Dict[str, Any]]:
+        """Entradas sin evento "fin", con los datos de todos sus eventos combinados."""
+        abiertas: Dict[str, Dict[str, Any]] = {}
+        if not self.path.exists():
+            return abiertas
+        with self.path.open("r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    evento = json.loads(linea)
+                except json.JSONDecodeError:
+                    continue  # última línea cortada por el corte
+                if evento.get("ev") == "fin":
+                    abiertas.pop(evento.get("id"), None)
+                else:
+                    abiertas.setdefault(evento.get("id"), {}).update(evento)
+        return abiertas
+
+    def truncar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+        self.path.write_text("", encoding="utf-8")
+
+
+def _borrar(path: Optional[Path]):
+    if path is None:
+        return
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"[WARN] No se pudo borrar {path}: {e}")
+
+
+def _limpiar_carpeta_descargas(carpeta: Path) -> int:
+    """Borra descargas a medias de Chrome en la carpeta (sin recursión)."""
+    borrados = 0
+    try:
+        with os.scandir(carpeta) as it:
+            for e in it:
+                if e.is_file() and (e.name.endswith(EXTENSIONES_TEMPORALES)
+                                    or (e.name.endswith(".csv") and e.stat().st_size == 0)):
+                    _borrar(Path(e.path))
+                    borrados += 1
+    except FileNotFoundError:
+        pass
+    return borrados
+
+
+def _ruta_final(entrada: Dict[str, Any], download_root: str) -> Path:
+    if entrada.get("final"):
+        return Path(entrada["final"])
+    return (Path(download_root) / entrada["org"] / entrada["tipo"] / str(entrada["year"])
+            / f"{entrada['org']}_{entrada['tipo']}_{entrada['year']}_{entrada['mes']}.csv")
+
+
+def _rehacer(entrada: Dict[str, Any], download_root: str) -> str:
+    """Completa o limpia una descarga interrumpida. Devuelve qué se hizo."""
+    final = _ruta_final(entrada, download_root)
+    tmp = Path(entrada["tmp"]) if entrada.get("tmp") else None
+    _borrar(tmp)
+
+    if final.exists() and final.stat().st_size == 0:
+        _borrar(final)
+
+    origen = Path(entrada["origen"]) if entrada.get("origen") else None
+    if origen is None:
+        # Murió esperando la descarga: si Chrome alcanzó a terminarla, el CSV
+        # completo está en la carpeta de descargas de esa entrada
+        carpeta = Path(entrada.get("dir", ""))
+        candidatos = sorted(carpeta.glob("*.csv")) if carpeta.is_dir() else []
+        candidatos = [c for c in candidatos if c.stat().st_size > 0]
+        origen = candidatos[0] if len(candidatos) == 1 else None
+
+    if final.exists():
+        _borrar(origen)
+        return "completa"
+    if origen is not None and origen.exists() and origen.stat().st_size > 0:
+        final.parent.mkdir(parents=True, exist_ok=True)
+        tmp = final.with_suffix(".tmp")
+        shutil.copy2(origen, tmp)
+        tmp.replace(final)
+        _borrar(origen)
+        return "rehecha"
+    return "descartada"
+
+
+_DIARIO: Optional[DiarioDescargas] = None
+
+
+def cargar_diario(state_dir: str) -> DiarioDescargas:
+    global _DIARIO
+    path = Path(state_dir) / "diario_descargas.jsonl"
+    if _DIARIO is None or _DIARIO.path != path:
+        _DIARIO = DiarioDescargas(path)
+    return _DIARIO
+
+
+def obtener_diario() -> Optional[DiarioDescargas]:
+    return _DIARIO
+
+
+def recuperar_descargas(download_root: str, state_dir: str) -> Dict[str, Any]:
+    """
+    Rehace o limpia lo que quedó en vuelo según el diario y limpia las
+    carpetas de descarga (DOWNLOAD_ROOT, _http y _prefetch/*, sin recursión;
+    _historico/* se borra entero y de _postproceso se borra lo que el diario no
+    rehízo).
+
+    Devuelve los conteos por acción y en "rutas" los CSV finales rehechos o ya
+    completos: el corte pudo llegar antes de los ganchos de mover_csv_final,
+    así que quien llama debe pasarlos por browser_helpers.finalizar_registros.
+    """
+    diario = cargar_diario(state_dir)
+    conteo: Dict[str, Any] = {"completa": 0, "rehecha": 0, "descartada": 0, "rutas": []}
+    for entrada in diario.pendientes().values():
+        try:
+            accion = _rehacer(entrada, download_root)
+        except (OSError, KeyError) as e:
+            print(f"[WARN] No se pudo recuperar la descarga {entrada.get('id')}: {e}")
+            accion = "descartada"
+        conteo[accion] += 1
+        if accion != "descartada":
+            conteo["rutas"].append(str(_ruta_final(entrada, download_root)))
+        if accion != "completa":
+            print(f"[DIARIO] {entrada.get('org')} {entrada.get('tipo')} {entrada.get('year')} "
+                  f"{entrada.get('mes')}: {accion}")
+    diario.truncar()
+
+    carpetas = [Path(download_root), Path(download_root) / "_http"]
+    prefetch = Path(download_root) / "_prefetch"
+    if prefetch.is_dir():
+        carpetas.extend(p for p in prefetch.iterdir() if p.is_dir())
+    conteo["temporales"] = sum(_limpiar_carpeta_descargas(c) for c in carpetas)
+    for carpeta in carpetas:
+        if carpeta.parent.name == "_prefetch":
+            try:
+                carpeta.rmdir()  # una por descarga: se borran las que quedaron vacías
+            except OSError:
+                pass
+
+    historicos = Path(download_root) / "_historico"
+    if historicos.is_dir():
+        # Solo quedan CSV anuales o divisiones a medias: se vuelven a bajar
+        for carpeta in historicos.iterdir():
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+    apartados = Path(download_root) / "_postproceso"
+    if apartados.is_dir():
+        # Lo anotado en el diario ya se rehízo arriba; el resto no tiene a qué mes volver con certeza
+        for archivo in apartados.iterdir():
+            if archivo.is_file():
+                _borrar(archivo)
+                conteo["temporales"] += 1
+
+    if conteo["rehecha"] or conteo["descartada"] or conteo["temporales"]:
+        print(f"[INFO] Recuperación: {conteo['rehecha']} descargas completadas, "
+              f"{conteo['descartada']} descartadas, {conteo['temporales']} temporales borrados")
+    return conteo
@@ -0,0 +1,194 @@
+"""
+Exportación "registro histórico" dividida por mes.
+
+Algunos municipios ofrecen, junto a los meses, un enlace "Registro histórico"
+cuyo CSV trae el año completo (o varios años). Con
+settings["historical_export"]["enabled"], procesar_municipio lo descarga una
+vez por org/tipo/año y dividir_por_mes() lo separa en un CSV por mes con el
+mismo layout {org}_{tipo}_{year}_{mes}.csv. Cada archivo mensual conserva el
+encabezado y los bytes originales de sus registros (mismo encoding y
+separador), así que para el resto del pipeline es igual a una descarga mensual.
+
+Sin columna de año no se divide (un histórico de varios años mezclaría sus
+filas), salvo que historical_export.single_year confirme que el portal exporta
+un solo año. Cada parte se anota en el diario de descargas como una descarga
+mensual más.
+
+Los meses que el histórico no trae se siguen descargando por la vía mensual.
+"""
+import re
+import shutil
+import time
+import unicodedata
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from .browser_helpers import espera_click, mover_csv_final, _esperar_descarga
+from .csv_format import formato_de_muestra, registros_con_offset
+from .download_journal import obtener_diario
+from .schema_registry import alias_canonicos, normalizar_columna
+
+DEFAULTS_HISTORICAL_EXPORT = {
+    "enabled": False,
+    "min_months": 3,
+    "single_year": False,  # el CSV histórico trae solo el año abierto aunque no tenga columna de año
+}
+
+CARPETA_HISTORICO = "_historico"
+
+
+def _normalizar_mes(valor: str) -> str:
+    sin_tildes = unicodedata.normalize("NFKD", valor).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "", sin_tildes.lower())
+
+
+def _indice_meses(calendario: List[str]) -> Dict[str, str]:
+    """
+    Valor normalizado de la columna mes -> nombre configurado ('enero', '1', '01' -> 'Enero').
+    `calendario` son los 12 meses de settings en orden: el número sale de su posición.
+    """
+    indice = {}
+    for i, mes in enumerate(calendario, start=1):
+        for alias in (mes, mes[:3], str(i), f"{i:02d}"):
+            indice.setdefault(_normalizar_mes(alias), mes)
+    return indice
+
+
+def dividir_por_mes(datos: bytes, calendario: List[str], year: Optional[int] = None,
+                    meses: Optional[List[str]] = None, un_solo_anio: bool = False) -> Dict[str, bytes]:
+    """
+    Separa el CSV histórico en {mes: bytes del CSV mensual}. `calendario` es la
+    lista completa de meses (settings["months"]) y `meses`, si se da, limita el
+    resultado a esos. Si hay columna de año, solo se toman las filas de `year`.
+    Devuelve {} si no hay columna de mes, o si no hay columna de año (o `year`)
+    y no se confirmó con `un_solo_anio` que el CSV trae un único año.
+    """
+    encoding, dialecto = formato_de_muestra(datos[:8192])
+    registros = registros_con_offset(datos, encoding, dialecto)
+    primero = next(registros, None)
+    if primero is None:
+        return {}
+    alias = alias_canonicos()
+    canonicas = [alias.get(normalizar_columna(c)) for c in primero[1]]
+    if "mes" not in canonicas:
+        return {}
+    i_mes = canonicas.index("mes")
+    if "anio" in canonicas and year is not None:
+        i_anio = canonicas.index("anio")
+    elif un_solo_anio:
+        i_anio = None
+    else:
+        return {}
+    indice = _indice_meses(calendario)
+    buscados = set(meses) if meses is not None else None
+
+    offsets = []
+    for offset, fila in registros:
+        offsets.append((offset, fila))
+    limites = [o for o, _ in offsets[1:]] + [len(datos)]
+    encabezado = datos[:offsets[0][0]] if offsets else datos
+
+    partes: Dict[str, List[bytes]] = {}
+    for (inicio, fila), fin in zip(offsets, limites):
+        if i_mes >= len(fila):
+            continue
+        if i_anio is not None and (i_anio >= len(fila) or fila[i_anio].strip() != str(year)):
+            continue
+        mes = indice.get(_normalizar_mes(fila[i_mes]))
+        if mes is not None and (buscados is None or mes in buscados):
+            partes.setdefault(mes, []).append(datos[inicio:fin])
+
+    resultado = {}
+    for mes, registros_mes in partes.items():
+        cuerpo = b"".join(registros_mes)
+        if not cuerpo.endswith((b"\n", b"\r")):
+            cuerpo += b"\r\n" if b"\r\n" in encabezado else b"\n"
+        resultado[mes] = encabezado + cuerpo
+    return resultado
+
+
+def configuracion_historico(settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    config = {**DEFAULTS_HISTORICAL_EXPORT, **(settings.get("historical_export") or {})}
+    return config if config["enabled"] else None
+
+
+def _fijar_carpeta_descargas(driver, carpeta: Path):
+    driver.execute_cdp_cmd("Page.setDownloadBehavior", {"behavior": "allow", "downloadPath": str(carpeta)})
+
+
+def descargar_historico(driver, modulo: Dict[str, Any], org_code: str, tipo: str, year: int,
+                        pendientes: List[str], calendario: List[str], download_root: str,
+                        descargar_csv, xpath_cache=None,
+                        timeout_click: float = 2, timeout_espera: float = 30,
+                        postproceso=None, un_solo_anio: bool = False) -> Dict[str, Tuple[Optional[str], Any]]:
+    """
+    Con la página ya en el año, abre "Registro histórico", descarga su CSV a
+    DOWNLOAD_ROOT/_historico/{id}/ y finaliza un CSV por cada mes de `pendientes`
+    que traiga (`calendario`: los 12 meses de settings, para los meses numéricos;
+    `un_solo_anio`: ver dividir_por_mes). Devuelve {mes: (ruta final, Future
+    del postproceso)}; los meses que falten quedan para la vía mensual. `descargar_csv` es la función de
+    navigation_helpers (se recibe para no importarla en círculo).
+    """
+    config = next((sa for sa in modulo.get("scraping_actions", [])
+                   if sa.get("type") == "select_historico"), None)
+    if not config or not config.get("xpaths"):
+        return {}
+
+    cache_key = (org_code, tipo, "historico")
+    xpaths = config["xpaths"]
+    if xpath_cache is not None and cache_key in xpath_cache:
+        xpaths = [xpath_cache[cache_key]] + [x for x in xpaths if x != xpath_cache[cache_key]]
+    xpath_ok = next((xp for xp in xpaths if espera_click(driver, xp, timeout=timeout_click, scroll=True,
+                                                          paso="historico", org_code=org_code)), None)
+    if xpath_ok is None:
+        print(f"[HIST] ({org_code}) Sin registro histórico para {tipo} {year}; se sigue por mes")
+        return {}
+    if xpath_cache is not None:
+        xpath_cache[cache_key] = xpath_ok
+
+    carpeta = Path(download_root).resolve() / CARPETA_HISTORICO / uuid.uuid4().hex[:10]
+    carpeta.mkdir(parents=True, exist_ok=True)
+    resultado: Dict[str, Tuple[Optional[str], Any]] = {}
+    try:
+        _fijar_carpeta_descargas(driver, carpeta)
+        exito_csv, _ = descargar_csv(driver, modulo, org_code, timeout=timeout_click, tipo=tipo)
+        archivo = _esperar_descarga(carpeta, org_code, timeout_espera) if exito_csv else None
+        if archivo is None:
+            print(f"[HIST] ({org_code}) No se pudo descargar el histórico de {tipo} {year}; se sigue por mes")
+            return {}
+
+        t_division = time.time()
+        partes = dividir_por_mes(archivo.read_bytes(), calendario, year, meses=pendientes,
+                                 un_solo_anio=un_solo_anio)
+        if not partes:
+            print(f"[HIST] ({org_code}) El histórico de {tipo} {year} no trae columnas de mes y año reconocibles")
+        diario = obtener_diario()
+        for mes in pendientes:
+            if mes not in partes:
+                continue
+            parcial = carpeta / f"{org_code}_{tipo}_{year}_{mes}.csv"
+            parcial.write_bytes(partes[mes])
+            id_diario = diario.iniciar(carpeta, org_code, tipo, year, mes) if diario else None
+            if postproceso is not None:
+                resultado[mes] = (None, postproceso.encolar(parcial, download_root, org_code, tipo, year, mes,
+                                                            id_diario=id_diario))
+            else:
+                ruta = mover_csv_final(parcial, download_root, org_code, tipo, year, mes, id_diario=id_diario)
+                if diario is not None:
+                    diario.terminar(id_diario, bool(ruta))
+                if ruta:
+                    resultado[mes] = (ruta, None)
+        faltan = [m for m in pendientes if m not in resultado]
+        print(f"[HIST] ({org_code}) Histórico {tipo} {year}: {len(resultado)} meses en "
+              f"{time.time() - t_division:.1f}s" + (f"; por mes: {', '.join(faltan)}" if faltan else ""))
+        return resultado
+    except Exception as e:
+        print(f"[WARN] ({org_code}) Falló el registro histórico de {tipo} {year}: {e}")
+        return resultado
+    finally:
+        try:
+            _fijar_carpeta_descargas(driver, Path(download_root).resolve())
+        except Exception as e:
+            print(f"[WARN] No se pudo restaurar la carpeta de descargas: {e}")
+        shutil.rmtree(carpeta, ignore_errors=True)
@@ -0,0 +1,319 @@
+"""
+Grabación y reproducción de las respuestas del portal.
+
+settings["http_archive"]["mode"]:
+
+  "record"  todo lo que piden Chrome y el motor HTTP se reenvía al portal y
+            la respuesta (páginas, AJAX de PrimeFaces, exportaciones CSV) se
+            guarda en el archivo, agrupada por el municipio en curso.
+  "replay"  no se sale a la red: cada petición se responde desde el archivo.
+            Lo que no está grabado devuelve 404 (Chrome) o ConnectionError
+            (motor HTTP), así que una diferencia de flujo se ve de inmediato.
+
+Chrome pasa por un proxy local (ProxyArchivo) que termina el TLS con un
+certificado propio generado con openssl (Chrome se lanza con
+--ignore-certificate-errors); el motor HTTP monta AdaptadorArchivo en su
+requests.Session. Estructura en disco:
+
+    {dir}/{org}/entradas.jsonl    una línea por respuesta: clave, método, url,
+                                  estado, headers y sha256 del cuerpo
+    {dir}/_cuerpos/ab/abcd....gz  cuerpos deduplicados
+    {dir}/_tls/                   certificado del proxy
+
+La clave de una petición es método + URL + cuerpo, sin javax.faces.ViewState
+(cambia en cada visita). Si la misma clave se grabó varias veces se responde
+en el mismo orden en que se grabó.
+"""
+import gzip
+import hashlib
+import json
+import ssl
+import subprocess
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+DEFAULTS_HTTP_ARCHIVE = {
+    "mode": "off",
+    "dir": "http_archive",
+    "port": 8765,
+}
+
+ORG_COMUN = "_comun"
+PARAMETROS_VOLATILES = ("javax.faces.ViewState",)
+# El cuerpo se guarda ya decodificado, así que estos headers dejan de valer
+HEADERS_DESCARTADOS = {"content-encoding", "transfer-encoding", "content-length", "connection",
+                       "keep-alive", "proxy-connection", "strict-transport-security", "alt-svc"}
+
+
+def clave_peticion(metodo: str, url: str, cuerpo: Optional[bytes]) -> str:
+    cuerpo = cuerpo or b""
+    try:
+        pares = parse_qsl(cuerpo.decode("utf-8"), keep_blank_values=True, strict_parsing=True)
+        cuerpo = urlencode([(k, v) for k, v in pares if k not in PARAMETROS_VOLATILES]).encode("utf-8")
+    except (UnicodeDecodeError, ValueError):
+        pass  # no es un formulario: se usa tal cual
+    return hashlib.sha1(b"\n".join([metodo.upper().encode(), url.encode("utf-8"), cuerpo])).hexdigest()
+
+
+class ArchivoHTTP:
+    def __init__(self, carpeta):
+        self.carpeta = Path(carpeta)
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        self.org = ORG_COMUN
+        self._lock = threading.Lock()
+        # org -> clave -> entradas en orden de grabación
+        self.entradas: Dict[str, Dict[str, List[Dict[str, Any]]]] = defaultdict(lambda: defaultdict(list))
+        self._cursores: Dict[Tuple[str, str], int] = {}
+        self.aciertos = self.fallos = 0
+        for archivo in self.carpeta.glob("*/entradas.jsonl"):
+            with archivo.open("r", encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        entrada = json.loads(linea)
+                    except json.JSONDecodeError:
+                        continue  # última línea cortada
+                    self.entradas[archivo.parent.name][entrada["clave"]].append(entrada)
+
+    def _ruta_cuerpo(self, sha: str) -> Path:
+        return self.carpeta / "_cuerpos" / sha[:2] / f"{sha}.gz"
+
+    def grabar(self, metodo: str, url: str, cuerpo_peticion: Optional[bytes], estado: int,
+               headers: List[Tuple[str, str]], cuerpo: bytes):
+        sha = hashlib.sha256(cuerpo).hexdigest()
+        ruta = self._ruta_cuerpo(sha)
+        entrada = {
+            "clave": clave_peticion(metodo, url, cuerpo_peticion),
+            "metodo": metodo.upper(),
+            "url": url,
+            "estado": estado,
+            "headers": [[k, v] for k, v in headers if k.lower() not in HEADERS_DESCARTADOS],
+            "cuerpo": sha,
+        }
+        with self._lock:
+            if not ruta.exists():
+                ruta.parent.mkdir(parents=True, exist_ok=True)
+                ruta.write_bytes(gzip.compress(cuerpo, compresslevel=5))
+            carpeta_org = self.carpeta / self.org
+            carpeta_org.mkdir(exist_ok=True)
+            with (carpeta_org / "entradas.jsonl").open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            self.entradas[self.org][entrada["clave"]].append(entrada)
+
+    def buscar(self, metodo: str, url: str, cuerpo_peticion: Optional[bytes]
+               ) -> Optional[Tuple[int, List[Tuple[str, str]], bytes]]:
+        """Respuesta grabada (estado, headers, cuerpo): primero del org en curso, luego de cualquiera."""
+        clave = clave_peticion(metodo, url, cuerpo_peticion)
+        with self._lock:
+            orgs = [self.org] + [o for o in self.entradas if o != self.org]
+            for org in orgs:
+                lista = self.entradas.get(org, {}).get(clave)
+                if lista:
+                    indice = self._cursores.get((org, clave), 0)
+                    self._cursores[(org, clave)] = indice + 1
+                    entrada = lista[min(indice, len(lista) - 1)]
+                    self.aciertos += 1
+                    break
+            else:
+                self.fallos += 1
+                return None
+        cuerpo = gzip.decompress(self._ruta_cuerpo(entrada["cuerpo"]).read_bytes())
+        return entrada["estado"], [tuple(h) for h in entrada["headers"]], cuerpo
+
+
+# ----------------------------------------------------------------------
+# Motor HTTP (requests)
+# ----------------------------------------------------------------------
+class AdaptadorArchivo(HTTPAdapter):
+    def __init__(self, archivo: ArchivoHTTP, modo: str, **kwargs):
+        super().__init__(**kwargs)
+        self.archivo = archivo
+        self.modo = modo
+
+    def send(self, request, **kwargs):
+        cuerpo = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        if self.modo == "record":
+            respuesta = super().send(request, **kwargs)
+            self.archivo.grabar(request.method, request.url, cuerpo, respuesta.status_code,
+                                list(respuesta.raw.headers.items()), respuesta.content)
+            return respuesta
+
+        grabada = self.archivo.buscar(request.method, request.url, cuerpo)
+        if grabada is None:
+            raise requests.ConnectionError(f"Sin grabación para {request.method} {request.url}", request=request)
+        estado, headers, contenido = grabada
+        respuesta = requests.Response()
+        respuesta.status_code = estado
+        respuesta.headers = CaseInsensitiveDict(headers)
+        respuesta._content = contenido
+        respuesta._content_consumed = True
+        respuesta.url = request.url
+        respuesta.request = request
+        respuesta.encoding = get_encoding_from_headers(respuesta.headers)
+        respuesta.reason = "Replay"
+        return respuesta
+
+
+# ----------------------------------------------------------------------
+# Chrome (proxy local)
+# ----------------------------------------------------------------------
+def _certificado(carpeta: Path) -> Tuple[Path, Path]:
+    carpeta.mkdir(parents=True, exist_ok=True)
+    cert, llave = carpeta / "proxy.crt", carpeta / "proxy.key"
+    if not (cert.exists() and llave.exists()):
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "3650",
+                        "-subj", "/CN=pdt-archivo", "-keyout", str(llave), "-out", str(cert)],
+                       check=True, capture_output=True)
+    return cert, llave
+
+
+class _ManejadorProxy(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    servidor: "ProxyArchivo" = None  # se fija en ProxyArchivo
+    _destino: Optional[str] = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_CONNECT(self):
+        # Se termina el TLS aquí y se siguen atendiendo las peticiones del túnel
+        self._destino = self.path[:-4] if self.path.endswith(":443") else self.path
+        self.send_response(200, "Connection Established")
+        self.end_headers()
+        self.wfile.flush()
+        try:
+            self.connection = self.servidor.contexto_tls.wrap_socket(self.connection, server_side=True)
+        except (ssl.SSLError, OSError):
+            self.close_connection = True
+            return
+        self.rfile = self.connection.makefile("rb", self.rbufsize)
+        self.wfile = self.connection.makefile("wb")
+        self.close_connection = False
+
+    def _atender(self):
+        url = f"https://{self._destino}{self.path}" if self._destino else self.path
+        largo = int(self.headers.get("Content-Length") or 0)
+        cuerpo = self.rfile.read(largo) if largo else None
+        archivo = self.servidor.archivo
+
+        if self.servidor.modo == "replay":
+            grabada = archivo.buscar(self.command, url, cuerpo)
+            if grabada is None:
+                self._responder(404, [], b"")
+                return
+            self._responder(*grabada)
+            return
+
+        headers = {k: v for k, v in self.headers.items()
+                   if k.lower() not in HEADERS_DESCARTADOS and k.lower() not in ("host", "accept-encoding")}
+        try:
+            respuesta = self.servidor.sesion().request(self.command, url, headers=headers, data=cuerpo,
+                                                       allow_redirects=False, timeout=60)
+        except requests.RequestException as e:
+            self._responder(502, [], str(e).encode("utf-8"))
+            return
+        pares = list(respuesta.raw.headers.items())
+        archivo.grabar(self.command, url, cuerpo, respuesta.status_code, pares, respuesta.content)
+        self._responder(respuesta.status_code, pares, respuesta.content)
+
+    def _responder(self, estado: int, headers: List[Tuple[str, str]], cuerpo: bytes):
+        self.send_response(estado)
+        for k, v in headers:
+            if k.lower() not in HEADERS_DESCARTADOS:
+                self.send_header(k, v)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(cuerpo)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = do_HEAD = _atender
+
+
+class ProxyArchivo:
+    def __init__(self, archivo: ArchivoHTTP, modo: str, puerto: int = 8765):
+        self.archivo = archivo
+        self.modo = modo
+        cert, llave = _certificado(archivo.carpeta / "_tls")
+        self.contexto_tls = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.contexto_tls.load_cert_chain(str(cert), str(llave))
+        self._sesiones = threading.local()
+
+        manejador = type("ManejadorProxy", (_ManejadorProxy,), {"servidor": self})
+        self.http = ThreadingHTTPServer(("127.0.0.1", int(puerto)), manejador)
+        self.http.daemon_threads = True
+        self.hilo = threading.Thread(target=self.http.serve_forever, name="proxy-archivo", daemon=True)
+        self.hilo.start()
+
+    @property
+    def direccion(self) -> str:
+        return f"127.0.0.1:{self.http.server_address[1]}"
+
+    def sesion(self) -> requests.Session:
+        if not hasattr(self._sesiones, "s"):
+            self._sesiones.s = requests.Session()
+            self._sesiones.s.trust_env = False
+        return self._sesiones.s
+
+    def cerrar(self):
+        self.http.shutdown()
+        self.http.server_close()
+
+
+# ----------------------------------------------------------------------
+# Configuración global
+# ----------------------------------------------------------------------
+_ARCHIVO: Optional[ArchivoHTTP] = None
+_MODO = "off"
+_PROXY: Optional[ProxyArchivo] = None
+
+
+def configurar_archivo_http(settings: Dict[str, Any]) -> Optional[ArchivoHTTP]:
+    global _ARCHIVO, _MODO
+    config = {**DEFAULTS_HTTP_ARCHIVE, **(settings.get("http_archive") or {})}
+    _MODO = config["mode"] if config["mode"] in ("record", "replay") else "off"
+    _ARCHIVO = ArchivoHTTP(config["dir"]) if _MODO != "off" else None
+    if _ARCHIVO is not None:
+        grabadas = sum(len(v) for org in _ARCHIVO.entradas.values() for v in org.values())
+        print(f"[ARCHIVO] Modo {_MODO} en {config['dir']} ({grabadas} respuestas grabadas)")
+    return _ARCHIVO
+
+
+def iniciar_proxy_archivo(settings: Dict[str, Any]) -> Optional[str]:
+    """Levanta el proxy para Chrome (una sola vez) y devuelve host:puerto, o None si está apagado."""
+    global _PROXY
+    if _ARCHIVO is None:
+        return None
+    if _PROXY is None:
+        config = {**DEFAULTS_HTTP_ARCHIVE, **(settings.get("http_archive") or {})}
+        _PROXY = ProxyArchivo(_ARCHIVO, _MODO, config["port"])
+    return _PROXY.direccion
+
+
+def crear_adaptador(**kwargs) -> HTTPAdapter:
+    """Adaptador para requests.Session: graba o reproduce si el archivo está activo."""
+    if _ARCHIVO is None:
+        return HTTPAdapter(**kwargs)
+    return AdaptadorArchivo(_ARCHIVO, _MODO, **kwargs)
+
+
+def fijar_org_archivo(org_code: Optional[str]):
+    """Agrupa lo que se grabe desde ahora bajo este municipio."""
+    if _ARCHIVO is not None:
+        _ARCHIVO.org = org_code or ORG_COMUN
+
+
+def cerrar_archivo_http():
+    global _PROXY
+    if _PROXY is not None:
+        _PROXY.cerrar()
+        _PROXY = None
+    if _ARCHIVO is not None and _MODO == "replay":
+        print(f"[ARCHIVO] Respuestas reproducidas: {_ARCHIVO.aciertos} | sin grabación: {_ARCHIVO.fallos}")
@@ -0,0 +1,452 @@
+"""
+Motor sin navegador sobre el backend JSF/AJAX del portal.
+
+Recorre el mismo flujo que procesar_municipio (tipo -> área -> año -> mes ->
+CSV) usando los XPaths de actions_transparencia.json, pero sobre el HTML que
+devuelve el servidor (lxml) en vez de un DOM renderizado. Cada enlace
+encontrado se traduce a la petición que dispararía el navegador:
+
+  - PrimeFaces.ab({s:..., u:...})            -> POST parcial (Faces-Request: partial/ajax);
+                                               las <update> de la respuesta se aplican al
+                                               árbol y se actualiza el javax.faces.ViewState.
+  - mojarra.jsfcljs(...) / addSubmitParam()  -> POST completo del formulario.
+  - href real                                -> GET.
+
+La sesión (cookies, ViewState) vive en un requests.Session con pool de
+conexiones y reintentos (solo GET: los POST de JSF dependen del ViewState y no
+se repiten). Un año o mes que no aparece dentro del contenedor de pestañas ya
+renderizado es un dato no publicado: se anota en la caché negativa igual que
+en Selenium, es decir, solo si el área municipal se abrió o se sabe que ese
+tipo no la tiene (estructura compartida con procesar_municipio). Si algún paso no se puede reproducir (sin tipo de personal ni
+pestañas, enlace sin acción reconocible, respuesta inesperada) se lanza
+PasoNoResuelto y MotorHTTP procesa ese municipio con Selenium, recordándolo
+para el resto de la ejecución.
+"""
+import re
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+from lxml import etree
+from lxml import html as lxml_html
+from urllib3.util.retry import Retry
+
+from src.config import load_env
+
+from .browser_helpers import mover_csv_final
+from .navigation_helpers import (obtener_modulo_generico, obtener_xpaths_accion, procesar_municipio,
+                                 estructura_municipio, _omitir_por_cache_negativa, _resultado_tipo_fallido)
+from .negative_cache import cargar_cache_negativa
+from .timeouts import cargar_gestor_timeouts, registrar_latencia, guardar_latencias
+from .schema_registry import cargar_registro_esquemas, guardar_registro_esquemas
+from .aggregate_cube import guardar_cubo
+from .rate_control import esperar_espaciado, registrar_observacion
+from .download_journal import obtener_diario
+from .delta_store import csv_existente
+from .http_archive import crear_adaptador, fijar_org_archivo
+from .page_readiness import XPATH_PESTANAS
+
+TIPOS_PERSONAL = ["CONTRATA", "PLANTA"]
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+              "AppleWebKit/537.36 (KHTML, like Gecko)"
+              "Chrome/121.0.0.0 Safari/537.36")
+
+_RE_PF_AB = re.compile(r"PrimeFaces\.ab\(\s*\{(?P<cfg>.*?)\}\s*\)", re.S)
+_RE_JSFCLJS = re.compile(
+    r"jsfcljs\(\s*document\.getElementById\(\s*['\"](?P<form>[^'\"]+)['\"]\s*\)\s*,\s*\{(?P<params>.*?)\}", re.S)
+_RE_SUBMIT_PARAM = re.compile(
+    r"addSubmitParam\(\s*['\"](?P<form>[^'\"]+)['\"]\s*,\s*\{(?P<params>.*?)\}", re.S)
+_RE_PAR = re.compile(r"['\"]?([\w:\-.]+)['\"]?\s*:\s*['\"]([^'\"]*)['\"]")
+
+
+class PasoNoResuelto(Exception):
+    """El flujo HTTP no pudo reproducir un paso; hay que usar Selenium."""
+
+
+class SesionPortal:
+    def __init__(self, timeout: float = 30, pool: int = 8):
+        self.timeout = timeout
+        self.http = requests.Session()
+        reintentos = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                           allowed_methods=frozenset({"GET"}))
+        adaptador = crear_adaptador(pool_connections=pool, pool_maxsize=pool, max_retries=reintentos)
+        self.http.mount("https://", adaptador)
+        self.http.mount("http://", adaptador)
+        self.http.headers.update({"User-Agent": USER_AGENT})
+        self.url: Optional[str] = None
+        self.doc = None
+
+    # ------------------------------------------------------------------
+    # Documento
+    # ------------------------------------------------------------------
+    def _fijar_documento(self, respuesta: requests.Response):
+        self.url = respuesta.url
+        self.doc = lxml_html.fromstring(respuesta.content, base_url=respuesta.url)
+
+    def cargar(self, url: str):
+        respuesta = self.http.get(url, timeout=self.timeout)
+        respuesta.raise_for_status()
+        self._fijar_documento(respuesta)
+
+    def buscar(self, xpaths: List[str]) -> Tuple[Optional[Any], Optional[str]]:
+        for xpath in xpaths:
+            try:
+                nodos = self.doc.xpath(xpath)
+            except etree.XPathError:
+                continue
+            for nodo in nodos:
+                if isinstance(nodo, etree._Element):
+                    return nodo, xpath
+        return None, None
+
+    def _por_id(self, id_elemento: str):
+        encontrados = self.doc.xpath("//*[@id=$i]", i=id_elemento)
+        return encontrados[0] if encontrados else None
+
+    def _formulario(self, elemento, form_id: Optional[str] = None):
+        if form_id:
+            form = self._por_id(form_id)
+            if form is not None:
+                return form
+        ancestros = elemento.xpath("ancestor::form[1]")
+        if not ancestros:
+            raise PasoNoResuelto("enlace fuera de un formulario")
+        return ancestros[0]
+
+    @staticmethod
+    def _campos(form) -> List[Tuple[str, str]]:
+        """Pares (name, value) que enviaría el navegador al hacer submit."""
+        campos = []
+        for el in form.xpath(".//input[@name] | .//select[@name] | .//textarea[@name]"):
+            nombre = el.get("name")
+            if el.tag == "input":
+                tipo = (el.get("type") or "text").lower()
+                if tipo in ("submit", "button", "image", "file", "reset"):
+                    continue
+                if tipo in ("checkbox", "radio") and el.get("checked") is None:
+                    continue
+                campos.append((nombre, el.get("value") or ""))
+            elif el.tag == "select":
+                opciones = el.xpath(".//option[@selected]") or el.xpath(".//option")[:1]
+                for op in opciones:
+                    campos.append((nombre, op.get("value", op.text_content())))
+            else:
+                campos.append((nombre, el.text or ""))
+        return campos
+
+    # ------------------------------------------------------------------
+    # Acciones
+    # ------------------------------------------------------------------
+    def activar(self, elemento) -> Optional[requests.Response]:
+        """
+        Reproduce el click sobre `elemento`. Devuelve la respuesta si fue una
+        descarga (Content-Disposition: attachment); si no, actualiza el árbol.
+        """
+        onclick = elemento.get("onclick") or ""
+        href = (elemento.get("href") or "").strip()
+
+        m = _RE_PF_AB.search(onclick)
+        if m:
+            cfg = dict(_RE_PAR.findall(m.group("cfg")))
+            fuente = cfg.get("s") or cfg.get("source") or elemento.get("id")
+            if not fuente:
+                raise PasoNoResuelto("PrimeFaces.ab sin source")
+            form = self._formulario(elemento, cfg.get("f") or cfg.get("formId"))
+            return self._post_parcial(form, fuente, cfg.get("p") or cfg.get("process"),
+                                      cfg.get("u") or cfg.get("update"))
+
+        m = _RE_JSFCLJS.search(onclick) or _RE_SUBMIT_PARAM.search(onclick)
+        if m:
+            form = self._formulario(elemento, m.group("form"))
+            return self._post_completo(form, _RE_PAR.findall(m.group("params")))
+
+        if href and not href.startswith(("#", "javascript:")):
+            respuesta = self.http.get(urljoin(self.url, href), timeout=self.timeout)
+            respuesta.raise_for_status()
+            return self._respuesta_o_documento(respuesta)
+
+        raise PasoNoResuelto(f"enlace sin acción HTTP reconocible: {etree.tostring(elemento)[:120]!r}")
+
+    def _accion(self, form) -> str:
+        return urljoin(self.url, form.get("action") or self.url)
+
+    def _respuesta_o_documento(self, respuesta: requests.Response) -> Optional[requests.Response]:
+        if "attachment" in respuesta.headers.get("Content-Disposition", "").lower():
+            return respuesta
+        self._fijar_documento(respuesta)
+        return None
+
+    def _post_completo(self, form, extra: List[Tuple[str, str]]) -> Optional[requests.Response]:
+        respuesta = self.http.post(self._accion(form), data=self._campos(form) + list(extra),
+                                   timeout=self.timeout)
+        respuesta.raise_for_status()
+        return self._respuesta_o_documento(respuesta)
+
+    def _post_parcial(self, form, fuente: str, proceso: Optional[str],
+                      actualizar: Optional[str]) -> Optional[requests.Response]:
+        datos = self._campos(form) + [
+            ("javax.faces.partial.ajax", "true"),
+            ("javax.faces.source", fuente),
+            ("javax.faces.partial.execute", proceso or fuente),
+            ("javax.faces.partial.render", actualizar or "@all"),
+            (fuente, fuente),
+        ]
+        respuesta = self.http.post(
+            self._accion(form), data=datos, timeout=self.timeout,
+            headers={"Faces-Request": "partial/ajax", "X-Requested-With": "XMLHttpRequest"},
+        )
+        respuesta.raise_for_status()
+        if "attachment" in respuesta.headers.get("Content-Disposition", "").lower():
+            return respuesta
+        self._aplicar_parcial(respuesta.content)
+        return None
+
+    def _aplicar_parcial(self, contenido: bytes):
+        try:
+            raiz = etree.fromstring(contenido)
+        except etree.XMLSyntaxError:
+            raise PasoNoResuelto("respuesta parcial no es XML")
+        if raiz.find(".//error") is not None:
+            raise PasoNoResuelto(f"error JSF: {raiz.findtext('.//error-message')}")
+        redireccion = raiz.find(".//redirect")
+        if redireccion is not None:
+            self.cargar(urljoin(self.url, redireccion.get("url")))
+            return
+
+        for update in raiz.iter("update"):
+            id_update = update.get("id") or ""
+            texto = update.text or ""
+            if "javax.faces.ViewState" in id_update:
+                for campo in self.doc.xpath("//input[@name='javax.faces.ViewState']"):
+                    campo.set("value", texto)
+            elif id_update == "javax.faces.ViewRoot":
+                self.doc = lxml_html.fromstring(texto, base_url=self.url)
+            else:
+                actual = self._por_id(id_update)
+                if actual is None or not texto.strip():
+                    continue
+                nuevos = [n for n in lxml_html.fragments_fromstring(texto) if isinstance(n, etree._Element)]
+                if not nuevos:
+                    continue
+                padre = actual.getparent()
+                if padre is None:
+                    self.doc = nuevos[0]
+                else:
+                    padre.replace(actual, nuevos[0])
+
+
+# ----------------------------------------------------------------------
+# Flujo por municipio
+# ----------------------------------------------------------------------
+def _click(sesion: SesionPortal, xpaths: List[str], paso: str, org_code: str,
+           obligatorio: bool = True) -> Tuple[Optional[str], Optional[requests.Response]]:
+    inicio = time.time()
+    elemento, xpath = sesion.buscar(xpaths)
+    if elemento is None:
+        if obligatorio:
+            raise PasoNoResuelto(f"ningún XPath de '{paso}' encontró nodos")
+        return None, None
+    respuesta = sesion.activar(elemento)
+    registrar_latencia(paso, org_code, time.time() - inicio)
+    return xpath, respuesta
+
+
+def _no_publicado(sesion: SesionPortal, paso: str) -> bool:
+    """
+    El XPath de `paso` no encontró nodos pero las pestañas sí están en el
+    documento: el portal no publica ese año/mes. Sin pestañas, en cambio, el
+    flujo HTTP no llegó a la sección y el paso queda para Selenium.
+    """
+    if sesion.doc is not None and sesion.doc.xpath(XPATH_PESTANAS):
+        return True
+    raise PasoNoResuelto(f"ningún XPath de '{paso}' encontró nodos")
+
+
+def _navegar_hasta_anio(sesion: SesionPortal, modulo: Dict[str, Any], url: str,
+                        org_code: str, tipo: str, year: int) -> Dict[str, Any]:
+    esperar_espaciado()
+    inicio = time.time()
+    try:
+        sesion.cargar(url)
+    except requests.RequestException:
+        registrar_observacion("carga", time.time() - inicio, False)
+        raise
+    registrar_observacion("carga", time.time() - inicio, True)
+    registrar_latencia("page_load", org_code, time.time() - inicio)
+    if org_code not in (sesion.url or ""):
+        raise PasoNoResuelto(f"redirigido a {sesion.url}")
+
+    xpath_tipo, _ = _click(sesion, obtener_xpaths_accion(modulo, "open_tipo_personal", tipo), "tipo", org_code)
+    xpath_area, _ = _click(sesion, obtener_xpaths_accion(modulo, "select_area", "MUNICIPAL"), "area",
+                           org_code, obligatorio=False)
+    xpath_anio, _ = _click(sesion, obtener_xpaths_accion(modulo, "select_anio", year), "anio", org_code,
+                           obligatorio=False)
+    if xpath_anio is None:
+        _no_publicado(sesion, "anio")
+    return {"xpath_tipo": xpath_tipo, "xpath_area": xpath_area, "xpath_anio": xpath_anio}
+
+
+def _guardar_descarga(respuesta: requests.Response, download_root: str, org_code: str,
+                      tipo: str, year: int, mes: str) -> Optional[str]:
+    carpeta = Path(download_root) / "_http"
+    carpeta.mkdir(parents=True, exist_ok=True)
+    diario = obtener_diario()
+    id_diario = diario.iniciar(carpeta, org_code, tipo, year, mes) if diario else None
+    archivo = carpeta / f"{org_code}_{tipo}_{year}_{mes}.csv"
+    archivo.write_bytes(respuesta.content)
+    ruta = mover_csv_final(archivo, download_root, org_code, tipo, year, mes, id_diario=id_diario)
+    if diario is not None:
+        diario.terminar(id_diario, bool(ruta))
+    return ruta
+
+
+def procesar_municipio_http(sesion: SesionPortal, org_code: str, settings: Dict[str, Any],
+                            actions_cfg: Dict[str, Any], year: int, meses=None) -> Dict[str, Any]:
+    """
+    Equivalente HTTP de procesar_municipio (mismo dict de resultado). Lanza
+    PasoNoResuelto ante cualquier paso que no pueda reproducir; los CSV ya
+    descargados quedan en disco y Selenium los salta al retomar.
+    """
+    env = load_env()
+    download_root = env["DOWNLOAD_ROOT"]
+    fijar_org_archivo(org_code)
+    modulo = obtener_modulo_generico(actions_cfg)
+    url = modulo["url_pattern"].format(org=org_code)
+    cache_negativa = cargar_cache_negativa(settings, env["STATE_DIR"])
+    cargar_gestor_timeouts(settings, env["STATE_DIR"])
+    cargar_registro_esquemas(settings, env["STATE_DIR"])
+    if meses is None:
+        meses = settings.get("months", [])
+
+    resultados: Dict[str, Dict[str, Any]] = {}
+    tiene_area = False
+    try:
+        for tipo in TIPOS_PERSONAL:
+            resultados[tipo] = {}
+            omitido = _omitir_por_cache_negativa(cache_negativa, org_code, tipo, year, meses, download_root)
+            if omitido is not None:
+                resultados[tipo][year] = omitido
+                continue
+
+            estado = _navegar_hasta_anio(sesion, modulo, url, org_code, tipo, year)
+            tiene_area = tiene_area or bool(estado["xpath_area"])
+            estructura = estructura_municipio(org_code)[tipo]
+            if estado["xpath_area"]:
+                estructura["tiene_area"] = True
+            elif estado["xpath_anio"]:
+                estructura["tiene_area"] = False
+            if estado["xpath_anio"]:
+                estructura.pop("inusual", None)
+            if estado["xpath_anio"] is None:
+                # Sin área abierta el año solo falta si ya se sabe que este tipo no tiene área
+                if not estado["xpath_area"] and (estructura["tiene_area"] is not False or estructura.get("inusual")):
+                    raise PasoNoResuelto(f"{tipo}: ni área ni año {year}; estructura sin confirmar")
+                print(f"[HTTP] ({org_code}) {tipo}: año {year} no publicado")
+                if cache_negativa is not None:
+                    cache_negativa.registrar_ausente(org_code, tipo, year)
+                resultados[tipo][year] = {
+                    **_resultado_tipo_fallido(),
+                    "tipo_personal_ok": True,
+                    "area_municipal_ok": bool(estado["xpath_area"]),
+                    "xpath_tipo": estado["xpath_tipo"],
+                    "xpath_area": estado["xpath_area"],
+                }
+                continue
+            if cache_negativa is not None:
+                cache_negativa.limpiar(org_code, tipo, year)
+
+            meses_detalle = {}
+            primera = True
+            for mes in meses:
+                ruta_esperada = Path(download_root) / org_code / tipo / str(year) / f"{org_code}_{tipo}_{year}_{mes}.csv"
+                if csv_existente(ruta_esperada):
+                    meses_detalle[mes] = {"status": "SKIP_EXISTE", "xpath_mes": None,
+                                          "csv_status": "YA_EXISTIA", "csv_path": str(ruta_esperada)}
+                    continue
+                if cache_negativa is not None and cache_negativa.esta_ausente(org_code, tipo, year, mes):
+                    meses_detalle[mes] = {"status": "SKIP_AUSENTE", "xpath_mes": None,
+                                          "csv_status": "AUSENTE", "csv_path": None}
+                    continue
+
+                # Igual que en Selenium: cada mes parte de la página recién navegada
+                if not primera:
+                    _navegar_hasta_anio(sesion, modulo, url, org_code, tipo, year)
+                primera = False
+
+                xpath_mes, _ = _click(sesion, obtener_xpaths_accion(modulo, "select_mes", mes), "mes", org_code,
+                                      obligatorio=False)
+                if xpath_mes is None:
+                    _no_publicado(sesion, "mes")
+                    print(f"[HTTP] ({org_code}) {tipo} {year}: mes '{mes}' no publicado")
+                    if cache_negativa is not None:
+                        cache_negativa.registrar_ausente(org_code, tipo, year, mes)
+                    meses_detalle[mes] = {"status": "FALLÓ", "xpath_mes": None}
+                    continue
+                if cache_negativa is not None:
+                    cache_negativa.limpiar(org_code, tipo, year, mes)
+
+                t_descarga = time.time()
+                xpath_csv, respuesta = _click(sesion, obtener_xpaths_accion(modulo, "download_csv"), "csv", org_code)
+                if respuesta is None:
+                    raise PasoNoResuelto("el enlace CSV no devolvió un archivo")
+                ruta_csv = _guardar_descarga(respuesta, download_root, org_code, tipo, year, mes)
+                registrar_observacion("descarga", time.time() - t_descarga, bool(ruta_csv))
+                print(f"[HTTP] ({org_code}) {tipo} {year} '{mes}': {'ÉXITO' if ruta_csv else 'FALLÓ'}")
+                meses_detalle[mes] = {"status": "ÉXITO", "xpath_mes": xpath_mes,
+                                      "csv_status": "ÉXITO" if ruta_csv else "FALLÓ",
+                                      "xpath_csv": xpath_csv, "csv_path": ruta_csv}
+
+            resultados[tipo][year] = {
+                **_resultado_tipo_fallido(),
+                "tipo_personal_ok": True,
+                "area_municipal_ok": bool(estado["xpath_area"]),
+                "anio_ok": True,
+                "xpath_tipo": estado["xpath_tipo"],
+                "xpath_area": estado["xpath_area"],
+                "xpath_anio": estado["xpath_anio"],
+                "meses_ok": any(d["status"] in ("ÉXITO", "SKIP_EXISTE") for d in meses_detalle.values()),
+                "meses_detalle": meses_detalle,
+            }
+    finally:
+        if cache_negativa is not None:
+            cache_negativa.guardar()
+        guardar_latencias()
+        guardar_registro_esquemas()
+        guardar_cubo()
+
+    return {
+        "acceso_municipio_exitoso": True,
+        "tipo_municipio_detectado": "con_area_municipal" if tiene_area else "sin_area_municipal",
+        "detalle_por_tipo": resultados,
+        "redirigido": False,
+        "url_final": sesion.url,
+        "omitido_por_cache": all(resultados[t][year].get("omitido_por_cache") for t in TIPOS_PERSONAL),
+    }
+
+
+class MotorHTTP:
+    """
+    Procesa tareas por HTTP y cae a Selenium por municipio. `obtener_driver`
+    se llama solo la primera vez que hace falta el navegador.
+    """
+
+    def __init__(self, settings: Dict[str, Any], actions_cfg: Dict[str, Any], obtener_driver):
+        config = settings.get("http_engine") or {}
+        self.settings = settings
+        self.actions_cfg = actions_cfg
+        self.obtener_driver = obtener_driver
+        self.sesion = SesionPortal(timeout=config.get("timeout", 30), pool=config.get("pool_size", 8))
+        self.respaldo: set = set()
+
+    def procesar(self, org_code: str, year: int, meses) -> Dict[str, Any]:
+        if org_code not in self.respaldo:
+            try:
+                return procesar_municipio_http(self.sesion, org_code, self.settings, self.actions_cfg,
+                                               year=year, meses=meses)
+            except (PasoNoResuelto, requests.RequestException) as e:
+                print(f"[HTTP] ({org_code}) {e}; se continúa con Selenium para este municipio")
+                self.respaldo.add(org_code)
+        return procesar_municipio(self.obtener_driver(), org_code, self.settings, self.actions_cfg,
+                                  year=year, meses=meses)
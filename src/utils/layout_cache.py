@@ -0,0 +1,150 @@
+"""
+Caché de layouts compartida entre municipios.
+
+Los 345 municipios usan unas pocas variantes de página (con o sin área
+municipal, etiquetas de año distintas), pero estructura_cache y xpath_cache
+se indexan por org_code y cada uno las redescubre. Al cargar la página de un
+municipio se calcula una huella de su esqueleto de pestañas y enlaces
+(huella_layout); si otro municipio con la misma huella ya se procesó, se
+copian su tiene_area por tipo y sus XPaths ganadores y se omite la detección.
+
+Se guarda en STATE_DIR/layouts.json:
+
+    {"huellas": {"3f2a...": {"orgs": ["MU001", ...], "tiene_area": {"PLANTA": true, ...},
+                             "xpaths": [[["PLANTA", "tipo"], "//a[...]"], ...]}},
+     "orgs": {"MU001": "3f2a..."}}
+
+Si algo copiado no sirve en el municipio nuevo, procesar_municipio vuelve a
+detectar y lo que quede verificado al final reemplaza la entrada de la huella.
+"""
+import hashlib
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from .state_store import leer_json, guardar_json
+
+DEFAULTS_LAYOUT_CACHE = {
+    "enabled": False,
+    "min_orgs": 1,
+}
+
+# Texto normalizado (minúsculas, sin tildes, dígitos como '#') de los enlaces y
+# pestañas visibles fuera de header/footer, con el contenedor de pestañas o
+# navegación más cercano. Se descartan los textos largos y los que repiten el
+# título o el h1 (nombre del municipio en migas de pan).
+JS_ESQUELETO = r"""
+const norm = t => (t || '').normalize('NFD').replace(/[\u0300-\u036f]/g, '')
+    .toLowerCase().replace(/\d/g, '#').replace(/\s+/g, ' ').trim();
+const propio = norm(document.title + ' ' + Array.from(document.querySelectorAll('h1'))
+    .map(h => h.textContent).join(' '));
+const partes = new Set();
+for (const el of document.querySelectorAll('a, button, [role=tab]')) {
+    if (!el.offsetParent || el.closest('header, footer')) continue;
+    const texto = norm(el.textContent);
+    if (!texto || texto.length > 40 || propio.includes(texto)) continue;
+    const cont = el.closest('[class*=tab], [role=tablist], nav, form');
+    const marco = cont ? cont.tagName.toLowerCase() + '.' + String(cont.className || '')
+        .split(/\s+/).filter(c => /tab|nav|menu/i.test(c)).sort().join('.') : '';
+    partes.add(marco + '>' + el.tagName.toLowerCase() + ':' + texto);
+}
+return Array.from(partes).sort();
+"""
+
+
+def huella_de_esqueleto(partes: List[str]) -> str:
+    return hashlib.sha1("\n".join(sorted(partes)).encode("utf-8")).hexdigest()[:16]
+
+
+def huella_layout(driver) -> Optional[str]:
+    """Huella del esqueleto de la página actual, o None si no se pudo calcular."""
+    try:
+        partes = driver.execute_script(JS_ESQUELETO)
+    except Exception as e:
+        print(f"[WARN] No se pudo calcular la huella de layout: {e}")
+        return None
+    return huella_de_esqueleto(partes) if partes else None
+
+
+class CacheLayouts:
+    def __init__(self, path: Path, min_orgs: int = 1):
+        self.path = Path(path)
+        self.min_orgs = max(1, int(min_orgs))
+        datos = leer_json(self.path, default={}) or {}
+        self.huellas: Dict[str, Dict[str, Any]] = datos.get("huellas", {})
+        self.orgs: Dict[str, str] = datos.get("orgs", {})
+        self._sucia = False
+
+    def aplicar(self, huella: str, org_code: str, estructura_org: Dict[str, Dict[str, Any]],
+                xpath_cache: Dict[tuple, str]) -> bool:
+        """
+        Copia la estructura y los XPaths de la huella al municipio. Solo rellena
+        tipos aún no detectados y no pisa XPaths ya cacheados para el org.
+        """
+        entrada = self.huellas.get(huella)
+        if not entrada or len([o for o in entrada["orgs"] if o != org_code]) < self.min_orgs:
+            return False
+        aplicado = False
+        for tipo, tiene_area in entrada.get("tiene_area", {}).items():
+            estructura = estructura_org.get(tipo)
+            if estructura is not None and estructura["tiene_area"] is None:
+                estructura["tiene_area"] = tiene_area
+                estructura["desde_huella"] = True
+                aplicado = True
+        for clave, xpath in entrada.get("xpaths", []):
+            clave_org = (org_code, *clave)
+            if clave_org not in xpath_cache:
+                xpath_cache[clave_org] = xpath
+                aplicado = True
+            if clave[-1] == "area" and clave[0] in estructura_org:
+                estructura_org[clave[0]]["xpaths"].setdefault("area", xpath)
+        return aplicado
+
+    def registrar(self, huella: str, org_code: str, estructura_org: Dict[str, Dict[str, Any]],
+                  xpath_cache: Dict[tuple, str]):
+        """Guarda lo verificado en este municipio como la versión vigente de la huella."""
+        tiene_area = {tipo: e["tiene_area"] for tipo, e in estructura_org.items()
+                      if e["tiene_area"] is not None}
+        xpaths = [[list(clave[1:]), xpath] for clave, xpath in xpath_cache.items() if clave[0] == org_code]
+        if not tiene_area and not xpaths:
+            return
+        entrada = self.huellas.setdefault(huella, {"orgs": [], "tiene_area": {}, "xpaths": []})
+        if org_code not in entrada["orgs"]:
+            entrada["orgs"].append(org_code)
+        entrada["tiene_area"].update(tiene_area)
+        previos = {tuple(c): x for c, x in entrada["xpaths"]}
+        previos.update({tuple(c): x for c, x in xpaths})
+        entrada["xpaths"] = [[list(c), x] for c, x in previos.items()]
+
+        anterior = self.orgs.get(org_code)
+        if anterior and anterior != huella and anterior in self.huellas:
+            orgs_anterior = self.huellas[anterior]["orgs"]
+            if org_code in orgs_anterior:
+                orgs_anterior.remove(org_code)
+        self.orgs[org_code] = huella
+        self._sucia = True
+
+    def descartar(self, huella: str, tipo: str):
+        """La estructura copiada no sirvió: se olvida para que el próximo municipio detecte."""
+        entrada = self.huellas.get(huella)
+        if entrada and entrada["tiene_area"].pop(tipo, None) is not None:
+            self._sucia = True
+
+    def guardar(self):
+        if self._sucia:
+            guardar_json(self.path, {"huellas": self.huellas, "orgs": self.orgs})
+            self._sucia = False
+
+
+_CACHE: Optional[CacheLayouts] = None
+
+
+def cargar_cache_layouts(settings: Dict[str, Any], state_dir: str) -> Optional[CacheLayouts]:
+    global _CACHE
+    config = {**DEFAULTS_LAYOUT_CACHE, **(settings.get("layout_cache") or {})}
+    if not config["enabled"]:
+        _CACHE = None
+        return None
+    path = Path(state_dir) / "layouts.json"
+    if _CACHE is None or _CACHE.path != path:
+        _CACHE = CacheLayouts(path, min_orgs=config["min_orgs"])
+    return _CACHE
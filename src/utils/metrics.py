@@ -0,0 +1,246 @@
+"""
+Métricas en vivo del scraping y endpoint HTTP local para consultarlas.
+
+Con settings["metrics"]["enabled"] se levanta un servidor en un hilo aparte:
+
+    GET /metrics       formato de texto de Prometheus
+    GET /status.json   resumen JSON (el mismo contenido, más el estado AIMD)
+
+Se mide: descargas totales y por minuto (ventana deslizante), tareas
+(org, año) totales / en curso / pendientes, éxitos y fallos por paso, p95 de
+latencia por paso, drivers activos y ETA según el ritmo reciente de tareas
+terminadas.
+"""
+import json
+import threading
+import time
+from collections import deque, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+
+from .rate_control import obtener_controlador
+
+DEFAULTS_METRICS = {
+    "enabled": False,
+    "host": "127.0.0.1",
+    "port": 9108,
+    "window_s": 600,
+    "max_samples": 200,
+}
+
+
+def _percentil(valores, p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))]
+
+
+class Metricas:
+    def __init__(self, config: Dict[str, Any]):
+        self.ventana = float(config["window_s"])
+        self.max_muestras = int(config["max_samples"])
+        self.inicio = time.time()
+        self._lock = threading.Lock()
+
+        self.descargas_total = 0
+        self._descargas_ts: deque = deque()
+        self.tareas_total = 0
+        self.tareas_en_curso = 0
+        self.tareas_terminadas = 0
+        self._terminadas_ts: deque = deque()
+        self.drivers_activos = 0
+        self.pasos: Dict[str, Dict[str, int]] = defaultdict(lambda: {"exito": 0, "fallo": 0})
+        self.latencias: Dict[str, deque] = {}
+
+    def _recortar(self, marcas: deque, ahora: float):
+        while marcas and ahora - marcas[0] > self.ventana:
+            marcas.popleft()
+
+    # ------------------------------------------------------------------
+    # Registro
+    # ------------------------------------------------------------------
+    def planificar(self, total_tareas: int):
+        with self._lock:
+            self.tareas_total = total_tareas
+
+    def tarea_iniciada(self):
+        with self._lock:
+            self.tareas_en_curso += 1
+
+    def tarea_terminada(self, year: Optional[int] = None, resultados: Optional[Dict[str, Any]] = None,
+                        iniciada: bool = True):
+        ahora = time.time()
+        with self._lock:
+            if iniciada:
+                self.tareas_en_curso = max(0, self.tareas_en_curso - 1)
+            self.tareas_terminadas += 1
+            self._terminadas_ts.append(ahora)
+            self._recortar(self._terminadas_ts, ahora)
+            if resultados is not None and year is not None:
+                self._contar_pasos(year, resultados)
+
+    def _contar_pasos(self, year: int, resultados: Dict[str, Any]):
+        """Éxitos/fallos por paso a partir del dict que devuelve procesar_municipio."""
+        if resultados.get("omitido_por_cache"):
+            return
+        self.pasos["carga"]["exito" if resultados.get("acceso_municipio_exitoso") else "fallo"] += 1
+        for datos_por_anio in (resultados.get("detalle_por_tipo") or {}).values():
+            datos = datos_por_anio.get(year, {}) if isinstance(datos_por_anio, dict) else {}
+            if not datos or datos.get("omitido_por_cache"):
+                continue
+            self.pasos["tipo"]["exito" if datos.get("tipo_personal_ok") else "fallo"] += 1
+            if not datos.get("tipo_personal_ok"):
+                continue
+            # No tener área municipal es legítimo, así que solo se cuentan los éxitos
+            if datos.get("area_municipal_ok"):
+                self.pasos["area"]["exito"] += 1
+            self.pasos["anio"]["exito" if datos.get("anio_ok") else "fallo"] += 1
+            for info in (datos.get("meses_detalle") or {}).values():
+                if info.get("status") in ("ÉXITO", "FALLÓ"):
+                    self.pasos["mes"]["exito" if info["status"] == "ÉXITO" else "fallo"] += 1
+                if info.get("csv_status") in ("ÉXITO", "FALLÓ"):
+                    self.pasos["csv"]["exito" if info["csv_status"] == "ÉXITO" else "fallo"] += 1
+
+    def descarga(self):
+        ahora = time.time()
+        with self._lock:
+            self.descargas_total += 1
+            self._descargas_ts.append(ahora)
+            self._recortar(self._descargas_ts, ahora)
+
+    def latencia(self, paso: str, segundos: float):
+        with self._lock:
+            if paso not in self.latencias:
+                self.latencias[paso] = deque(maxlen=self.max_muestras)
+            self.latencias[paso].append(segundos)
+
+    def driver(self, delta: int):
+        with self._lock:
+            self.drivers_activos = max(0, self.drivers_activos + delta)
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    def resumen(self) -> Dict[str, Any]:
+        ahora = time.time()
+        with self._lock:
+            self._recortar(self._descargas_ts, ahora)
+            self._recortar(self._terminadas_ts, ahora)
+            # Con menos de una ventana corrida, el ritmo se mide sobre lo transcurrido
+            transcurrido = max(1.0, min(self.ventana, ahora - self.inicio))
+            tareas_por_s = len(self._terminadas_ts) / transcurrido
+            pendientes = max(0, self.tareas_total - self.tareas_terminadas)
+            return {
+                "uptime_s": round(ahora - self.inicio, 1),
+                "descargas_total": self.descargas_total,
+                "descargas_por_minuto": round(len(self._descargas_ts) / transcurrido * 60, 3),
+                "tareas_total": self.tareas_total,
+                "tareas_terminadas": self.tareas_terminadas,
+                "tareas_en_curso": self.tareas_en_curso,
+                "cola_pendiente": max(0, pendientes - self.tareas_en_curso),
+                "drivers_activos": self.drivers_activos,
+                "pasos": {paso: dict(c) for paso, c in sorted(self.pasos.items())},
+                "latencia_p95_s": {
+                    paso: round(_percentil(v, 0.95), 3) for paso, v in sorted(self.latencias.items()) if v
+                },
+                "eta_s": round(pendientes / tareas_por_s) if tareas_por_s > 0 else None,
+            }
+
+    def prometheus(self) -> str:
+        r = self.resumen()
+        lineas = []
+
+        def metrica(nombre, tipo, ayuda, valores):
+            lineas.append(f"# HELP pdt_{nombre} {ayuda}")
+            lineas.append(f"# TYPE pdt_{nombre} {tipo}")
+            for etiquetas, valor in valores:
+                if valor is None:
+                    continue
+                lineas.append(f"pdt_{nombre}{etiquetas} {valor}")
+
+        metrica("uptime_seconds", "gauge", "Segundos desde el inicio.", [("", r["uptime_s"])])
+        metrica("downloads_total", "counter", "CSV descargados.", [("", r["descargas_total"])])
+        metrica("downloads_per_minute", "gauge", "Descargas por minuto en la ventana.",
+                [("", r["descargas_por_minuto"])])
+        metrica("tasks_total", "gauge", "Tareas (org, año) planificadas.", [("", r["tareas_total"])])
+        metrica("tasks_done_total", "counter", "Tareas terminadas.", [("", r["tareas_terminadas"])])
+        metrica("tasks_in_progress", "gauge", "Tareas en curso.", [("", r["tareas_en_curso"])])
+        metrica("queue_depth", "gauge", "Tareas pendientes sin iniciar.", [("", r["cola_pendiente"])])
+        metrica("active_drivers", "gauge", "Navegadores activos.", [("", r["drivers_activos"])])
+        metrica("step_results_total", "counter", "Resultados por paso.", [
+            (f'{{step="{paso}",result="{resultado}"}}', n)
+            for paso, conteo in r["pasos"].items() for resultado, n in conteo.items()
+        ])
+        metrica("step_latency_p95_seconds", "gauge", "p95 de latencia por paso.", [
+            (f'{{step="{paso}"}}', v) for paso, v in r["latencia_p95_s"].items()
+        ])
+        metrica("eta_seconds", "gauge", "Tiempo estimado para terminar.", [("", r["eta_s"])])
+        return "\n".join(lineas) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if _METRICAS is None:
+            self.send_error(503)
+            return
+        ruta = self.path.split("?", 1)[0]
+        if ruta == "/metrics":
+            cuerpo = _METRICAS.prometheus().encode("utf-8")
+            tipo = "text/plain; version=0.0.4; charset=utf-8"
+        elif ruta in ("/", "/status.json"):
+            datos = _METRICAS.resumen()
+            controlador = obtener_controlador()
+            if controlador is not None:
+                datos["rate_control"] = controlador.estado()
+            cuerpo = json.dumps(datos, ensure_ascii=False, indent=2).encode("utf-8")
+            tipo = "application/json; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_METRICAS: Optional[Metricas] = None
+_SERVIDOR: Optional[ThreadingHTTPServer] = None
+
+
+def configurar_metricas(settings: Dict[str, Any]) -> Optional[Metricas]:
+    """Crea las métricas globales y levanta el endpoint si settings["metrics"]["enabled"]."""
+    global _METRICAS, _SERVIDOR
+    config = {**DEFAULTS_METRICS, **(settings.get("metrics") or {})}
+    if not config.get("enabled"):
+        _METRICAS = None
+        return None
+    _METRICAS = Metricas(config)
+    if _SERVIDOR is None:
+        try:
+            _SERVIDOR = ThreadingHTTPServer((config["host"], int(config["port"])), _Handler)
+        except OSError as e:
+            print(f"[WARN] No se pudo abrir el endpoint de métricas en {config['host']}:{config['port']}: {e}")
+            return _METRICAS
+        _SERVIDOR.daemon_threads = True
+        threading.Thread(target=_SERVIDOR.serve_forever, name="metricas", daemon=True).start()
+        print(f"[INFO] Métricas en http://{config['host']}:{config['port']}/metrics y /status.json")
+    return _METRICAS
+
+
+def obtener_metricas() -> Optional[Metricas]:
+    return _METRICAS
+
+
+def registrar_descarga():
+    if _METRICAS is not None:
+        _METRICAS.descarga()
+
+
+def registrar_latencia_metrica(paso: str, segundos: float):
+    if _METRICAS is not None:
+        _METRICAS.latencia(paso, segundos)
@@ -2,11 +2,26 @@ from typing import Dict, Any, Optional
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
 from datetime import datetime
 from pathlib import Path
 from src.config import load_env
-from .browser_helpers import esperar_y_mover_csv, espera_click, _guardar_screenshot
+from .browser_helpers import esperar_y_mover_csv, esperar_y_encolar_csv, espera_click, _guardar_screenshot
 from .logging_helpers import setup_detailed_logger
+from .rate_control import esperar_espaciado, registrar_observacion
+from .snapshots import snapshot_paso, snapshot_fallo
+from .negative_cache import cargar_cache_negativa
+from .layout_cache import cargar_cache_layouts, huella_layout
+from .timeouts import (cargar_gestor_timeouts, crear_presupuesto, timeout_para,
+                       registrar_latencia, registrar_timeout, guardar_latencias)
+from .schema_registry import cargar_registro_esquemas, guardar_registro_esquemas
+from .aggregate_cube import guardar_cubo
+from .delta_store import csv_existente
+from .postprocess import obtener_postproceso
+from .http_archive import fijar_org_archivo
+from .prefetch import crear_descargas_en_curso
+from .historico import configuracion_historico, descargar_historico
+from .page_readiness import xpaths_espera, esperar_nodos, marcar_documento, XPATH_PESTANAS
 import time
 
 def obtener_modulo_generico(actions_cfg: Dict[str, Any]) -> Dict[str, Any]:
@@ -19,14 +34,25 @@ def obtener_modulo_generico(actions_cfg: Dict[str, Any]) -> Dict[str, Any]:
     return modules[0]
 
 def esperar_carga_municipio(driver, org_code: str, timeout: int = 15):
+    xpaths = xpaths_espera()
+    if xpaths is not None:
+        if esperar_nodos(driver, xpaths, timeout) is not None:
+            return True
+        print(f"[ERROR] ({org_code}) La página no cargó en {timeout}s.")
+        _guardar_screenshot(driver, org_code, "no_carga")
+        return False
+
+    primera_espera = min(5, timeout)
     try:
-        WebDriverWait(driver, 5).until(
+        WebDriverWait(driver, primera_espera).until(
             lambda d: d.execute_script("return document.readyState") == "complete"
         )
         return True
     except Exception:
         try:
-            WebDriverWait(driver, timeout - 5).until(
+            if timeout <= primera_espera:
+                raise TimeoutError()
+            WebDriverWait(driver, timeout - primera_espera).until(
                 lambda d: d.execute_script("return document.readyState") == "complete"
             )
             return True
@@ -35,6 +61,118 @@ def esperar_carga_municipio(driver, org_code: str, timeout: int = 15):
             _guardar_screenshot(driver, org_code, "no_carga")
             return False
 
+def _fijar_page_load_timeout(driver, segundos: float):
+    # Cada set_page_load_timeout es un viaje a ChromeDriver; solo si cambia
+    if getattr(driver, "_pdt_page_load_timeout", None) != segundos:
+        driver.set_page_load_timeout(segundos)
+        driver._pdt_page_load_timeout = segundos
+
+def cargar_municipio(driver, url: str, org_code: str, presupuesto=None) -> bool:
+    """driver.get + esperar_carga_municipio, respetando el espaciado y midiendo la latencia."""
+    esperar_espaciado()
+    inicio = time.time()
+    t_page_load = timeout_para("page_load", org_code, 60, presupuesto)
+    try:
+        _fijar_page_load_timeout(driver, t_page_load)
+        if xpaths_espera() is not None:
+            marcar_documento(driver)
+        driver.get(url)
+        fin_get = time.time()
+        registrar_latencia("page_load", org_code, fin_get - inicio)
+        t_carga = timeout_para("carga_espera", org_code, 15, presupuesto)
+        ok = esperar_carga_municipio(driver, org_code, timeout=t_carga)
+        if ok:
+            registrar_latencia("carga_espera", org_code, time.time() - fin_get)
+        else:
+            registrar_timeout("carga_espera", org_code, t_carga)
+    except TimeoutException as e:
+        print(f"[ERROR] ({org_code}) Falló la navegación a {url}: {e}")
+        registrar_timeout("page_load", org_code, t_page_load)
+        ok = False
+    except Exception as e:
+        print(f"[ERROR] ({org_code}) Falló la navegación a {url}: {e}")
+        ok = False
+    registrar_observacion("carga", time.time() - inicio, ok)
+    return ok
+
+def _sin_pestanas(driver) -> bool:
+    try:
+        return not driver.find_elements(By.XPATH, XPATH_PESTANAS)
+    except Exception:
+        return False
+
+def _resultado_tipo_fallido() -> Dict[str, Any]:
+    return {
+        "tipo_personal_ok": False,
+        "area_municipal_ok": False,
+        "anio_ok": False,
+        "xpath_tipo": None,
+        "xpath_area": None,
+        "xpath_anio": None,
+        "meses_ok": False,
+        "meses_detalle": {}
+    }
+
+def _omitir_por_cache_negativa(cache, org_code: str, tipo: str, year: int,
+                               meses, download_root: str) -> Optional[Dict[str, Any]]:
+    """
+    Si para (org, tipo, year) no queda ningún mes por intentar (ya descargado
+    o conocido como ausente), devuelve el resultado a reportar sin cargar la
+    página. Si queda algo pendiente devuelve None.
+    """
+    if cache is None:
+        return None
+
+    resultado = _resultado_tipo_fallido()
+    resultado["tipo_personal_ok"] = True
+    resultado["omitido_por_cache"] = True
+
+    if cache.esta_ausente(org_code, tipo, year):
+        print(f"[CACHE-] ({org_code}) {tipo} {year} sin publicación (caché negativa)")
+        return resultado
+
+    meses_detalle = {}
+    for mes in meses:
+        ruta = Path(download_root) / org_code / tipo / str(year) / f"{org_code}_{tipo}_{year}_{mes}.csv"
+        if csv_existente(ruta):
+            meses_detalle[mes] = {"status": "SKIP_EXISTE", "xpath_mes": None,
+                                  "csv_status": "YA_EXISTIA", "csv_path": str(ruta)}
+        elif cache.esta_ausente(org_code, tipo, year, mes):
+            meses_detalle[mes] = {"status": "SKIP_AUSENTE", "xpath_mes": None,
+                                  "csv_status": "AUSENTE", "csv_path": None}
+        else:
+            return None
+
+    print(f"[CACHE-] ({org_code}) {tipo} {year}: nada pendiente (existentes o ausentes conocidos)")
+    resultado["anio_ok"] = True
+    resultado["meses_ok"] = any(d["status"] == "SKIP_EXISTE" for d in meses_detalle.values())
+    resultado["meses_detalle"] = meses_detalle
+    return resultado
+
+def caches_navegacion():
+    """(estructura_cache, xpath_cache) globales, compartidos por todos los motores con navegador."""
+    # SISTEMA DE CACHE GLOBAL MEJORADO
+    if not hasattr(procesar_municipio, "estructura_cache"):
+        procesar_municipio.estructura_cache = {}
+    
+    if not hasattr(procesar_municipio, "xpath_cache"):
+        procesar_municipio.xpath_cache = {}
+    
+    return procesar_municipio.estructura_cache, procesar_municipio.xpath_cache
+
+def estructura_municipio(org_code: str, tipos_personal=("CONTRATA", "PLANTA")) -> Dict[str, Dict[str, Any]]:
+    """Estructura detectada por tipo ({"tiene_area": None/bool, "xpaths": {...}}), creada si no existe."""
+    estructura_cache, _ = caches_navegacion()
+    # Inicializar cache para este municipio si no existe
+    if org_code not in estructura_cache:
+        estructura_cache[org_code] = {}
+        for tipo in tipos_personal:
+            estructura_cache[org_code][tipo] = {
+                "tiene_area": None,
+                "xpaths": {}
+            }
+    return estructura_cache[org_code]
+
 def procesar_municipio(driver, org_code: str, settings: Dict[str, Any], 
                        actions_cfg: Dict[str, Any], year: int, meses=None):
     env = load_env()
@@ -46,31 +184,32 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
         raise ValueError("El módulo no tiene 'url_pattern' definido.")
     
     url = url_pattern.format(org=org_code)
+    fijar_org_archivo(org_code)
     tipos_personal = ["CONTRATA", "PLANTA"]
     resultados: Dict[str, Dict[str, Any]] = {}
     acceso_municipio_exitoso = False
-
-    # SISTEMA DE CACHE GLOBAL MEJORADO
-    if not hasattr(procesar_municipio, "estructura_cache"):
-        procesar_municipio.estructura_cache = {}
-    
-    if not hasattr(procesar_municipio, "xpath_cache"):
-        procesar_municipio.xpath_cache = {}
-    
-    estructura_cache = procesar_municipio.estructura_cache
-    xpath_cache = procesar_municipio.xpath_cache
+    redirigido = False
+    url_final = None
+    cache_negativa = cargar_cache_negativa(settings, env["STATE_DIR"])
+    layouts = cargar_cache_layouts(settings, env["STATE_DIR"])
+    huella = None
+    cargar_gestor_timeouts(settings, env["STATE_DIR"])
+    cargar_registro_esquemas(settings, env["STATE_DIR"])
+    presupuesto = crear_presupuesto()
+    postproceso = obtener_postproceso()
+    en_postproceso = []  # (meses_detalle[mes], Future) por resolver antes del resumen
+    descargas = crear_descargas_en_curso(driver, download_root, settings, postproceso)
+    historico = configuracion_historico(settings)
+
+    def _t(paso: str, default: float) -> float:
+        return timeout_para(paso, org_code, default, presupuesto)
+
+    estructura_cache, xpath_cache = caches_navegacion()
 
     if meses is None:
         meses = settings.get("months", [])
 
-    # Inicializar cache para este municipio si no existe
-    if org_code not in estructura_cache:
-        estructura_cache[org_code] = {}
-        for tipo in tipos_personal:
-            estructura_cache[org_code][tipo] = {
-                "tiene_area": None,
-                "xpaths": {}
-            }
+    estructura_municipio(org_code, tipos_personal)
 
     logger.info(f"({org_code}) Procesando municipio para año {year}")
     
@@ -81,58 +220,76 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
         if tipo not in resultados:
             resultados[tipo] = {}
 
-        driver.get(url)
-        if not esperar_carga_municipio(driver, org_code):
-            resultados[tipo][year] = {
-                "tipo_personal_ok": False,
-                "area_municipal_ok": False,
-                "anio_ok": False,
-                "xpath_tipo": None,
-                "xpath_area": None,
-                "xpath_anio": None,
-                "meses_ok": False,
-                "meses_detalle": {}
-            }
+        omitido = _omitir_por_cache_negativa(cache_negativa, org_code, tipo, year, meses, download_root)
+        if omitido is not None:
+            resultados[tipo][year] = omitido
+            logger.info(f"({org_code}) Tipo {tipo}, año {year} omitido por caché negativa")
+            continue
+
+        if presupuesto is not None and presupuesto.agotado():
+            print(f"[TIEMPO] ({org_code}) Presupuesto agotado; tipo {tipo} queda pendiente")
+            logger.warning(f"({org_code}) Presupuesto de tarea agotado antes de tipo {tipo}")
+            resultados[tipo][year] = _resultado_tipo_fallido()
+            resultados[tipo][year]["tipo_personal_ok"] = True
+            resultados[tipo][year]["sin_presupuesto"] = True
+            continue
+
+        if not cargar_municipio(driver, url, org_code, presupuesto):
+            resultados[tipo][year] = _resultado_tipo_fallido()
             logger.warning(f"({org_code}) No se pudo cargar la página para tipo {tipo}")
             continue
 
+        url_final = driver.current_url
+        if org_code not in url_final:
+            print(f"[WARN] ({org_code}) El portal redirigió a {url_final}")
+            logger.warning(f"({org_code}) Redirigido a {url_final}; se omite el municipio")
+            redirigido = True
+            resultados[tipo][year] = _resultado_tipo_fallido()
+            _guardar_screenshot(driver, org_code, "redirigido")
+            break
+
         acceso_municipio_exitoso = True
+        if layouts is not None and huella is None:
+            huella = huella_layout(driver)
+            if huella and layouts.aplicar(huella, org_code, estructura_cache[org_code], xpath_cache):
+                print(f"[LAYOUT] ({org_code}) Huella {huella} ya vista: se reutilizan estructura y XPaths")
+                logger.info(f"({org_code}) Layout {huella} conocido; se omite la detección")
         estructura = estructura_cache[org_code][tipo]
+        snapshot_paso(driver, org_code, "carga", tipo=tipo, year=year)
 
         # 1. SELECCIONAR TIPO DE PERSONAL (CON CACHE)
         cache_key_tipo = (org_code, tipo, "tipo")
         if cache_key_tipo in xpath_cache:
             xpath_tipo_cache = xpath_cache[cache_key_tipo]
             print(f"[CACHE] ({org_code}) Probando XPath cacheado para tipo '{tipo}': {xpath_tipo_cache}")
-            if espera_click(driver, xpath_tipo_cache, timeout=1, scroll=True):
+            if espera_click(driver, xpath_tipo_cache, timeout=_t("tipo", 1), scroll=True,
+                            paso="tipo", org_code=org_code):
                 exito_tipo, xpath_tipo = True, xpath_tipo_cache
                 print(f"[OK] ({org_code}) Tipo '{tipo}' seleccionado (cache)")
                 logger.info(f"({org_code}) Tipo '{tipo}' seleccionado con XPath cacheado")
             else:
                 print(f"[WARN] ({org_code}) XPath cacheado falló, buscando alternativas...")
                 exito_tipo, xpath_tipo = abrir_tipo_personal(
-                    driver, modulo, org_code, tipo=tipo, xpath_cache=xpath_cache
+                    driver, modulo, org_code, tipo=tipo, xpath_cache=xpath_cache,
+                    timeout=_t("tipo", 3)
                 )
         else:
             exito_tipo, xpath_tipo = abrir_tipo_personal(
-                driver, modulo, org_code, tipo=tipo, xpath_cache=xpath_cache
+                driver, modulo, org_code, tipo=tipo, xpath_cache=xpath_cache,
+                timeout=_t("tipo", 3)
             )
 
         if not exito_tipo:
             print(f"[WARN] ({org_code}) No se pudo abrir tipo '{tipo}'.")
+            snapshot_fallo(driver, org_code, "tipo", tipo=tipo, year=year)
             logger.warning(f"({org_code}) No se pudo abrir tipo de personal '{tipo}'")
-            resultados[tipo][year] = {
-                "tipo_personal_ok": False,
-                "area_municipal_ok": False,
-                "anio_ok": False,
-                "xpath_tipo": None,
-                "xpath_area": None,
-                "xpath_anio": None,
-                "meses_ok": False,
-                "meses_detalle": {}
-            }
+            resultados[tipo][year] = _resultado_tipo_fallido()
+            # La página ya cargó: sin contenedor de pestañas no hay secciones de personal
+            resultados[tipo][year]["sin_pestanas"] = _sin_pestanas(driver)
             continue
 
+        snapshot_paso(driver, org_code, "tipo", tipo=tipo, year=year)
+
         # 2. DETECTAR ESTRUCTURA (SI ES NECESARIO)
         exito_area, xpath_area = False, None
         
@@ -143,7 +300,7 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
             # Intentar seleccionar área
             exito_area_prueba, xpath_area_prueba = seleccionar_area(
                 driver, modulo, org_code, area_value="MUNICIPAL", 
-                xpath_cache=xpath_cache, timeout=2, tipo=tipo, modo_deteccion=True
+                xpath_cache=xpath_cache, timeout=_t("area", 2), tipo=tipo, modo_deteccion=True
             )
             
             if exito_area_prueba:
@@ -158,7 +315,7 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
                 
                 exito_anio_prueba, xpath_anio_prueba = seleccionar_anio(
                     driver, modulo, org_code, year=year,
-                    xpath_cache=xpath_cache, timeout=2, tipo=tipo, modo_deteccion=True
+                    xpath_cache=xpath_cache, timeout=_t("anio", 2), tipo=tipo, modo_deteccion=True
                 )
                 
                 if exito_anio_prueba:
@@ -167,6 +324,7 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
                     logger.info(f"({org_code}) Tipo '{tipo}': SIN área, pero CON años")
                 else:
                     estructura["tiene_area"] = False
+                    estructura["inusual"] = True  # hasta que algún año abra
                     print(f"[WARN] ({org_code}) Tipo '{tipo}': estructura inusual")
                     logger.warning(f"({org_code}) Tipo '{tipo}': estructura inusual")
         
@@ -174,13 +332,14 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
             print(f"[CACHE] ({org_code}) Tipo '{tipo}': tiene área municipal")
             exito_area, xpath_area = seleccionar_area(
                 driver, modulo, org_code, area_value="MUNICIPAL",
-                xpath_cache=xpath_cache, timeout=2, tipo=tipo
+                xpath_cache=xpath_cache, timeout=_t("area", 2), tipo=tipo
             )
             
             if not exito_area and "area" in estructura["xpaths"]:
                 xpath_area_cache = estructura["xpaths"]["area"]
                 print(f"[CACHE] ({org_code}) Probando XPath cacheado para área: {xpath_area_cache}")
-                if espera_click(driver, xpath_area_cache, timeout=1):
+                if espera_click(driver, xpath_area_cache, timeout=_t("area", 1),
+                                paso="area", org_code=org_code):
                     exito_area, xpath_area = True, xpath_area_cache
         
         else:
@@ -189,24 +348,83 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
             exito_area, xpath_area = False, None
 
         # 3. SELECCIONAR AÑO
+        t_anio = _t("anio", 2)
         exito_anio, xpath_anio = seleccionar_anio(
             driver, modulo, org_code, year=year,
-            xpath_cache=xpath_cache, timeout=2, tipo=tipo
+            xpath_cache=xpath_cache, timeout=t_anio, tipo=tipo
         )
+
+        # Estructura copiada de otro municipio con la misma huella: confirmarla o corregirla
+        if estructura.pop("desde_huella", False):
+            tenia_area = estructura["tiene_area"]
+            if tenia_area and not exito_area and exito_anio:
+                estructura["tiene_area"] = False
+            elif not tenia_area and not exito_anio:
+                exito_area, xpath_area = seleccionar_area(
+                    driver, modulo, org_code, area_value="MUNICIPAL",
+                    xpath_cache=xpath_cache, timeout=_t("area", 2), tipo=tipo, modo_deteccion=True
+                )
+                if exito_area:
+                    estructura["tiene_area"] = True
+                    estructura["xpaths"]["area"] = xpath_area
+                    exito_anio, xpath_anio = seleccionar_anio(
+                        driver, modulo, org_code, year=year,
+                        xpath_cache=xpath_cache, timeout=t_anio, tipo=tipo
+                    )
+            if estructura["tiene_area"] != tenia_area:
+                print(f"[LAYOUT] ({org_code}) Tipo '{tipo}': la estructura de la huella no aplicaba; corregida")
+                layouts.descartar(huella, tipo)
         
         if exito_anio and xpath_anio:
             estructura["xpaths"]["año"] = xpath_anio
+            estructura.pop("inusual", None)
+            snapshot_paso(driver, org_code, "anio", tipo=tipo, year=year)
+            if cache_negativa is not None:
+                cache_negativa.limpiar(org_code, tipo, year)
+        else:
+            snapshot_fallo(driver, org_code, "anio", tipo=tipo, year=year)
+            # Solo es "ausente" si la estructura se reconoció y el área (cuando existe) sí se pudo abrir
+            if not estructura.get("inusual") and (exito_area or not estructura["tiene_area"]):
+                registrar_timeout("anio", org_code, t_anio)
+                # ...y si se esperó el timeout completo: uno aprendido o recortado por el presupuesto no alcanza
+                if cache_negativa is not None and t_anio >= 2:
+                    cache_negativa.registrar_ausente(org_code, tipo, year)
 
         # 4. PROCESAR MESES
         meses_detalle = {}
         mes_ok = False
 
+        if exito_anio and meses and historico is not None:
+            # Un solo CSV por año en vez de una recarga y una descarga por mes
+            pendientes = [
+                m for m in meses
+                if not csv_existente(Path(download_root) / org_code / tipo / str(year) / f"{org_code}_{tipo}_{year}_{m}.csv")
+                and not (cache_negativa is not None and cache_negativa.esta_ausente(org_code, tipo, year, m))
+            ]
+            if len(pendientes) >= historico["min_months"]:
+                obtenidos = descargar_historico(
+                    driver, modulo, org_code, tipo, year, pendientes, settings.get("months", []),
+                    download_root, descargar_csv,
+                    xpath_cache=xpath_cache, timeout_click=_t("csv", 2),
+                    timeout_espera=_t("csv_espera", 15) * 2, postproceso=postproceso,
+                    un_solo_anio=historico["single_year"]
+                )
+                for mes, (ruta_csv, futuro_csv) in obtenidos.items():
+                    meses_detalle[mes] = {"status": "ÉXITO", "xpath_mes": "historico",
+                                          "csv_status": "PENDIENTE" if futuro_csv is not None else "ÉXITO",
+                                          "xpath_csv": None, "csv_path": ruta_csv}
+                    if futuro_csv is not None:
+                        en_postproceso.append((meses_detalle[mes], futuro_csv))
+                    mes_ok = True
+
         if exito_anio and meses:
             for mes in meses:
+                if mes in meses_detalle:
+                    continue  # ya salió del registro histórico
                 nombre_csv = f"{org_code}_{tipo}_{year}_{mes}.csv"
                 ruta_csv_esperada = Path(download_root) / org_code / tipo / str(year) / nombre_csv
 
-                if ruta_csv_esperada.exists() and ruta_csv_esperada.stat().st_size > 1024:
+                if csv_existente(ruta_csv_esperada):
                     print(f"[SKIP] ({org_code}) CSV ya existe para tipo {tipo}, año {year}, mes '{mes}'.")
                     logger.info(f"({org_code}) CSV ya existe para tipo {tipo}, año {year}, mes '{mes}'. Se omite descarga.")
                     meses_detalle[mes] = {
@@ -218,12 +436,21 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
                     mes_ok = True
                     continue
 
+                if cache_negativa is not None and cache_negativa.esta_ausente(org_code, tipo, year, mes):
+                    print(f"[CACHE-] ({org_code}) Mes '{mes}' sin publicación (caché negativa)")
+                    meses_detalle[mes] = {"status": "SKIP_AUSENTE", "xpath_mes": None,
+                                          "csv_status": "AUSENTE", "csv_path": None}
+                    continue
+
+                if presupuesto is not None and presupuesto.agotado():
+                    print(f"[TIEMPO] ({org_code}) Presupuesto agotado; mes '{mes}' queda pendiente")
+                    meses_detalle[mes] = {"status": "SIN_PRESUPUESTO", "xpath_mes": None}
+                    continue
+
                 print(f"[INFO] ({org_code}) Recargando para {tipo}, mes '{mes}'")
                 logger.info(f"({org_code}) Recargando municipio y seleccionando tipo, área y año del mes '{mes}'")
                 
-                driver.get(url)
-                
-                if not esperar_carga_municipio(driver, org_code):
+                if not cargar_municipio(driver, url, org_code, presupuesto):
                     print(f"[WARN] ({org_code}) No se pudo recargar para mes '{mes}'")
                     logger.warning(f"({org_code}) No se pudo recargar el municipio antes de mes '{mes}'")
                     meses_detalle[mes] = {"status": "FALLÓ", "xpath_mes": None}
@@ -231,34 +458,45 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
 
                 # TIPO
                 if cache_key_tipo in xpath_cache:
-                    espera_click(driver, xpath_cache[cache_key_tipo], timeout=0.5)
+                    espera_click(driver, xpath_cache[cache_key_tipo], timeout=_t("tipo", 0.5),
+                                 paso="tipo", org_code=org_code)
                 else:
-                    abrir_tipo_personal(driver, modulo, org_code, tipo=tipo, xpath_cache=xpath_cache)
+                    abrir_tipo_personal(driver, modulo, org_code, tipo=tipo, xpath_cache=xpath_cache,
+                                        timeout=_t("tipo", 3))
 
                 # ÁREA
                 if estructura["tiene_area"]:
                     xpath_area_cache = estructura["xpaths"].get("area")
                     if xpath_area_cache:
-                        espera_click(driver, xpath_area_cache, timeout=0.5)
+                        espera_click(driver, xpath_area_cache, timeout=_t("area", 0.5),
+                                     paso="area", org_code=org_code)
                     else:
                         seleccionar_area(driver, modulo, org_code, area_value="MUNICIPAL",
-                                       xpath_cache=xpath_cache, timeout=1, tipo=tipo)
+                                       xpath_cache=xpath_cache, timeout=_t("area", 1), tipo=tipo)
 
                 # AÑO
                 xpath_anio_cache = estructura["xpaths"].get("año")
                 if xpath_anio_cache:
-                    espera_click(driver, xpath_anio_cache, timeout=0.5)
+                    anio_recargado = espera_click(driver, xpath_anio_cache, timeout=_t("anio", 0.5),
+                                                  paso="anio", org_code=org_code)
                 else:
-                    seleccionar_anio(driver, modulo, org_code, year=year,
-                                   xpath_cache=xpath_cache, timeout=1, tipo=tipo)
+                    anio_recargado, _ = seleccionar_anio(driver, modulo, org_code, year=year,
+                                                         xpath_cache=xpath_cache, timeout=_t("anio", 1),
+                                                         tipo=tipo)
 
                 # MES
+                t_mes = _t("mes", 2)
                 exito_mes, xpath_mes = seleccionar_mes(
                     driver, modulo, org_code, month=mes,
-                    xpath_cache=xpath_cache, timeout=2, tipo=tipo
+                    xpath_cache=xpath_cache, timeout=t_mes, tipo=tipo
                 )
                 if not exito_mes:
                     print(f"[WARN] ({org_code}) No se pudo seleccionar mes '{mes}'")
+                    snapshot_fallo(driver, org_code, "mes", tipo=tipo, year=year, mes=mes)
+                    if anio_recargado:
+                        registrar_timeout("mes", org_code, t_mes)
+                        if cache_negativa is not None and t_mes >= 2:
+                            cache_negativa.registrar_ausente(org_code, tipo, year, mes)
                     logger.warning(f"({org_code}) No se pudo seleccionar el mes '{mes}' para tipo {tipo}.")
                     meses_detalle[mes] = {"status": "FALLÓ", "xpath_mes": None}
                     continue
@@ -267,27 +505,66 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
                 logger.info(f"({org_code}) Mes '{mes}' seleccionado correctamente para tipo {tipo}.")
                 meses_detalle[mes] = {"status": "ÉXITO", "xpath_mes": xpath_mes}
                 mes_ok = True
+                snapshot_paso(driver, org_code, "mes", tipo=tipo, year=year, mes=mes)
+                if cache_negativa is not None:
+                    cache_negativa.limpiar(org_code, tipo, year, mes)
 
                 # DESCARGAR CSV
+                carpeta_descarga = descargas.preparar() if descargas is not None else None
+                t_descarga = time.time()
                 exito_csv, xpath_csv = descargar_csv(
                     driver, modulo, org_code, xpath_cache=xpath_cache,
-                    timeout=15, tipo=tipo
+                    timeout=_t("csv", 15), tipo=tipo
                 )
                 
-                if exito_csv:
+                if exito_csv and carpeta_descarga is not None:
+                    print(f"[OK] ({org_code}) Descarga CSV disparada para {tipo}, {year}, '{mes}'")
+                    logger.info(f"({org_code}) Descarga CSV disparada para tipo {tipo}, año {year}, mes '{mes}'.")
+                    # Solo se espera a que empiece: el mes siguiente se navega mientras baja
+                    descargas.seguir(carpeta_descarga, org_code, tipo, year, mes, meses_detalle[mes],
+                                     xpath_csv, t_descarga, timeout=_t("csv_espera", 15))
+                    continue
+                elif exito_csv:
                     print(f"[OK] ({org_code}) Descarga CSV disparada para {tipo}, {year}, '{mes}'")
                     logger.info(f"({org_code}) Descarga CSV disparada para tipo {tipo}, año {year}, mes '{mes}'.")
                     
-                    ruta_csv = esperar_y_mover_csv(
-                        download_root=download_root,
-                        municipio=org_code,
-                        tipo_personal=tipo,
-                        year=year,
-                        mes=mes,
-                        timeout=15
-                    )
+                    t_espera_csv = time.time()
+                    t_csv = _t("csv_espera", 15)
+                    futuro_csv = ruta_csv = None
+                    if postproceso is not None:
+                        futuro_csv = esperar_y_encolar_csv(
+                            postproceso,
+                            download_root=download_root,
+                            municipio=org_code,
+                            tipo_personal=tipo,
+                            year=year,
+                            mes=mes,
+                            timeout=t_csv
+                        )
+                    else:
+                        ruta_csv = esperar_y_mover_csv(
+                            download_root=download_root,
+                            municipio=org_code,
+                            tipo_personal=tipo,
+                            year=year,
+                            mes=mes,
+                            timeout=t_csv
+                        )
+                    descargado = bool(ruta_csv) or futuro_csv is not None
+                    registrar_observacion("descarga", time.time() - t_descarga, descargado)
+                    if descargado:
+                        registrar_latencia("csv_espera", org_code, time.time() - t_espera_csv)
+                    else:
+                        registrar_timeout("csv_espera", org_code, t_csv)
                     
-                    if ruta_csv:
+                    if futuro_csv is not None:
+                        # El navegador sigue con el próximo mes; el estado final se fija antes del resumen
+                        meses_detalle[mes]["csv_status"] = "PENDIENTE"
+                        meses_detalle[mes]["xpath_csv"] = xpath_csv
+                        meses_detalle[mes]["csv_path"] = None
+                        en_postproceso.append((meses_detalle[mes], futuro_csv))
+                        print(f"[POST] ({org_code}) CSV {tipo} {year}-{mes} encolado para postproceso")
+                    elif ruta_csv:
                         meses_detalle[mes]["csv_status"] = "ÉXITO"
                         meses_detalle[mes]["xpath_csv"] = xpath_csv
                         meses_detalle[mes]["csv_path"] = ruta_csv
@@ -300,6 +577,10 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
                         print(f"[WARN] ({org_code}) No se pudo mover CSV")
                         logger.warning(f"({org_code}) No se pudo mover/renombrar el CSV para tipo {tipo}, año {year}, mes '{mes}'.")
                 else:
+                    if carpeta_descarga is not None:
+                        descargas.descartar(carpeta_descarga)
+                    # Sin botón de CSV (p. ej. mes sin datos): no es una falla del portal
+                    snapshot_fallo(driver, org_code, "csv", tipo=tipo, year=year, mes=mes)
                     print(f"[WARN] ({org_code}) No se pudo disparar CSV para {tipo}, {year}, '{mes}'")
                     logger.warning(f"({org_code}) No se pudo disparar descarga CSV para tipo {tipo}, año {year}, mes '{mes}'.")
                     meses_detalle[mes]["csv_status"] = "FALLÓ"
@@ -319,6 +600,29 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
             "meses_detalle": meses_detalle,
         }
 
+    if descargas is not None:
+        descargas.cerrar()
+        en_postproceso.extend(descargas.futuros)
+    for detalle, futuro_csv in en_postproceso:
+        try:
+            ruta_csv = futuro_csv.result()
+        except Exception as e:
+            print(f"[ERROR] ({org_code}) Falló el postproceso del CSV: {e}")
+            ruta_csv = None
+        detalle["csv_status"] = "ÉXITO" if ruta_csv else "FALLÓ"
+        detalle["csv_path"] = ruta_csv
+        if not ruta_csv:
+            logger.warning(f"({org_code}) El postproceso no pudo mover el CSV (xpath {detalle.get('xpath_csv')}).")
+
+    if cache_negativa is not None:
+        cache_negativa.guardar()
+    if layouts is not None and huella:
+        layouts.registrar(huella, org_code, estructura_cache[org_code], xpath_cache)
+        layouts.guardar()
+    guardar_latencias()
+    guardar_registro_esquemas()
+    guardar_cubo()
+
     # RESUMEN
     tiene_area_algun_tipo = any(
         estructura_cache[org_code][tipo]["tiene_area"]
@@ -348,13 +652,18 @@ def procesar_municipio(driver, org_code: str, settings: Dict[str, Any],
         "acceso_municipio_exitoso": acceso_municipio_exitoso,
         "tipo_municipio_detectado": tipo_municipio_detectado,
         "detalle_por_tipo": resultados,
+        "redirigido": redirigido,
+        "url_final": url_final,
+        "omitido_por_cache": all(
+            resultados.get(t, {}).get(year, {}).get("omitido_por_cache") for t in tipos_personal
+        ),
     }
 
 def abrir_tipo_personal(driver, modulo: Dict[str, Any], org_code: str, 
                        tipo: str, timeout: int = 3, xpath_cache=None, 
                        modo_deteccion: bool = False):
     if modo_deteccion:
-        timeout = 2
+        timeout = min(timeout, 2)
     
     scraping_actions = modulo.get("scraping_actions", [])
     config_tipo = None
@@ -389,7 +698,8 @@ def abrir_tipo_personal(driver, modulo: Dict[str, Any], org_code: str,
     
     for i, xp in enumerate(xpaths, 1):
         print(f"[XPATH] Intento #{i} para tipo '{tipo}': {xp}")
-        exito = espera_click(driver, xp, timeout=timeout, scroll=True)
+        exito = espera_click(driver, xp, timeout=timeout, scroll=True,
+                             paso="tipo", org_code=org_code)
         
         if exito:
             print(f"[OK] XPath #{i} funcionó para tipo '{tipo}'")
@@ -408,7 +718,7 @@ def seleccionar_area(driver, modulo: Dict[str, Any], org_code: str,
     """Selecciona el área municipal, probando TODOS los XPaths en modo detección."""
     
     if modo_deteccion:
-        timeout = 2  # Timeout más corto para detección, pero probamos TODOS los XPaths
+        timeout = min(timeout, 2)  # Timeout más corto para detección, pero probamos TODOS los XPaths
     
     scraping_actions = modulo.get("scraping_actions", [])
     config_area = None
@@ -448,7 +758,8 @@ def seleccionar_area(driver, modulo: Dict[str, Any], org_code: str,
     if xpath_cache and cache_key in xpath_cache and not modo_deteccion:
         xp_cache = xpath_cache[cache_key]
         print(f"[CACHE] ({org_code}) Probando XPath cacheado: {xp_cache}")
-        if espera_click(driver, xp_cache, timeout=timeout, scroll=True):
+        if espera_click(driver, xp_cache, timeout=timeout, scroll=True,
+                        paso="area", org_code=org_code):
             print(f"[OK] XPath cacheado funcionó para área '{area_value}'")
             time.sleep(0.1)
             return True, xp_cache
@@ -456,7 +767,8 @@ def seleccionar_area(driver, modulo: Dict[str, Any], org_code: str,
     # PROBAR TODOS LOS XPATHS (sin límite)
     for i, xp in enumerate(xpaths, 1):
         print(f"[XPATH] Intento #{i}/{len(xpaths)} para área '{area_value}': {xp}")
-        exito = espera_click(driver, xp, timeout=timeout, scroll=True)
+        exito = espera_click(driver, xp, timeout=timeout, scroll=True,
+                             paso="area", org_code=org_code)
         
         if exito:
             print(f"[OK] XPath #{i} funcionó para área '{area_value}'")
@@ -475,7 +787,7 @@ def seleccionar_anio(driver, modulo: Dict[str, Any], org_code: str,
                     year: int, tipo: str = None, timeout: int = 2, 
                     xpath_cache=None, modo_deteccion: bool = False):
     if modo_deteccion:
-        timeout = 2
+        timeout = min(timeout, 2)
     
     scraping_actions = modulo.get("scraping_actions", [])
     config_anio = None
@@ -506,7 +818,8 @@ def seleccionar_anio(driver, modulo: Dict[str, Any], org_code: str,
     
     for i, xp in enumerate(xpaths, 1):
         print(f"[XPATH] Intento #{i} para año '{year_str}': {xp}")
-        exito = espera_click(driver, xp, timeout=timeout, scroll=True)
+        exito = espera_click(driver, xp, timeout=timeout, scroll=True,
+                             paso="anio", org_code=org_code)
         
         if exito:
             print(f"[OK] XPath #{i} funcionó para año '{year_str}'")
@@ -559,7 +872,8 @@ def seleccionar_mes(driver, modulo: Dict[str, Any], org_code: str,
     
     for i, xp in enumerate(xpaths, 1):
         print(f"[XPATH] Intento #{i} para mes '{month_str}': {xp}")
-        exito = espera_click(driver, xp, timeout=timeout, scroll=True)
+        exito = espera_click(driver, xp, timeout=timeout, scroll=True,
+                             paso="mes", org_code=org_code)
         
         if exito:
             print(f"[OK] XPath #{i} funcionó para mes '{month_str}'")
@@ -604,7 +918,8 @@ def descargar_csv(driver, modulo: Dict[str, Any], org_code: str,
     
     for i, xp in enumerate(xpaths, 1):
         print(f"[XPATH] Intento #{i} para CSV: {xp}")
-        exito = espera_click(driver, xp, timeout=timeout, scroll=True)
+        exito = espera_click(driver, xp, timeout=timeout, scroll=True,
+                             paso="csv", org_code=org_code)
         
         if exito:
             print(f"[OK] XPath #{i} funcionó para CSV")
@@ -617,6 +932,52 @@ def descargar_csv(driver, modulo: Dict[str, Any], org_code: str,
     print(f"[ERROR] ({org_code}) No se pudo descargar CSV después de {len(xpaths)} intentos")
     return False, None
 
+def obtener_xpaths_accion(modulo: Dict[str, Any], tipo_accion: str, valor=None) -> list:
+    """
+    Devuelve la lista de XPaths configurada para una acción de scraping,
+    ya expandida para el valor pedido (tipo, área, año o mes).
+    """
+    config = None
+    for sa in modulo.get("scraping_actions", []):
+        if sa.get("type") == tipo_accion:
+            config = sa
+            break
+
+    if not config:
+        return []
+
+    if tipo_accion in ("open_tipo_personal", "select_area"):
+        for opt in config.get("options", []):
+            if opt.get("value") == valor:
+                return list(opt.get("xpaths") or [])
+        return []
+
+    if tipo_accion == "select_anio":
+        year_str = str(valor)
+        return [pat.replace("{YEAR}", year_str) for pat in config.get("year_patterns", [])]
+
+    if tipo_accion == "select_mes":
+        month_str = str(valor)
+        month_lower = month_str.lower()
+        month_partial = month_lower[:4]
+        return [
+            pat.replace("{MONTH}", month_str)
+               .replace("{MONTH_LOWER}", month_lower)
+               .replace("{MONTH_PARTIAL}", month_partial)
+            for pat in config.get("month_patterns", [])
+        ]
+
+    if tipo_accion == "select_historico":
+        return list(config.get("xpaths", []))
+
+    if tipo_accion == "download_csv":
+        xpaths = list(config.get("xpaths", []))
+        if config.get("selector_button"):
+            xpaths.append(config["selector_button"])
+        return xpaths
+
+    return []
+
 def get_meses_para_year(year, settings):
     meses = settings.get("months", [])
     now = datetime.now()
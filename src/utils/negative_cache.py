@@ -0,0 +1,83 @@
+"""
+Caché negativa de combinaciones sin publicación.
+
+Guarda en STATE_DIR/cache_negativa.json las combinaciones (org, tipo, año) y
+(org, tipo, año, mes) para las que seleccionar_anio / seleccionar_mes
+agotaron todos sus patrones. Mientras la entrada no venza, procesar_municipio
+se salta esa combinación sin cargar la página ni recorrer la escalera de
+timeouts. Al vencer el TTL se vuelve a comprobar; si ahora existe, la
+entrada se borra.
+
+El año en curso usa un TTL más corto porque es donde aparecen publicaciones
+nuevas.
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from .state_store import leer_json, guardar_json
+
+DEFAULTS_NEGATIVE_CACHE = {
+    "enabled": False,
+    "ttl_days": 30,
+    "ttl_days_anio_actual": 3,
+}
+
+
+def _clave(org_code: str, tipo: str, year: int, mes: Optional[str] = None) -> str:
+    partes = [org_code, tipo, str(year)]
+    if mes is not None:
+        partes.append(str(mes))
+    return "|".join(partes)
+
+
+class CacheNegativa:
+    def __init__(self, path: Path, ttl_days: float = 30, ttl_days_anio_actual: float = 3):
+        self.path = Path(path)
+        self.ttl = timedelta(days=ttl_days)
+        self.ttl_anio_actual = timedelta(days=ttl_days_anio_actual)
+        self.entradas: Dict[str, str] = leer_json(self.path, default={}) or {}
+        self._sucia = False
+
+    def esta_ausente(self, org_code: str, tipo: str, year: int, mes: Optional[str] = None) -> bool:
+        fecha_str = self.entradas.get(_clave(org_code, tipo, year, mes))
+        if not fecha_str:
+            return False
+        try:
+            fecha = datetime.fromisoformat(fecha_str)
+        except ValueError:
+            return False
+        ttl = self.ttl_anio_actual if int(year) == datetime.now().year else self.ttl
+        return datetime.now() - fecha <= ttl
+
+    def registrar_ausente(self, org_code: str, tipo: str, year: int, mes: Optional[str] = None):
+        self.entradas[_clave(org_code, tipo, year, mes)] = datetime.now().isoformat(timespec="seconds")
+        self._sucia = True
+
+    def limpiar(self, org_code: str, tipo: str, year: int, mes: Optional[str] = None):
+        if self.entradas.pop(_clave(org_code, tipo, year, mes), None) is not None:
+            self._sucia = True
+
+    def guardar(self):
+        if self._sucia:
+            guardar_json(self.path, self.entradas)
+            self._sucia = False
+
+
+_CACHE: Optional[CacheNegativa] = None
+
+
+def cargar_cache_negativa(settings: Dict[str, Any], state_dir: str) -> Optional[CacheNegativa]:
+    global _CACHE
+    config = {**DEFAULTS_NEGATIVE_CACHE, **(settings.get("negative_cache") or {})}
+    if not config.get("enabled"):
+        _CACHE = None
+        return None
+    path = Path(state_dir) / "cache_negativa.json"
+    if _CACHE is None or _CACHE.path != path:
+        _CACHE = CacheNegativa(
+            path,
+            ttl_days=config["ttl_days"],
+            ttl_days_anio_actual=config["ttl_days_anio_actual"],
+        )
+    return _CACHE
@@ -0,0 +1,128 @@
+"""
+Índice auto-mantenido de municipios muertos o sin publicación.
+
+Tras procesar un municipio se clasifica según lo observado:
+  - "sin_pagina": la página del organismo no cargó para ningún tipo.
+  - "redirigido": el portal redirigió a una URL que no es la del organismo.
+  - "sin_secciones_personal": la página terminó de cargar y no tiene el
+    contenedor de pestañas (si las pestañas están pero el clic en el tipo
+    falló, puede ser lentitud: no se clasifica).
+  - "activo": se pudo abrir al menos un tipo de personal.
+
+Las clasificaciones se guardan en STATE_DIR/indice_municipios.json. Un estado
+negativo queda vigente cuando se observó en `min_confirmaciones` días distintos
+seguidos (una sesión mala del portal, con varias tareas del mismo municipio,
+cuenta una sola vez) y, mientras
+no venza su TTL, obtener_lista_municipios() lo excluye sin costo. Al vencer el
+TTL el municipio se vuelve a intentar y se reclasifica.
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from .state_store import leer_json, guardar_json
+
+ESTADOS_MUERTOS = ("sin_pagina", "redirigido", "sin_secciones_personal")
+
+DEFAULTS_ORG_INDEX = {
+    "enabled": False,
+    "ttl_days": 30,
+    "min_confirmaciones": 2,
+}
+
+
+def clasificar_resultado(resultados: Dict[str, Any]) -> Optional[str]:
+    """
+    Clasifica un municipio a partir del dict devuelto por procesar_municipio.
+    Devuelve None si no hubo observación real (todo salió de la caché negativa).
+    """
+    if resultados.get("omitido_por_cache"):
+        return None
+    if resultados.get("redirigido"):
+        return "redirigido"
+    if not resultados.get("acceso_municipio_exitoso"):
+        return "sin_pagina"
+
+    observados = [datos for datos_por_anio in (resultados.get("detalle_por_tipo") or {}).values()
+                  for datos in datos_por_anio.values()]
+    if any(datos.get("tipo_personal_ok") for datos in observados):
+        return "activo"
+    if observados and all(datos.get("sin_pestanas") for datos in observados):
+        return "sin_secciones_personal"
+    return None
+
+
+class IndiceMunicipios:
+    def __init__(self, path: Path, ttl_days: float = 30, min_confirmaciones: int = 2):
+        self.path = Path(path)
+        self.ttl = timedelta(days=ttl_days)
+        self.min_confirmaciones = max(1, int(min_confirmaciones))
+        self.entradas: Dict[str, Dict[str, Any]] = leer_json(self.path, default={}) or {}
+
+    def estado_vigente(self, org_code: str) -> Optional[str]:
+        """Estado muerto vigente del municipio, o None si hay que procesarlo."""
+        entrada = self.entradas.get(org_code)
+        if not entrada or entrada.get("estado") not in ESTADOS_MUERTOS:
+            return None
+        if entrada.get("consecutivos", 1) < self.min_confirmaciones:
+            return None
+        try:
+            fecha = datetime.fromisoformat(entrada["fecha"])
+        except (KeyError, ValueError):
+            return None
+        if datetime.now() - fecha > self.ttl:
+            return None
+        return entrada["estado"]
+
+    def registrar(self, org_code: str, estado: str, detalle: str = ""):
+        entrada_anterior = self.entradas.get(org_code) or {}
+        anterior = entrada_anterior.get("estado")
+        ahora = datetime.now()
+        dia = ahora.date().isoformat()
+        if estado != anterior:
+            consecutivos = 1
+        else:
+            dia_anterior = entrada_anterior.get("dia") or entrada_anterior.get("fecha", "")[:10]
+            consecutivos = entrada_anterior.get("consecutivos", 1) + (dia_anterior != dia)
+        self.entradas[org_code] = {
+            "estado": estado,
+            "fecha": ahora.isoformat(timespec="seconds"),
+            "dia": dia,
+            "consecutivos": consecutivos,
+            "detalle": detalle,
+        }
+        guardar_json(self.path, self.entradas)
+        if estado != anterior and (estado in ESTADOS_MUERTOS or anterior in ESTADOS_MUERTOS):
+            print(f"[INDICE] {org_code}: {anterior or 'sin clasificar'} -> {estado}")
+
+    def registrar_resultado(self, org_code: str, resultados: Dict[str, Any]) -> Optional[str]:
+        estado = clasificar_resultado(resultados)
+        if estado is None:
+            return None
+        self.registrar(org_code, estado, detalle=resultados.get("url_final") or "")
+        return estado
+
+    def resumen(self) -> Dict[str, int]:
+        conteo: Dict[str, int] = {}
+        for org_code in self.entradas:
+            estado = self.estado_vigente(org_code) or "pendiente"
+            conteo[estado] = conteo.get(estado, 0) + 1
+        return conteo
+
+
+_INDICE: Optional[IndiceMunicipios] = None
+
+
+def cargar_indice(settings: Dict[str, Any], state_dir: str) -> Optional[IndiceMunicipios]:
+    global _INDICE
+    config = {**DEFAULTS_ORG_INDEX, **(settings.get("org_index") or {})}
+    if not config.get("enabled"):
+        _INDICE = None
+        return None
+    if _INDICE is None or _INDICE.path != Path(state_dir) / "indice_municipios.json":
+        _INDICE = IndiceMunicipios(
+            Path(state_dir) / "indice_municipios.json",
+            ttl_days=config["ttl_days"],
+            min_confirmaciones=config["min_confirmaciones"],
+        )
+    return _INDICE
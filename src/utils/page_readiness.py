@@ -0,0 +1,133 @@
+"""
+Espera de carga por eventos del DOM.
+
+Por defecto Chrome navega con pageLoadStrategy "normal" (driver.get vuelve
+tras el evento load) y esperar_carga_municipio además sondea
+document.readyState == "complete": cada recarga espera imágenes, hojas de
+estilo y scripts de terceros aunque lo único que se usa después son las
+pestañas de tipo de personal.
+
+Con settings["page_readiness"]:
+
+    {"strategy": "eager", "observer": true}
+
+build_driver usa la estrategia indicada ("eager": driver.get vuelve en
+DOMContentLoaded; "none": apenas empieza la navegación) y la espera se hace
+con un MutationObserver (execute_async_script) que responde en cuanto existe
+un enlace de tipo de personal o un contenedor de pestañas y el documento ya
+pasó DOMContentLoaded (antes, PrimeFaces/jQuery todavía no engancharon los
+manejadores y el clic caería en un enlace muerto). Si la página
+termina de cargar sin esos nodos (municipio sin datos, página de error) se
+responde igual con el evento load, así nunca se espera más que antes.
+
+Se compara contra la espera actual con `python -m src.load_benchmark`.
+"""
+import time
+from typing import Dict, Any, List, Optional
+
+DEFAULTS_PAGE_READINESS = {
+    "strategy": "normal",
+    "observer": False,
+}
+
+ESTRATEGIAS = ("normal", "eager", "none")
+
+XPATH_PESTANAS = "//div[contains(@class, 'tabs-content') or contains(@class, 'tab-content')]"
+
+# arguments: [xpaths, timeout_ms, callback]. Responde "nodos", "load", "viejo"
+# (todavía es el documento anterior a la navegación) o null si vence el plazo.
+JS_ESPERAR_NODOS = r"""
+const [xpaths, plazo, listo] = arguments;
+if (window.__pdt_previo) { listo('viejo'); return; }
+const hay = () => document.readyState !== 'loading' && xpaths.some(xp => {
+    try {
+        return document.evaluate(xp, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)
+            .singleNodeValue !== null;
+    } catch (e) { return false; }
+});
+if (hay()) { listo('nodos'); return; }
+if (document.readyState === 'complete') { listo('load'); return; }
+let hecho = false, reloj = null, observador = null;
+const fin = r => {
+    if (hecho) return;
+    hecho = true;
+    if (observador) observador.disconnect();
+    clearTimeout(reloj);
+    window.removeEventListener('load', alCargar);
+    listo(r);
+};
+const alCargar = () => fin(hay() ? 'nodos' : 'load');
+observador = new MutationObserver(() => { if (hay()) fin('nodos'); });
+observador.observe(document, {childList: true, subtree: true});
+document.addEventListener('DOMContentLoaded', () => { if (hay()) fin('nodos'); });
+window.addEventListener('load', alCargar);
+reloj = setTimeout(() => fin(null), plazo);
+"""
+
+
+def configuracion_carga(settings: Dict[str, Any]) -> Dict[str, Any]:
+    config = {**DEFAULTS_PAGE_READINESS, **(settings.get("page_readiness") or {})}
+    if config["strategy"] not in ESTRATEGIAS:
+        print(f"[WARN] page_readiness.strategy '{config['strategy']}' no válida; se usa 'normal'")
+        config["strategy"] = "normal"
+    return config
+
+
+def xpaths_de_carga(modulo: Dict[str, Any]) -> List[str]:
+    """XPaths de los enlaces de tipo de personal (primera acción tras cargar) y del contenedor de pestañas."""
+    xpaths = []
+    for sa in modulo.get("scraping_actions", []):
+        if sa.get("type") == "open_tipo_personal":
+            for opt in sa.get("options", []):
+                xpaths.extend(opt.get("xpaths") or [])
+    xpaths.append(XPATH_PESTANAS)
+    return list(dict.fromkeys(xpaths))
+
+
+_XPATHS: Optional[List[str]] = None
+
+
+def configurar_espera_carga(settings: Dict[str, Any], modulo: Dict[str, Any]) -> Optional[List[str]]:
+    """Activa la espera por MutationObserver si settings.page_readiness.observer lo pide."""
+    global _XPATHS
+    _XPATHS = xpaths_de_carga(modulo) if configuracion_carga(settings)["observer"] else None
+    return _XPATHS
+
+
+def xpaths_espera() -> Optional[List[str]]:
+    return _XPATHS
+
+
+def marcar_documento(driver):
+    """Marca el documento actual para no confundirlo con el nuevo (estrategia "none")."""
+    try:
+        driver.execute_script("window.__pdt_previo = true;")
+    except Exception:
+        pass
+
+
+def _fijar_script_timeout(driver, segundos: float):
+    if getattr(driver, "_pdt_script_timeout", None) != segundos:
+        driver.set_script_timeout(segundos)
+        driver._pdt_script_timeout = segundos
+
+
+def esperar_nodos(driver, xpaths: List[str], timeout: float) -> Optional[str]:
+    """
+    Espera a que exista alguno de `xpaths` o termine la carga. Devuelve "nodos",
+    "load" o None si venció el plazo.
+    """
+    limite = time.time() + timeout
+    while True:
+        restante = limite - time.time()
+        if restante <= 0:
+            return None
+        _fijar_script_timeout(driver, restante + 2)
+        try:
+            resultado = driver.execute_async_script(JS_ESPERAR_NODOS, xpaths, int(restante * 1000))
+        except Exception:
+            # El documento se reemplazó mientras el script esperaba: se reintenta en el nuevo
+            resultado = "viejo"
+        if resultado != "viejo":
+            return resultado
+        time.sleep(0.05)
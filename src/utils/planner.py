@@ -0,0 +1,237 @@
+"""
+Fase de planificación: calcula el trabajo pendiente antes de abrir un navegador.
+
+Por cada (municipio, año) se lista una sola vez cada carpeta
+DOWNLOAD_ROOT/{org}/{tipo}/{year} con os.scandir (sin abrir archivos) y se
+descuentan los meses ya descargados y los que la caché negativa da como sin
+publicación. Solo las tareas con algún mes pendiente entran al plan, así que
+una ejecución sin nada que hacer termina sin lanzar Chrome.
+
+La duración estimada usa los segundos por mes observados en ejecuciones
+anteriores (STATE_DIR/duraciones.json, por municipio cuando hay historial).
+priorizar() reordena el plan para que lleguen primero los datos más recientes
+y las tareas rápidas, y al final las que vienen fallando.
+"""
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from .delta_store import nombres_en_delta
+from .navigation_helpers import get_meses_para_year
+from .state_store import leer_json, guardar_json
+
+TIPOS_PERSONAL = ("CONTRATA", "PLANTA")
+SEGUNDOS_POR_MES_DEFAULT = 20.0
+MAX_MUESTRAS_DURACION = 200
+MAX_MUESTRAS_ORG = 20
+CRITERIOS_PRIORIDAD = ("fallos", "recencia", "rapidez")
+
+DEFAULTS_SCHEDULER = {
+    "priority": ["fallos", "recencia", "rapidez"],
+}
+
+
+@dataclass
+class Plan:
+    tareas: List[tuple] = field(default_factory=list)          # (org, year, meses)
+    meses_pendientes: Dict[tuple, int] = field(default_factory=dict)  # (org, year) -> n
+    completas: int = 0
+    por_cache: int = 0
+
+    @property
+    def total_meses(self) -> int:
+        return sum(self.meses_pendientes.values())
+
+
+def _csv_presentes(carpeta: Path) -> set:
+    """Nombres de CSV no vacíos en la carpeta (un solo scandir) más los guardados en su almacén delta."""
+    try:
+        with os.scandir(carpeta) as it:
+            presentes = {e.name for e in it if e.name.endswith(".csv") and e.stat().st_size > 0}
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+    presentes.update(n for n, largo in nombres_en_delta(carpeta).items() if largo > 0)
+    return presentes
+
+
+def _meses_pendientes(download_root: str, org_code: str, year: int, meses: List[str],
+                      cache_negativa=None) -> Tuple[int, int]:
+    """(meses sin CSV, meses sin CSV que además no están en la caché negativa)."""
+    faltantes = pendientes = 0
+    for tipo in TIPOS_PERSONAL:
+        presentes = _csv_presentes(Path(download_root) / org_code / tipo / str(year))
+        anio_ausente = cache_negativa is not None and cache_negativa.esta_ausente(org_code, tipo, year)
+        for mes in meses:
+            if f"{org_code}_{tipo}_{year}_{mes}.csv" in presentes:
+                continue
+            faltantes += 1
+            if anio_ausente:
+                continue
+            if cache_negativa is not None and cache_negativa.esta_ausente(org_code, tipo, year, mes):
+                continue
+            pendientes += 1
+    return faltantes, pendientes
+
+
+def planificar(orgs: List[str], settings: Dict[str, Any], download_root: str,
+               cache_negativa=None) -> Plan:
+    """Tareas (municipio, año, meses) con al menos un mes pendiente, ordenadas por año."""
+    plan = Plan()
+    for year in range(settings["start_year"], settings["end_year"] + 1):
+        meses_para_year = get_meses_para_year(year, settings)
+        if not meses_para_year:
+            print(f"[INFO] Año {year} no tiene meses completos. Se omite.")
+            continue
+        for org_code in orgs:
+            faltantes, pendientes = _meses_pendientes(
+                download_root, org_code, year, meses_para_year, cache_negativa
+            )
+            if faltantes == 0:
+                plan.completas += 1
+            elif pendientes == 0:
+                plan.por_cache += 1
+            else:
+                plan.tareas.append((org_code, year, meses_para_year))
+                plan.meses_pendientes[(org_code, year)] = pendientes
+    return plan
+
+
+# ----------------------------------------------------------------------
+# Historial de tareas: duración y fallos
+# ----------------------------------------------------------------------
+class HistorialTareas:
+    """
+    STATE_DIR/duraciones.json:
+        {"global": [s/mes, ...], "orgs": {org: [s/mes, ...]}, "fallos": {"org|year": n}}
+    """
+
+    def __init__(self, state_dir: str):
+        self.path = Path(state_dir) / "duraciones.json"
+        datos = leer_json(self.path, default={}) or {}
+        if isinstance(datos, list):  # formato anterior: solo la lista global
+            datos = {"global": datos}
+        self.global_: List[float] = datos.get("global", [])
+        self.orgs: Dict[str, List[float]] = datos.get("orgs", {})
+        self.fallos_por_tarea: Dict[str, int] = datos.get("fallos", {})
+
+    def registrar(self, org_code: str, year: int, duracion: float, meses_intentados: int, fallida: bool):
+        clave = f"{org_code}|{year}"
+        if fallida:
+            self.fallos_por_tarea[clave] = self.fallos_por_tarea.get(clave, 0) + 1
+        else:
+            self.fallos_por_tarea.pop(clave, None)
+        if meses_intentados > 0:
+            muestra = round(duracion / meses_intentados, 2)
+            self.global_ = (self.global_ + [muestra])[-MAX_MUESTRAS_DURACION:]
+            self.orgs[org_code] = (self.orgs.get(org_code, []) + [muestra])[-MAX_MUESTRAS_ORG:]
+
+    def guardar(self):
+        guardar_json(self.path, {"global": self.global_, "orgs": self.orgs, "fallos": self.fallos_por_tarea})
+
+    @staticmethod
+    def _mediana(valores: List[float]) -> Optional[float]:
+        if not valores:
+            return None
+        return sorted(valores)[len(valores) // 2]
+
+    def segundos_por_mes(self, org_code: Optional[str] = None) -> Optional[float]:
+        if org_code and self.orgs.get(org_code):
+            return self._mediana(self.orgs[org_code])
+        return self._mediana(self.global_)
+
+    def fallos(self, org_code: str, year: int) -> int:
+        return self.fallos_por_tarea.get(f"{org_code}|{year}", 0)
+
+
+def tarea_fallida(resultados: Optional[Dict[str, Any]], year: int) -> bool:
+    if resultados is None or not resultados.get("acceso_municipio_exitoso"):
+        return not (resultados or {}).get("omitido_por_cache")
+    for datos_por_anio in (resultados.get("detalle_por_tipo") or {}).values():
+        datos = datos_por_anio.get(year, {}) if isinstance(datos_por_anio, dict) else {}
+        for info in (datos.get("meses_detalle") or {}).values():
+            if "FALLÓ" in (info.get("status"), info.get("csv_status")):
+                return True
+    return False
+
+
+def registrar_tarea(state_dir: str, org_code: str, year: int, duracion: float,
+                    meses_intentados: int, resultados: Optional[Dict[str, Any]]):
+    """Guarda duración por mes y éxito/fallo de una tarea para planificar las próximas."""
+    if resultados is not None and resultados.get("omitido_por_cache"):
+        return
+    historial = HistorialTareas(state_dir)
+    historial.registrar(org_code, year, duracion, meses_intentados if resultados else 0,
+                        tarea_fallida(resultados, year))
+    historial.guardar()
+
+
+# ----------------------------------------------------------------------
+# Prioridad
+# ----------------------------------------------------------------------
+def _clave_prioridad(criterios: List[str], historial: HistorialTareas, plan: Plan):
+    def clave(tarea):
+        org_code, year, _ = tarea
+        partes = []
+        for criterio in criterios:
+            if criterio == "fallos":
+                partes.append(historial.fallos(org_code, year))
+            elif criterio == "recencia":
+                partes.append(-year)
+            elif criterio == "rapidez":
+                por_mes = historial.segundos_por_mes(org_code) or SEGUNDOS_POR_MES_DEFAULT
+                partes.append(por_mes * plan.meses_pendientes[(org_code, year)])
+        return tuple(partes)
+    return clave
+
+
+def priorizar(plan: Plan, settings: Dict[str, Any], state_dir: str) -> Plan:
+    """
+    Reordena las tareas según settings["scheduler"]["priority"], una lista de
+    criterios aplicados en orden:
+      - "fallos":   tareas que fallaron en ejecuciones anteriores van al final.
+      - "recencia": años más recientes primero (y dentro del año, meses del último al primero).
+      - "rapidez":  tareas con menor duración estimada primero (historial por municipio).
+    Con una lista vacía se mantiene el orden clásico (año ascendente, orden de orgs).
+    """
+    config = {**DEFAULTS_SCHEDULER, **(settings.get("scheduler") or {})}
+    criterios = [c for c in config["priority"] if c in CRITERIOS_PRIORIDAD]
+    if not criterios:
+        return plan
+    historial = HistorialTareas(state_dir)
+    plan.tareas.sort(key=_clave_prioridad(criterios, historial, plan))
+    if "recencia" in criterios:
+        plan.tareas = [(org, year, list(reversed(meses))) for org, year, meses in plan.tareas]
+    return plan
+
+
+def estimar_duracion(plan: Plan, settings: Dict[str, Any], state_dir: str) -> float:
+    historial = HistorialTareas(state_dir)
+    return sum(
+        (historial.segundos_por_mes(org) or SEGUNDOS_POR_MES_DEFAULT) * n
+        for (org, _), n in plan.meses_pendientes.items()
+    )
+
+
+def formatear_duracion(segundos: float) -> str:
+    segundos = int(segundos)
+    return f"{segundos // 3600:02d}:{(segundos % 3600) // 60:02d}:{segundos % 60:02d}"
+
+
+def imprimir_plan(plan: Plan, settings: Dict[str, Any], state_dir: str, detalle: int = 20):
+    estimado = estimar_duracion(plan, settings, state_dir)
+    fuente = "histórico" if HistorialTareas(state_dir).segundos_por_mes() else "valor por defecto"
+    print("\n=== PLAN ===")
+    print(f"Tareas (municipio, año) pendientes: {len(plan.tareas)}")
+    print(f"Meses pendientes (CONTRATA + PLANTA): {plan.total_meses}")
+    print(f"Tareas completas: {plan.completas} | sin pendientes por caché negativa: {plan.por_cache}")
+    por_year: Dict[int, int] = {}
+    for _, year, _ in plan.tareas:
+        por_year[year] = por_year.get(year, 0) + 1
+    for year, n in sorted(por_year.items()):
+        print(f"   - {year}: {n} municipios")
+    for org_code, year, _ in plan.tareas[:detalle]:
+        print(f"   * {org_code} {year}: {plan.meses_pendientes[(org_code, year)]} meses")
+    if len(plan.tareas) > detalle:
+        print(f"   ... y {len(plan.tareas) - detalle} tareas más")
+    print(f"Duración estimada: {formatear_duracion(estimado)} ({fuente})")
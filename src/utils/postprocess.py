@@ -0,0 +1,133 @@
+"""
+Postproceso de descargas en segundo plano.
+
+Con settings["postprocess"]["enabled"] el hilo del navegador solo espera a que
+el CSV aparezca en la carpeta de descargas, lo aparta a DOWNLOAD_ROOT/_postproceso/
+(un rename, así la próxima descarga no lo confunde) y encola el trabajo. Los
+hilos del postproceso hacen el resto con mover_csv_final: copia a la ruta final,
+registro de esquema, índice de búsqueda, cubo, almacén delta y cierre del diario.
+
+La cola es acotada (max_queue): si el postproceso se atrasa, encolar() bloquea
+al navegador hasta que haya lugar, en vez de acumular archivos sin límite.
+procesar_municipio espera sus propios trabajos antes de armar el resumen, así
+que los resultados por mes siguen siendo los mismos que sin postproceso.
+
+Solo sale del hilo del navegador lo que pasa *después* de que el CSV está
+completo: la espera de la descarga en sí sigue en el navegador. Para encolar
+apenas la descarga empieza y navegar mientras baja, se combina con prefetch
+(src/utils/prefetch.py), que entrega cada CSV terminado a esta cola.
+
+Cada registro (esquemas, índice, cubo, delta) tiene su propio lock en
+browser_helpers: con workers > 1 un hilo puede estar indexando un archivo
+mientras otro actualiza el cubo con el anterior, pero un mismo registro nunca
+procesa dos archivos a la vez.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from .browser_helpers import mover_csv_final
+from .download_journal import obtener_diario
+
+DEFAULTS_POSTPROCESS = {
+    "enabled": False,
+    "workers": 1,
+    "max_queue": 4,
+}
+
+CARPETA_POSTPROCESO = "_postproceso"
+
+
+class PipelinePostproceso:
+    def __init__(self, config: Dict[str, Any]):
+        self.cola: queue.Queue = queue.Queue(maxsize=max(1, int(config["max_queue"])))
+        self.hilos = [threading.Thread(target=self._trabajar, name=f"postproceso-{i}", daemon=True)
+                      for i in range(max(1, int(config["workers"])))]
+        self.espera_total = 0.0
+        for hilo in self.hilos:
+            hilo.start()
+
+    def encolar(self, archivo: Path, download_root: str, org_code: str, tipo: str, year: int,
+                mes: str, id_diario: Optional[str] = None) -> Future:
+        """Aparta el CSV descargado y encola su finalización. Bloquea si la cola está llena."""
+        carpeta = Path(download_root) / CARPETA_POSTPROCESO
+        carpeta.mkdir(parents=True, exist_ok=True)
+        apartado = carpeta / f"{org_code}_{tipo}_{year}_{mes}_{id_diario or int(time.time() * 1000)}.csv"
+        os.replace(archivo, apartado)
+
+        diario = obtener_diario()
+        if diario is not None and id_diario:
+            final = Path(download_root) / org_code / tipo / str(year) / f"{org_code}_{tipo}_{year}_{mes}.csv"
+            diario.mover(id_diario, apartado, final.with_suffix(".tmp"), final)
+
+        futuro: Future = Future()
+        inicio = time.time()
+        self.cola.put((futuro, (apartado, download_root, org_code, tipo, year, mes, id_diario)))
+        espera = time.time() - inicio
+        if espera > 0.1:
+            self.espera_total += espera
+            print(f"[POST] Cola llena: el navegador esperó {espera:.1f}s para encolar {org_code} {tipo} {year}-{mes}")
+        return futuro
+
+    def _trabajar(self):
+        while True:
+            trabajo = self.cola.get()
+            if trabajo is None:
+                self.cola.task_done()
+                return
+            futuro, (apartado, download_root, org_code, tipo, year, mes, id_diario) = trabajo
+            futuro.set_running_or_notify_cancel()
+            try:
+                ruta = mover_csv_final(apartado, download_root, org_code, tipo, year, mes, id_diario=id_diario)
+                diario = obtener_diario()
+                if diario is not None and id_diario:
+                    diario.terminar(id_diario, bool(ruta))
+                futuro.set_result(ruta)
+            except Exception as e:
+                futuro.set_exception(e)
+            finally:
+                self.cola.task_done()
+
+    def pendientes(self) -> int:
+        return self.cola.unfinished_tasks
+
+    def cerrar(self):
+        """Termina los trabajos encolados y detiene los hilos."""
+        for _ in self.hilos:
+            self.cola.put(None)
+        for hilo in self.hilos:
+            hilo.join()
+
+
+_PIPELINE: Optional[PipelinePostproceso] = None
+
+
+def configurar_postproceso(settings: Dict[str, Any]) -> Optional[PipelinePostproceso]:
+    global _PIPELINE
+    config = {**DEFAULTS_POSTPROCESS, **(settings.get("postprocess") or {})}
+    if not config["enabled"]:
+        return None
+    if _PIPELINE is None:
+        _PIPELINE = PipelinePostproceso(config)
+    return _PIPELINE
+
+
+def obtener_postproceso() -> Optional[PipelinePostproceso]:
+    return _PIPELINE
+
+
+def cerrar_postproceso():
+    global _PIPELINE
+    if _PIPELINE is None:
+        return
+    pendientes = _PIPELINE.pendientes()
+    if pendientes:
+        print(f"[POST] Esperando {pendientes} CSV en postproceso...")
+    _PIPELINE.cerrar()
+    if _PIPELINE.espera_total:
+        print(f"[POST] Tiempo total del navegador bloqueado por la cola: {_PIPELINE.espera_total:.1f}s")
+    _PIPELINE = None
@@ -0,0 +1,162 @@
+"""
+Descargas solapadas con la navegación del mes siguiente.
+
+Sin esto, cada mes espera a que su CSV termine de bajar (hasta csv_espera) y
+duerme 1 s antes de recargar la página para el mes siguiente. Con
+settings["prefetch"]["enabled"], procesar_municipio solo espera a que Chrome
+*empiece* la descarga (aparece el .crdownload o el CSV; navegar antes de eso
+cancelaría el POST de exportación) y sigue con el mes siguiente en la misma
+pestaña: las descargas ya iniciadas continúan aunque la página cambie.
+
+Para saber qué archivo es de qué mes, cada descarga va a su propia carpeta
+DOWNLOAD_ROOT/_prefetch/{id}/, fijada con Page.setDownloadBehavior justo antes
+del clic. A lo más `slots` descargas quedan en curso a la vez; si están todas
+ocupadas se espera a la más antigua. Cada descarga terminada se finaliza con
+mover_csv_final o, si está activo, se entrega al postproceso.
+"""
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from .browser_helpers import buscar_csv_descargado, mover_csv_final
+from .download_journal import obtener_diario
+from .rate_control import registrar_observacion
+from .timeouts import registrar_latencia, registrar_timeout
+
+DEFAULTS_PREFETCH = {
+    "enabled": False,
+    "slots": 2,
+}
+
+CARPETA_PREFETCH = "_prefetch"
+
+
+def _fijar_carpeta_descargas(driver, carpeta: Path):
+    driver.execute_cdp_cmd("Page.setDownloadBehavior", {"behavior": "allow", "downloadPath": str(carpeta)})
+
+
+class DescargasEnCurso:
+    def __init__(self, driver, download_root: str, slots: int = 2, postproceso=None):
+        self.driver = driver
+        self.download_root = download_root
+        self.base = Path(download_root).resolve() / CARPETA_PREFETCH
+        self.slots = max(1, int(slots))
+        self.postproceso = postproceso
+        self.en_curso: List[Dict[str, Any]] = []
+        self.futuros: List[Tuple[Dict[str, Any], Any]] = []  # (meses_detalle[mes], Future) del postproceso
+
+    def preparar(self) -> Optional[Path]:
+        """
+        Carpeta nueva para la próxima descarga; si no hay slot libre espera a la
+        más antigua. None si no se pudo fijar (ese mes sigue el flujo secuencial).
+        """
+        self.revisar()
+        while len(self.en_curso) >= self.slots:
+            self._esperar(self.en_curso[0])
+        carpeta = self.base / uuid.uuid4().hex[:10]
+        carpeta.mkdir(parents=True, exist_ok=True)
+        try:
+            _fijar_carpeta_descargas(self.driver, carpeta)
+        except Exception as e:
+            print(f"[WARN] No se pudo fijar la carpeta de descarga: {e}")
+            self.descartar(carpeta)
+            self.cerrar()
+            return None
+        return carpeta
+
+    def descartar(self, carpeta: Path):
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    def seguir(self, carpeta: Path, org_code: str, tipo: str, year: int, mes: str,
+               detalle: Dict[str, Any], xpath_csv: Optional[str], inicio: float, timeout: float):
+        """
+        Espera a que la descarga empiece (como mucho `timeout`) y la deja en curso.
+        Si no empieza, el mes queda como fallido igual que en el flujo secuencial.
+        """
+        diario = obtener_diario()
+        descarga = {
+            "carpeta": carpeta, "org": org_code, "tipo": tipo, "year": year, "mes": mes,
+            "detalle": detalle, "inicio": inicio, "limite": inicio + timeout,
+            "id_diario": diario.iniciar(carpeta, org_code, tipo, year, mes) if diario else None,
+        }
+        detalle["xpath_csv"] = xpath_csv
+        detalle["csv_path"] = None
+        while time.time() < descarga["limite"]:
+            try:
+                if any(carpeta.iterdir()):
+                    detalle["csv_status"] = "EN_CURSO"
+                    self.en_curso.append(descarga)
+                    print(f"[PREFETCH] ({org_code}) Descarga de {tipo} {year}-{mes} en curso; se sigue navegando")
+                    self.revisar()
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        self._finalizar(descarga, None)
+
+    def revisar(self):
+        """Finaliza las descargas que ya terminaron o vencieron, sin bloquear."""
+        for descarga in list(self.en_curso):
+            archivo = buscar_csv_descargado(descarga["carpeta"])
+            if archivo is not None or time.time() >= descarga["limite"]:
+                self.en_curso.remove(descarga)
+                self._finalizar(descarga, archivo)
+
+    def _esperar(self, descarga: Dict[str, Any]):
+        archivo = None
+        while time.time() < descarga["limite"]:
+            archivo = buscar_csv_descargado(descarga["carpeta"])
+            if archivo is not None:
+                break
+            time.sleep(0.3)
+        self.en_curso.remove(descarga)
+        self._finalizar(descarga, archivo)
+
+    def esperar_todas(self):
+        while self.en_curso:
+            self._esperar(self.en_curso[0])
+
+    def _finalizar(self, descarga: Dict[str, Any], archivo: Optional[Path]):
+        org_code, tipo, year, mes = descarga["org"], descarga["tipo"], descarga["year"], descarga["mes"]
+        detalle, id_diario = descarga["detalle"], descarga["id_diario"]
+        duracion = time.time() - descarga["inicio"]
+        registrar_observacion("descarga", duracion, archivo is not None)
+        diario = obtener_diario()
+
+        if archivo is None:
+            print(f"[ERROR] ({org_code}) No se completó el CSV de {tipo} {year}-{mes} a tiempo")
+            detalle["csv_status"] = "FALLÓ"
+            registrar_timeout("csv_espera", org_code, descarga["limite"] - descarga["inicio"])
+            if diario is not None:
+                diario.terminar(id_diario, False)
+        else:
+            registrar_latencia("csv_espera", org_code, duracion)
+            if self.postproceso is not None:
+                detalle["csv_status"] = "PENDIENTE"
+                self.futuros.append((detalle, self.postproceso.encolar(
+                    archivo, self.download_root, org_code, tipo, year, mes, id_diario=id_diario)))
+            else:
+                ruta = mover_csv_final(archivo, self.download_root, org_code, tipo, year, mes, id_diario=id_diario)
+                if diario is not None:
+                    diario.terminar(id_diario, bool(ruta))
+                detalle["csv_status"] = "ÉXITO" if ruta else "FALLÓ"
+                detalle["csv_path"] = ruta
+        shutil.rmtree(descarga["carpeta"], ignore_errors=True)
+
+    def cerrar(self):
+        """Espera lo pendiente y devuelve las descargas del navegador a DOWNLOAD_ROOT."""
+        self.esperar_todas()
+        try:
+            _fijar_carpeta_descargas(self.driver, Path(self.download_root).resolve())
+        except Exception as e:
+            print(f"[WARN] No se pudo restaurar la carpeta de descargas: {e}")
+
+
+def crear_descargas_en_curso(driver, download_root: str, settings: Dict[str, Any],
+                             postproceso=None) -> Optional[DescargasEnCurso]:
+    config = {**DEFAULTS_PREFETCH, **(settings.get("prefetch") or {})}
+    if not config["enabled"]:
+        return None
+    return DescargasEnCurso(driver, download_root, config["slots"], postproceso)
@@ -0,0 +1,148 @@
+"""
+Control adaptativo de concurrencia y ritmo de peticiones (AIMD).
+
+Se registran la latencia y el resultado (ok / error / timeout) de las cargas
+de página y de las descargas, cada paso en su propia ventana y con su propio
+objetivo de latencia (una descarga incluye la espera del CSV y tarda bastante
+más que una carga). Solo cuentan como error los timeouts y las fallas del
+portal; un mes sin botón de CSV no dice nada de su salud. Cada `window`
+observaciones de un paso se evalúa:
+  - si la tasa de errores o la latencia p90 superan los umbrales, se reduce
+    multiplicativamente el número de workers activos y se duplica el
+    espaciado entre peticiones;
+  - si no, se suma un worker y se reduce el espaciado en un paso fijo.
+Siempre dentro de los límites configurados en settings["rate_control"].
+
+Los motores actuales procesan un municipio a la vez y solo aplican el
+espaciado; `workers` es la concurrencia recomendada y se informa en
+/status.json.
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+DEFAULTS_RATE_CONTROL = {
+    "enabled": False,
+    "min_workers": 1,
+    "max_workers": 16,
+    "initial_workers": 2,
+    "min_delay": 0.0,
+    "max_delay": 10.0,
+    "delay_step": 0.25,
+    "latency_target": 8.0,           # p90 aceptable de "carga"
+    "download_latency_target": 30.0,  # p90 aceptable de "descarga" (clic + espera del CSV)
+    "max_error_rate": 0.2,
+    "decrease_factor": 0.5,
+    "window": 20,
+}
+
+
+def _percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))
+    return ordenados[idx]
+
+
+class ControladorAIMD:
+    def __init__(self, config: Dict[str, Any]):
+        cfg = {**DEFAULTS_RATE_CONTROL, **(config or {})}
+        self.min_workers = max(1, int(cfg["min_workers"]))
+        self.max_workers = max(self.min_workers, int(cfg["max_workers"]))
+        self.min_delay = float(cfg["min_delay"])
+        self.max_delay = max(self.min_delay, float(cfg["max_delay"]))
+        self.delay_step = float(cfg["delay_step"])
+        self.objetivos = {"carga": float(cfg["latency_target"]),
+                          "descarga": float(cfg["download_latency_target"])}
+        self.max_error_rate = float(cfg["max_error_rate"])
+        self.decrease_factor = float(cfg["decrease_factor"])
+        self.ventana = max(1, int(cfg["window"]))
+
+        self.workers = min(self.max_workers, max(self.min_workers, int(cfg["initial_workers"])))
+        self.delay = self.min_delay
+
+        self._observaciones: Dict[str, deque] = {}
+        self._nuevas: Dict[str, int] = {}
+        self._ultima_peticion = 0.0
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Observaciones y ajuste
+    # ------------------------------------------------------------------
+    def registrar(self, paso: str, latencia: float, ok: bool):
+        with self._lock:
+            ventana = self._observaciones.setdefault(paso, deque(maxlen=self.ventana))
+            ventana.append((latencia, ok))
+            self._nuevas[paso] = self._nuevas.get(paso, 0) + 1
+            if self._nuevas[paso] < self.ventana:
+                return
+            self._nuevas[paso] = 0
+            self._ajustar(paso)
+
+    def _ajustar(self, paso: str):
+        observaciones = self._observaciones[paso]
+        total = len(observaciones)
+        errores = sum(1 for _, ok in observaciones if not ok)
+        tasa_error = errores / total if total else 0.0
+        p90 = _percentil([lat for lat, ok in observaciones if ok], 0.9)
+        objetivo = self.objetivos.get(paso, self.objetivos["carga"])
+
+        workers_antes, delay_antes = self.workers, self.delay
+        if tasa_error > self.max_error_rate or p90 > objetivo:
+            self.workers = max(self.min_workers, int(self.workers * self.decrease_factor))
+            self.delay = min(self.max_delay, max(self.delay * 2, self.delay_step))
+            motivo = "BAJA"
+        else:
+            self.workers = min(self.max_workers, self.workers + 1)
+            self.delay = max(self.min_delay, self.delay - self.delay_step)
+            motivo = "SUBE"
+
+        if (workers_antes, delay_antes) != (self.workers, self.delay):
+            print(f"[AIMD] {motivo} ({paso}): errores={tasa_error:.0%} p90={p90:.1f}s/{objetivo:.0f}s -> "
+                  f"workers {workers_antes}->{self.workers}, espaciado {delay_antes:.2f}->{self.delay:.2f}s")
+
+    def estado(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "delay": self.delay}
+
+    # ------------------------------------------------------------------
+    # Espaciado entre peticiones
+    # ------------------------------------------------------------------
+    def _reservar_turno(self) -> float:
+        """Reserva el próximo hueco de petición y devuelve cuánto hay que esperar."""
+        with self._lock:
+            ahora = time.time()
+            siguiente = max(ahora, self._ultima_peticion + self.delay)
+            self._ultima_peticion = siguiente
+            return siguiente - ahora
+
+    def esperar_espaciado(self):
+        espera = self._reservar_turno()
+        if espera > 0:
+            time.sleep(espera)
+
+
+_CONTROLADOR: Optional[ControladorAIMD] = None
+
+
+def configurar_controlador(settings: Dict[str, Any]) -> Optional[ControladorAIMD]:
+    """Crea el controlador global si settings["rate_control"]["enabled"] es verdadero."""
+    global _CONTROLADOR
+    config = settings.get("rate_control") or {}
+    _CONTROLADOR = ControladorAIMD(config) if config.get("enabled") else None
+    return _CONTROLADOR
+
+
+def obtener_controlador() -> Optional[ControladorAIMD]:
+    return _CONTROLADOR
+
+
+def registrar_observacion(paso: str, latencia: float, ok: bool):
+    if _CONTROLADOR is not None:
+        _CONTROLADOR.registrar(paso, latencia, ok)
+
+
+def esperar_espaciado():
+    if _CONTROLADOR is not None:
+        _CONTROLADOR.esperar_espaciado()
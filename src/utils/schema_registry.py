@@ -0,0 +1,196 @@
+"""
+Registro de esquemas de los CSV del portal.
+
+Cada encabezado distinto se identifica por una huella (hash del encabezado
+normalizado, en orden). La primera vez que aparece se compila su mapeo
+posición -> columna canónica usando los alias de configs/schema_canonico.json
+y se guarda en STATE_DIR/schema_registry.json, junto con las columnas que no
+se pudieron mapear. Además, cada CSV final queda asociado a su huella en
+STATE_DIR/schema_archivos.json, de modo que staging aplica el mapeo ya
+compilado sin volver a inferir nada.
+
+Es opcional: se activa con settings["schema_registry"]["enabled"]. Sin él,
+src/staging.py registra los CSV que encuentre al consolidar.
+"""
+import hashlib
+import re
+import unicodedata
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from src.config import load_canonical_schema
+from .csv_format import leer_encabezado
+from .state_store import leer_json, guardar_json
+
+DEFAULTS_SCHEMA_REGISTRY = {
+    "enabled": False,
+}
+
+
+def normalizar_columna(nombre: str) -> str:
+    """'Remuneración Bruta  Mensualizada ' -> 'remuneracion bruta mensualizada'."""
+    sin_tildes = unicodedata.normalize("NFKD", nombre).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", " ", sin_tildes.lower()).strip()
+
+
+def alias_de_esquema(esquema: Dict[str, Any]) -> Dict[str, str]:
+    """Alias normalizado -> columna canónica de un esquema {"columns": {canónica: [alias, ...]}}."""
+    alias = {}
+    for canonica, nombres in esquema["columns"].items():
+        for n in [canonica] + list(nombres):
+            alias[normalizar_columna(n)] = canonica
+    return alias
+
+
+@lru_cache(maxsize=1)
+def alias_canonicos() -> Dict[str, str]:
+    """Alias normalizado -> columna canónica según configs/schema_canonico.json."""
+    return alias_de_esquema(load_canonical_schema())
+
+
+def huella_encabezado(encabezado: List[str]) -> str:
+    normalizado = "\x1f".join(normalizar_columna(c) for c in encabezado)
+    return hashlib.sha1(normalizado.encode("utf-8")).hexdigest()[:16]
+
+
+class MapeoCompilado:
+    """Mapeo listo para aplicar: lista de (posición en el CSV, columna canónica)."""
+
+    def __init__(self, pares: List[Tuple[int, str]], columnas_canonicas: List[str]):
+        self.pares = pares
+        self.columnas_canonicas = columnas_canonicas
+
+    def aplicar(self, fila: List[str]) -> Dict[str, Optional[str]]:
+        salida = dict.fromkeys(self.columnas_canonicas)
+        largo = len(fila)
+        for idx, canonica in self.pares:
+            if idx < largo:
+                salida[canonica] = fila[idx]
+        return salida
+
+
+class RegistroEsquemas:
+    def __init__(self, state_dir: str, esquema: Optional[Dict[str, Any]] = None):
+        esquema = esquema or load_canonical_schema()
+        self.columnas_canonicas: List[str] = list(esquema["columns"].keys())
+        self.alias: Dict[str, str] = alias_de_esquema(esquema)
+
+        self.path_variantes = Path(state_dir) / "schema_registry.json"
+        self.path_archivos = Path(state_dir) / "schema_archivos.json"
+        self.variantes: Dict[str, Dict[str, Any]] = leer_json(self.path_variantes, default={}) or {}
+        self.archivos: Dict[str, str] = leer_json(self.path_archivos, default={}) or {}
+        self._compilados: Dict[str, MapeoCompilado] = {}
+        self._sucio = False
+
+    def _compilar_variante(self, encabezado: List[str]) -> Dict[str, Any]:
+        mapeo: List[Optional[str]] = []
+        usadas = set()
+        for col in encabezado:
+            canonica = self.alias.get(normalizar_columna(col))
+            # Si dos columnas caen en la misma canónica, se queda la primera
+            if canonica in usadas:
+                canonica = None
+            if canonica:
+                usadas.add(canonica)
+            mapeo.append(canonica)
+        return {
+            "encabezado": encabezado,
+            "mapeo": mapeo,
+            "sin_mapear": [c for c, m in zip(encabezado, mapeo) if m is None],
+            "faltantes": [c for c in self.columnas_canonicas if c not in usadas],
+            "primera_vez": datetime.now().isoformat(timespec="seconds"),
+            "archivos": 0,
+        }
+
+    def registrar_encabezado(self, encabezado: List[str], origen: str = "") -> str:
+        huella = huella_encabezado(encabezado)
+        variante = self.variantes.get(huella)
+        if variante is None:
+            variante = self._compilar_variante(encabezado)
+            variante["ejemplo"] = origen
+            self.variantes[huella] = variante
+            aviso = f" | sin mapear: {variante['sin_mapear']}" if variante["sin_mapear"] else ""
+            print(f"[ESQUEMA] Nueva variante {huella} ({len(encabezado)} columnas) en {origen}{aviso}")
+            self._sucio = True
+        return huella
+
+    def registrar_archivo(self, path_csv, download_root: Optional[str] = None) -> Optional[str]:
+        """Huella del CSV recién finalizado; queda asociada a su ruta relativa."""
+        encabezado = leer_encabezado(path_csv)
+        if not encabezado:
+            return None
+        clave = self._clave_archivo(path_csv, download_root)
+        huella = self.registrar_encabezado(encabezado, origen=clave)
+        previa = self.archivos.get(clave)
+        if previa != huella:
+            # "archivos" cuenta archivos distintos: volver a registrar el mismo no suma
+            if previa in self.variantes:
+                self.variantes[previa]["archivos"] = max(0, self.variantes[previa].get("archivos", 0) - 1)
+            self.variantes[huella]["archivos"] = self.variantes[huella].get("archivos", 0) + 1
+            self.archivos[clave] = huella
+            self._sucio = True
+        return huella
+
+    @staticmethod
+    def _clave_archivo(path_csv, download_root: Optional[str]) -> str:
+        path_csv = Path(path_csv)
+        if download_root:
+            try:
+                return path_csv.resolve().relative_to(Path(download_root).resolve()).as_posix()
+            except ValueError:
+                pass
+        return path_csv.as_posix()
+
+    def huella_de_archivo(self, path_csv, download_root: Optional[str] = None) -> Optional[str]:
+        return self.archivos.get(self._clave_archivo(path_csv, download_root))
+
+    def mapeo(self, huella: str) -> Optional[MapeoCompilado]:
+        compilado = self._compilados.get(huella)
+        if compilado is None:
+            variante = self.variantes.get(huella)
+            if variante is None:
+                return None
+            pares = [(i, c) for i, c in enumerate(variante["mapeo"]) if c]
+            compilado = MapeoCompilado(pares, self.columnas_canonicas)
+            self._compilados[huella] = compilado
+        return compilado
+
+    def variantes_incompletas(self) -> Dict[str, Dict[str, Any]]:
+        return {h: v for h, v in self.variantes.items() if v["sin_mapear"]}
+
+    def guardar(self):
+        if self._sucio:
+            guardar_json(self.path_variantes, self.variantes)
+            guardar_json(self.path_archivos, self.archivos)
+            self._sucio = False
+
+
+_REGISTRO: Optional[RegistroEsquemas] = None
+
+
+def cargar_registro_esquemas(settings: Dict[str, Any], state_dir: str) -> Optional[RegistroEsquemas]:
+    global _REGISTRO
+    config = {**DEFAULTS_SCHEMA_REGISTRY, **(settings.get("schema_registry") or {})}
+    if not config["enabled"]:
+        _REGISTRO = None
+        return None
+    if _REGISTRO is None or _REGISTRO.path_variantes.parent != Path(state_dir):
+        _REGISTRO = RegistroEsquemas(state_dir)
+    return _REGISTRO
+
+
+def registrar_csv_final(path_csv, download_root: str):
+    """Gancho para cuando un CSV queda en su ruta final. No lanza excepciones."""
+    if _REGISTRO is None:
+        return
+    try:
+        _REGISTRO.registrar_archivo(path_csv, download_root)
+    except Exception as e:
+        print(f"[WARN] No se pudo registrar el esquema de {path_csv}: {e}")
+
+
+def guardar_registro_esquemas():
+    if _REGISTRO is not None:
+        _REGISTRO.guardar()
@@ -0,0 +1,321 @@
+"""
+Índice invertido de personas y cargos sobre los CSV descargados.
+
+Por cada CSV final se extraen los campos configurados (por defecto nombre y
+apellidos, cargo, grado y calificación, vía los alias de schema_canonico.json),
+se normalizan (sin tildes, minúsculas) y se guarda, por cada palabra, la lista
+de offsets en bytes de las filas que la contienen:
+
+    terminos(id, campo, termino)
+    archivos(id, clave, org, tipo, year, mes, sha256, filas)
+    postings(termino_id, archivo_id, offsets)   -- offsets: array de enteros empaquetado
+
+El índice vive en SQLite (STATE_DIR/indice_busqueda.sqlite): una consulta son
+algunos lookups por clave primaria y luego se leen solo las filas
+referenciadas (seek al offset en el CSV crudo, o sobre la reconstrucción si el
+mes quedó solo en el almacén delta; los offsets son los mismos porque la
+reconstrucción es exacta).
+
+Se actualiza al finalizar cada CSV (indexar_csv_final) y un archivo ya
+indexado con el mismo sha256 no se vuelve a procesar.
+"""
+import hashlib
+import io
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from .csv_format import formato_de_muestra, leer_registro, registros_con_offset
+from .delta_store import GrupoDelta, leer_csv
+from .schema_registry import alias_canonicos, normalizar_columna
+
+DEFAULTS_SEARCH_INDEX = {
+    "enabled": False,
+    "path": None,  # por defecto STATE_DIR/indice_busqueda.sqlite
+    "fields": {
+        "persona": ["nombres", "apellido_paterno", "apellido_materno"],
+        "cargo": ["cargo"],
+        "grado": ["grado"],
+        "calificacion": ["calificacion"],
+    },
+}
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS archivos (
+    id INTEGER PRIMARY KEY,
+    clave TEXT UNIQUE NOT NULL,
+    org TEXT, tipo TEXT, year INTEGER, mes TEXT,
+    sha256 TEXT, filas INTEGER
+);
+CREATE TABLE IF NOT EXISTS terminos (
+    id INTEGER PRIMARY KEY,
+    campo TEXT NOT NULL,
+    termino TEXT NOT NULL,
+    UNIQUE (campo, termino)
+);
+CREATE TABLE IF NOT EXISTS postings (
+    termino_id INTEGER NOT NULL,
+    archivo_id INTEGER NOT NULL,
+    offsets BLOB NOT NULL,
+    PRIMARY KEY (termino_id, archivo_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_archivo ON postings (archivo_id);
+"""
+
+_RE_NOMBRE_CSV = re.compile(r"^(?P<org>[^_]+)_(?P<tipo>[^_]+)_(?P<year>\d{4})_(?P<mes>.+)\.csv$")
+
+
+def terminos_de(valor: str) -> List[str]:
+    """'José  Pérez-Soto' -> ['jose', 'perez', 'soto']."""
+    return [t for t in normalizar_columna(valor or "").split(" ") if t]
+
+
+def _empaquetar(offsets: List[int]) -> bytes:
+    """Offsets crecientes como diferencias en varint (1-2 bytes por fila en la práctica)."""
+    salida = bytearray()
+    anterior = 0
+    for offset in offsets:
+        gap = offset - anterior
+        anterior = offset
+        while gap >= 0x80:
+            salida.append((gap & 0x7F) | 0x80)
+            gap >>= 7
+        salida.append(gap)
+    return bytes(salida)
+
+
+def _desempaquetar(blob: bytes) -> List[int]:
+    offsets = []
+    actual = gap = desplazamiento = 0
+    for byte in blob:
+        gap |= (byte & 0x7F) << desplazamiento
+        if byte & 0x80:
+            desplazamiento += 7
+            continue
+        actual += gap
+        offsets.append(actual)
+        gap = desplazamiento = 0
+    return offsets
+
+
+class IndiceBusqueda:
+    def __init__(self, path, campos: Optional[Dict[str, List[str]]] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.campos = campos or DEFAULTS_SEARCH_INDEX["fields"]
+        # check_same_thread=False: con el postproceso se indexa desde otro hilo (serializado
+        # por browser_helpers._LOCK_INDICE)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_ESQUEMA)
+        self._ids_terminos: Dict[Tuple[str, str], int] = {}
+
+    def cerrar(self):
+        self.conn.close()
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+    def _id_termino(self, campo: str, termino: str) -> int:
+        clave = (campo, termino)
+        tid = self._ids_terminos.get(clave)
+        if tid is None:
+            self.conn.execute("INSERT OR IGNORE INTO terminos (campo, termino) VALUES (?, ?)", clave)
+            tid = self.conn.execute("SELECT id FROM terminos WHERE campo = ? AND termino = ?", clave).fetchone()[0]
+            self._ids_terminos[clave] = tid
+        return tid
+
+    def _columnas_por_campo(self, encabezado: List[str]) -> Dict[str, List[int]]:
+        alias = alias_canonicos()
+        canonicas = [alias.get(normalizar_columna(c)) for c in encabezado]
+        return {campo: [i for i, c in enumerate(canonicas) if c in columnas]
+                for campo, columnas in self.campos.items()}
+
+    def indexar(self, clave: str, datos: bytes, org: str, tipo: str, year: int, mes: str) -> Optional[int]:
+        """Indexa (o reindexa) un CSV. Devuelve las filas indexadas, o None si no cambió."""
+        sha = hashlib.sha256(datos).hexdigest()
+        fila = self.conn.execute("SELECT id, sha256 FROM archivos WHERE clave = ?", (clave,)).fetchone()
+        if fila is not None and fila[1] == sha:
+            return None
+
+        encoding, dialecto = formato_de_muestra(datos[:8192])
+        try:
+            with self.conn:
+                return self._escribir(clave, datos, encoding, dialecto, fila, sha, org, tipo, year, mes)
+        except Exception:
+            # Los ids de términos insertados en la transacción fallida ya no existen
+            self._ids_terminos.clear()
+            raise
+
+    def _escribir(self, clave, datos, encoding, dialecto, fila, sha, org, tipo, year, mes) -> int:
+        postings: Dict[int, List[int]] = defaultdict(list)
+        columnas: Dict[str, List[int]] = {}
+        filas = 0
+        for offset, campos in registros_con_offset(datos, encoding, dialecto):
+            if offset == 0:
+                columnas = self._columnas_por_campo([c.strip() for c in campos])
+                continue
+            if not campos:
+                continue
+            filas += 1
+            for campo, indices in columnas.items():
+                vistos = set()
+                for i in indices:
+                    if i < len(campos):
+                        vistos.update(terminos_de(campos[i]))
+                for termino in vistos:
+                    postings[self._id_termino(campo, termino)].append(offset)
+
+        if fila is not None:
+            archivo_id = fila[0]
+            self.conn.execute("DELETE FROM postings WHERE archivo_id = ?", (archivo_id,))
+            self.conn.execute("UPDATE archivos SET sha256 = ?, filas = ? WHERE id = ?", (sha, filas, archivo_id))
+        else:
+            archivo_id = self.conn.execute(
+                "INSERT INTO archivos (clave, org, tipo, year, mes, sha256, filas) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (clave, org, tipo, year, mes, sha, filas),
+            ).lastrowid
+        self.conn.executemany(
+            "INSERT INTO postings (termino_id, archivo_id, offsets) VALUES (?, ?, ?)",
+            ((tid, archivo_id, _empaquetar(offs)) for tid, offs in postings.items()),
+        )
+        return filas
+
+    def indexar_archivo(self, ruta_csv, download_root) -> Optional[int]:
+        ruta_csv = Path(ruta_csv)
+        m = _RE_NOMBRE_CSV.match(ruta_csv.name)
+        if not m:
+            return None
+        clave = ruta_csv.resolve().relative_to(Path(download_root).resolve()).as_posix()
+        return self.indexar(clave, leer_csv(ruta_csv), m["org"], m["tipo"], int(m["year"]), m["mes"])
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+    def _postings(self, campo: str, termino: str) -> Dict[int, List[int]]:
+        filas = self.conn.execute(
+            "SELECT p.archivo_id, p.offsets FROM postings p JOIN terminos t ON t.id = p.termino_id "
+            "WHERE t.campo = ? AND t.termino = ?", (campo, termino),
+        ).fetchall()
+        return {archivo_id: _desempaquetar(blob) for archivo_id, blob in filas}
+
+    def coincidencias(self, filtros: Dict[str, str], orgs=None, tipos=None, years=None,
+                      months=None) -> Dict[int, List[int]]:
+        """{archivo_id: offsets} de las filas que contienen todas las palabras de cada filtro."""
+        resultado: Optional[Dict[int, set]] = None
+        for campo, valor in filtros.items():
+            for termino in terminos_de(valor):
+                actual = self._postings(campo, termino)
+                if resultado is None:
+                    resultado = {a: set(o) for a, o in actual.items()}
+                else:
+                    resultado = {a: resultado[a] & set(o) for a, o in actual.items() if a in resultado}
+                    resultado = {a: o for a, o in resultado.items() if o}
+                if not resultado:
+                    return {}
+        if not resultado:
+            return {}
+
+        particiones = {"org": orgs, "tipo": tipos, "year": years, "mes": months}
+        if any(v is not None for v in particiones.values()):
+            ids = ",".join(str(a) for a in resultado)
+            permitidos = set()
+            for archivo_id, org, tipo, year, mes in self.conn.execute(
+                f"SELECT id, org, tipo, year, mes FROM archivos WHERE id IN ({ids})"
+            ):
+                valores = {"org": org, "tipo": tipo, "year": year, "mes": mes}
+                if all(f is None or str(valores[k]).upper() in {str(x).upper() for x in f}
+                       for k, f in particiones.items()):
+                    permitidos.add(archivo_id)
+            resultado = {a: o for a, o in resultado.items() if a in permitidos}
+        return {a: sorted(o) for a, o in resultado.items()}
+
+    def buscar(self, download_root, limite: Optional[int] = 100, orgs=None, tipos=None, years=None,
+               months=None, **filtros: str) -> Iterator[Dict[str, Any]]:
+        """
+        Filas completas que coinciden con los filtros (campo=texto, p. ej.
+        persona="juan perez", cargo="director"), leyendo solo esas filas.
+        """
+        filtros = {c: v for c, v in filtros.items() if v}
+        for campo in filtros:
+            if campo not in self.campos:
+                raise ValueError(f"Campo no indexado: {campo} (disponibles: {list(self.campos)})")
+        coincidencias = self.coincidencias(filtros, orgs, tipos, years, months)
+        grupos: Dict[Path, GrupoDelta] = {}
+        entregadas = 0
+        for archivo_id, offsets in sorted(coincidencias.items()):
+            clave, org, tipo, year, mes = self.conn.execute(
+                "SELECT clave, org, tipo, year, mes FROM archivos WHERE id = ?", (archivo_id,)
+            ).fetchone()
+            for fila in _leer_filas(Path(download_root) / clave, offsets, grupos):
+                fila.update({"_org": org, "_tipo": tipo, "_year": year, "_mes": mes})
+                yield fila
+                entregadas += 1
+                if limite is not None and entregadas >= limite:
+                    return
+
+    def estadisticas(self) -> Dict[str, int]:
+        return {
+            "archivos": self.conn.execute("SELECT COUNT(*) FROM archivos").fetchone()[0],
+            "filas": self.conn.execute("SELECT COALESCE(SUM(filas), 0) FROM archivos").fetchone()[0],
+            "terminos": self.conn.execute("SELECT COUNT(*) FROM terminos").fetchone()[0],
+            "postings": self.conn.execute("SELECT COUNT(*) FROM postings").fetchone()[0],
+        }
+
+
+def _leer_filas(ruta_csv: Path, offsets: Iterable[int],
+                grupos: Dict[Path, GrupoDelta]) -> Iterator[Dict[str, str]]:
+    """Lee el encabezado y las filas de los offsets dados (seek en el crudo o sobre la reconstrucción)."""
+    if ruta_csv.exists():
+        f = ruta_csv.open("rb")
+    else:
+        # Mes guardado solo en el almacén delta: un GrupoDelta por carpeta en toda la consulta
+        grupo = grupos.get(ruta_csv.parent)
+        if grupo is None:
+            grupo = grupos[ruta_csv.parent] = GrupoDelta(ruta_csv.parent, memorizar=True)
+        f = io.BytesIO(grupo.reconstruir(ruta_csv.name))
+    with f:
+        encoding, dialecto = formato_de_muestra(f.read(8192))
+        encabezado = [c.strip() for c in leer_registro(f, 0, encoding, dialecto)]
+        for offset in offsets:
+            yield dict(zip(encabezado, leer_registro(f, offset, encoding, dialecto)))
+
+
+# ----------------------------------------------------------------------
+# API del módulo
+# ----------------------------------------------------------------------
+_INDICE: Optional[IndiceBusqueda] = None
+
+
+def abrir_indice_busqueda(settings: Dict[str, Any], state_dir: str) -> IndiceBusqueda:
+    config = {**DEFAULTS_SEARCH_INDEX, **(settings.get("search_index") or {})}
+    path = config.get("path") or Path(state_dir) / "indice_busqueda.sqlite"
+    return IndiceBusqueda(path, config.get("fields"))
+
+
+def cargar_indice_busqueda(settings: Dict[str, Any], state_dir: str) -> Optional[IndiceBusqueda]:
+    global _INDICE
+    config = settings.get("search_index") or {}
+    if not config.get("enabled"):
+        _INDICE = None
+        return None
+    if _INDICE is None:
+        _INDICE = abrir_indice_busqueda(settings, state_dir)
+    return _INDICE
+
+
+def indexar_csv_final(ruta_csv, download_root: str):
+    """Gancho para cuando un CSV queda en su ruta final. No lanza excepciones."""
+    if _INDICE is None:
+        return
+    try:
+        inicio = time.time()
+        filas = _INDICE.indexar_archivo(ruta_csv, download_root)
+        if filas is not None:
+            print(f"[INDICE] {Path(ruta_csv).name}: {filas} filas indexadas en {time.time() - inicio:.2f}s")
+    except Exception as e:
+        print(f"[WARN] No se pudo indexar {ruta_csv}: {e}")
@@ -0,0 +1,298 @@
+"""
+Compilación de los XPaths configurados a una forma más barata de evaluar.
+
+Casi todos los patrones de actions_transparencia.json tienen la forma
+
+    //div[contains(@class,'A') or contains(@class,'B')]//a[<condición de texto>]
+
+donde la condición combina contains / = / not / and sobre normalize-space(.)
+o translate(normalize-space(.), 'ÁÉ..', 'áé..'). Evaluados como XPath, cada
+sondeo de WebDriverWait recorre todo el documento y traduce el texto de cada
+nodo. compilar_xpath() reconoce esa gramática y la separa en:
+
+  - un selector CSS con el mismo alcance (div[class*='A'] a, div[class*='B'] a),
+    que conserva la semántica de subcadena de contains(@class, ...);
+  - la condición de texto como árbol JSON.
+
+En el navegador, JS_BUSCAR indexa una vez por versión del DOM (un
+MutationObserver invalida el índice) los candidatos del selector CSS con su
+texto ya normalizado, y cada traducción se calcula una sola vez por índice.
+Los patrones que no encajan en la gramática se siguen evaluando como XPath.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+from selenium.webdriver.common.by import By
+
+DEFAULTS_SELECTOR_OPTIMIZER = {
+    "enabled": False,
+}
+
+_RE_SELECTOR = re.compile(
+    r"^(?://(?P<scope_tag>[a-z][a-z0-9]*)\[(?P<scope>(?:[^\[\]'\"]|'[^']*')*)\])?"
+    r"//(?P<tag>[a-z][a-z0-9]*)(?:\[(?P<cond>.*)\])?$",
+    re.S,
+)
+_RE_CLASE = re.compile(r"^contains\(\s*@class\s*,\s*'([^']*)'\s*\)$")
+_RE_TOKEN = re.compile(
+    r"\s*(?:(?P<lit>'[^']*')|(?P<norm>normalize-space\(\s*\.\s*\))|(?P<fn>not|contains|translate)\s*\("
+    r"|(?P<op>and\b|or\b)|(?P<sym>[(),=]))"
+)
+
+
+class _NoCompilable(Exception):
+    pass
+
+
+def _tokens(texto: str) -> List[Tuple[str, str]]:
+    tokens = []
+    pos = 0
+    texto = texto.strip()
+    while pos < len(texto):
+        m = _RE_TOKEN.match(texto, pos)
+        if not m or m.end() == pos:
+            raise _NoCompilable(texto[pos:pos + 30])
+        clase = m.lastgroup
+        valor = m.group(clase)
+        tokens.append((clase, valor[1:-1] if clase == "lit" else valor))
+        pos = m.end()
+        while pos < len(texto) and texto[pos].isspace():
+            pos += 1
+    return tokens
+
+
+class _Parser:
+    """Descenso recursivo sobre el subconjunto de XPath 1.0 que usan los patrones."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.i = 0
+
+    def _ver(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else (None, None)
+
+    def _tomar(self, clase=None, valor=None):
+        tok = self._ver()
+        if (clase and tok[0] != clase) or (valor and tok[1] != valor):
+            raise _NoCompilable(f"se esperaba {valor or clase}, llegó {tok}")
+        self.i += 1
+        return tok[1]
+
+    def condicion(self):
+        nodo = self.conjuncion()
+        if self._ver() != (None, None):
+            raise _NoCompilable(f"sobra {self._ver()}")
+        return nodo
+
+    def conjuncion(self):
+        terminos = [self.termino()]
+        while self._ver() == ("op", "and"):
+            self._tomar("op", "and")
+            terminos.append(self.termino())
+        return terminos[0] if len(terminos) == 1 else ["and", terminos]
+
+    def termino(self):
+        clase, valor = self._ver()
+        if clase == "fn" and valor == "not":
+            self._tomar()
+            nodo = self.conjuncion()
+            self._tomar("sym", ")")
+            return ["not", nodo]
+        if clase == "fn" and valor == "contains":
+            self._tomar()
+            texto = self.texto()
+            self._tomar("sym", ",")
+            literal = self._tomar("lit")
+            self._tomar("sym", ")")
+            return ["contains", texto, literal]
+        texto = self.texto()
+        self._tomar("sym", "=")
+        return ["eq", texto, self._tomar("lit")]
+
+    def texto(self):
+        clase, valor = self._ver()
+        if clase == "norm":
+            self._tomar()
+            return ["norm"]
+        if clase == "fn" and valor == "translate":
+            self._tomar()
+            self._tomar("norm")
+            self._tomar("sym", ",")
+            desde = self._tomar("lit")
+            self._tomar("sym", ",")
+            hacia = self._tomar("lit")
+            self._tomar("sym", ")")
+            return ["tr", desde, hacia]
+        raise _NoCompilable(f"expresión de texto no soportada: {valor}")
+
+
+@lru_cache(maxsize=2048)
+def _compilar(xpath: str) -> Optional[Tuple[str, str, Any]]:
+    m = _RE_SELECTOR.match(xpath.strip())
+    if not m:
+        return None
+    tag = m.group("tag")
+    try:
+        if m.group("scope_tag"):
+            clases = []
+            for parte in re.split(r"\s+or\s+", m.group("scope").strip()):
+                mc = _RE_CLASE.match(parte.strip())
+                if not mc or "'" in mc.group(1) or '"' in mc.group(1):
+                    return None
+                clases.append(mc.group(1))
+            css = ", ".join(f"{m.group('scope_tag')}[class*=\"{c}\"] {tag}" for c in clases)
+            xpath_base = " | ".join(f"//{m.group('scope_tag')}[contains(@class, '{c}')]//{tag}" for c in clases)
+        else:
+            css = tag
+            xpath_base = f"//{tag}"
+        cond = _Parser(_tokens(m.group("cond"))).condicion() if m.group("cond") else None
+    except _NoCompilable:
+        return None
+    return css, xpath_base, cond
+
+
+def compilar_xpath(xpath: str) -> Optional[Dict[str, Any]]:
+    """{"css", "xpath_base", "cond"} si el XPath entra en la gramática, si no None."""
+    compilado = _compilar(xpath)
+    if compilado is None:
+        return None
+    css, xpath_base, cond = compilado
+    return {"css": css, "xpath_base": xpath_base, "cond": cond}
+
+
+# ----------------------------------------------------------------------
+# Evaluación en el navegador
+# ----------------------------------------------------------------------
+JS_BUSCAR = r"""
+const spec = arguments[0];
+const st = window.__pdtSel || (window.__pdtSel = {ver: 0, idx: {}});
+if (!st.obs && document.documentElement) {
+  st.obs = new MutationObserver(() => { st.ver++; });
+  st.obs.observe(document.documentElement, {subtree: true, childList: true,
+                                            characterData: true, attributes: true,
+                                            attributeFilter: ['class']});
+}
+let ent = st.idx[spec.css];
+if (!ent || ent.ver !== st.ver) {
+  const els = Array.from(document.querySelectorAll(spec.css));
+  ent = st.idx[spec.css] = {
+    ver: st.ver, els: els, tr: {},
+    norm: els.map(e => (e.textContent || '').replace(/[\x20\t\r\n]+/g, ' ').replace(/^ | $/g, '')),
+  };
+}
+function traducir(s, desde, hacia) {
+  let out = '';
+  for (const ch of s) {
+    const k = desde.indexOf(ch);
+    if (k < 0) out += ch; else if (k < hacia.length) out += hacia[k];
+  }
+  return out;
+}
+function texto(i, ex) {
+  if (ex[0] === 'norm') return ent.norm[i];
+  const clave = ex[1] + '\u0000' + ex[2];
+  let arr = ent.tr[clave];
+  if (!arr) arr = ent.tr[clave] = ent.norm.map(s => traducir(s, ex[1], ex[2]));
+  return arr[i];
+}
+function ev(i, c) {
+  switch (c[0]) {
+    case 'and': return c[1].every(x => ev(i, x));
+    case 'not': return !ev(i, c[1]);
+    case 'contains': return texto(i, c[1]).includes(c[2]);
+    case 'eq': return texto(i, c[1]) === c[2];
+  }
+  return false;
+}
+const out = [];
+for (let i = 0; i < ent.els.length; i++) {
+  if (!spec.cond || ev(i, spec.cond)) out.push(ent.els[i]);
+}
+return out;
+"""
+
+_HABILITADO = False
+
+
+def configurar_optimizador(settings: Dict[str, Any]) -> bool:
+    global _HABILITADO
+    config = {**DEFAULTS_SELECTOR_OPTIMIZER, **(settings.get("selector_optimizer") or {})}
+    _HABILITADO = bool(config.get("enabled"))
+    return _HABILITADO
+
+
+def optimizador_habilitado() -> bool:
+    return _HABILITADO
+
+
+def buscar_elementos(driver, xpath: str) -> list:
+    """Equivalente a driver.find_elements(By.XPATH, xpath), compilado si se puede."""
+    if _HABILITADO:
+        compilado = compilar_xpath(xpath)
+        if compilado is not None:
+            try:
+                return driver.execute_script(JS_BUSCAR, compilado) or []
+            except Exception:
+                pass
+    return driver.find_elements(By.XPATH, xpath)
+
+
+# ----------------------------------------------------------------------
+# Evaluación sobre lxml (benchmark / arnés)
+# ----------------------------------------------------------------------
+_RE_ESPACIOS = re.compile(r"[\x20\t\r\n]+")
+
+
+def _normalizar(s: str) -> str:
+    """normalize-space() de XPath: solo colapsa espacio, tab, CR y LF."""
+    return _RE_ESPACIOS.sub(" ", s).strip("\x20\t\r\n")
+
+
+def _traducir(s: str, desde: str, hacia: str) -> str:
+    tabla = {}
+    for k, ch in enumerate(desde):
+        if ord(ch) not in tabla:
+            tabla[ord(ch)] = hacia[k] if k < len(hacia) else None
+    return s.translate(tabla)
+
+
+class IndiceLxml:
+    """Índice por documento: candidatos del alcance con su texto normalizado y traducciones cacheadas."""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._entradas: Dict[str, Dict[str, Any]] = {}
+
+    def _entrada(self, xpath_base: str) -> Dict[str, Any]:
+        ent = self._entradas.get(xpath_base)
+        if ent is None:
+            els = self.doc.xpath(xpath_base)
+            ent = self._entradas[xpath_base] = {
+                "els": els, "tr": {},
+                "norm": [_normalizar(e.xpath("string(.)")) for e in els],
+            }
+        return ent
+
+    def buscar(self, compilado: Dict[str, Any]) -> list:
+        ent = self._entrada(compilado["xpath_base"])
+
+        def texto(i, ex):
+            if ex[0] == "norm":
+                return ent["norm"][i]
+            clave = (ex[1], ex[2])
+            if clave not in ent["tr"]:
+                ent["tr"][clave] = [_traducir(s, ex[1], ex[2]) for s in ent["norm"]]
+            return ent["tr"][clave][i]
+
+        def ev(i, c):
+            if c[0] == "and":
+                return all(ev(i, x) for x in c[1])
+            if c[0] == "not":
+                return not ev(i, c[1])
+            if c[0] == "contains":
+                return c[2] in texto(i, c[1])
+            return texto(i, c[1]) == c[2]
+
+        cond = compilado["cond"]
+        return [e for i, e in enumerate(ent["els"]) if cond is None or ev(i, cond)]
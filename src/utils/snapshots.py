@@ -0,0 +1,81 @@
+"""
+Snapshots HTML de las páginas del portal.
+
+Cada snapshot es el DOM actual (driver.page_source) precedido de una línea de
+comentario con el contexto en que se tomó, p. ej.:
+
+    <!-- pdt-snapshot {"org": "MU001", "paso": "anio", "year": 2023, "mes": null, ...} -->
+
+Ese encabezado lo usa src/selector_harness.py para expandir {YEAR}/{MONTH}
+al evaluar los XPaths de actions_transparencia.json sin navegador.
+"""
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+PREFIJO_ENCABEZADO = "<!-- pdt-snapshot "
+SUFIJO_ENCABEZADO = " -->"
+
+DEFAULTS_SNAPSHOTS = {
+    "on_failure": True,
+    "every_step": False,
+    "dir": "snapshots",
+}
+
+_CONFIG: Dict[str, Any] = dict(DEFAULTS_SNAPSHOTS)
+
+
+def configurar_snapshots(settings: Dict[str, Any]):
+    global _CONFIG
+    _CONFIG = {**DEFAULTS_SNAPSHOTS, **(settings.get("snapshots") or {})}
+
+
+def guardar_snapshot(driver, org_code: str, paso: str, year: Optional[int] = None,
+                     mes: Optional[str] = None, tipo: Optional[str] = None) -> Optional[Path]:
+    """Guarda el HTML actual con su contexto. Nunca lanza excepciones."""
+    try:
+        carpeta = Path(_CONFIG["dir"])
+        carpeta.mkdir(parents=True, exist_ok=True)
+        marca = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        filename = carpeta / f"{org_code}_{paso}_{marca}.html"
+
+        contexto = {
+            "org": org_code,
+            "paso": paso,
+            "tipo": tipo,
+            "year": year,
+            "mes": mes,
+            "url": driver.current_url,
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+        }
+        encabezado = PREFIJO_ENCABEZADO + json.dumps(contexto, ensure_ascii=False) + SUFIJO_ENCABEZADO
+        filename.write_text(encabezado + "\n" + driver.page_source, encoding="utf-8")
+        return filename
+    except Exception as e:
+        print(f"[WARN] ({org_code}) No se pudo guardar snapshot HTML '{paso}': {e}")
+        return None
+
+
+def snapshot_fallo(driver, org_code: str, sufijo: str, **contexto):
+    if _CONFIG.get("on_failure"):
+        guardar_snapshot(driver, org_code, sufijo, **contexto)
+
+
+def snapshot_paso(driver, org_code: str, paso: str, **contexto):
+    if _CONFIG.get("every_step"):
+        guardar_snapshot(driver, org_code, paso, **contexto)
+
+
+def leer_snapshot(path: Path):
+    """Devuelve (contexto, html) de un snapshot; contexto vacío si no tiene encabezado."""
+    texto = Path(path).read_text(encoding="utf-8", errors="ignore")
+    contexto: Dict[str, Any] = {}
+    if texto.startswith(PREFIJO_ENCABEZADO):
+        linea, _, resto = texto.partition("\n")
+        try:
+            contexto = json.loads(linea[len(PREFIJO_ENCABEZADO):-len(SUFIJO_ENCABEZADO)])
+            texto = resto
+        except ValueError:
+            pass
+    return contexto, texto
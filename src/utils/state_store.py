@@ -0,0 +1,31 @@
+"""
+Lectura/escritura de archivos JSON de estado persistente en STATE_DIR.
+
+La escritura es atómica (archivo temporal + os.replace) para que una
+interrupción a mitad de ejecución no deje un JSON truncado.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+
+def leer_json(path, default: Any = None) -> Any:
+    path = Path(path)
+    if not path.exists():
+        return default
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] No se pudo leer estado {path}: {e}. Se usa valor por defecto.")
+        return default
+
+
+def guardar_json(path, data: Any):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporal = path.with_suffix(path.suffix + ".tmp")
+    with temporal.open("w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, path)
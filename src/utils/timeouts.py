@@ -0,0 +1,157 @@
+"""
+Timeouts aprendidos de la latencia observada y presupuesto por tarea.
+
+GestorTimeouts guarda las últimas latencias exitosas de cada paso
+("page_load", "carga_espera", "tipo", "area", "anio", "mes", "csv",
+"csv_espera"), globales y por municipio, en STATE_DIR/latencias.json. El
+timeout de un paso es:
+
+    clamp(percentil(latencias) * factor + margen, min_timeout, max_timeout)
+
+usando las muestras del municipio si hay suficientes, si no las globales del
+paso, y si tampoco hay, el valor fijo de siempre. Cuando un paso se agota, el
+timeout usado por `timeout_backoff` entra como muestra del municipio (no de
+las globales): un municipio lento deja de heredar el percentil de los rápidos
+y sus timeouts crecen hasta max_timeout.
+
+Presupuesto limita el tiempo total de una tarea (org, año): ningún timeout
+puede exceder lo que queda del presupuesto y, al agotarse, procesar_municipio
+deja los meses restantes para la próxima ejecución.
+"""
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from .metrics import registrar_latencia_metrica
+from .state_store import leer_json, guardar_json
+
+DEFAULTS_TIMEOUTS = {
+    "enabled": False,
+    "percentile": 0.95,
+    "factor": 1.5,
+    "margin": 0.5,
+    "min_samples": 10,
+    "min_timeout": 0.5,
+    "max_timeout": 60,
+    "max_samples": 100,
+    "timeout_backoff": 1.5,
+    "task_budget_s": None,
+}
+
+
+class Presupuesto:
+    def __init__(self, segundos: float):
+        self.segundos = float(segundos)
+        self.inicio = time.time()
+
+    def restante(self) -> float:
+        return max(0.0, self.segundos - (time.time() - self.inicio))
+
+    def agotado(self) -> bool:
+        return self.restante() <= 0
+
+
+class GestorTimeouts:
+    def __init__(self, path: Path, config: Dict[str, Any]):
+        self.path = Path(path)
+        self.percentil = float(config["percentile"])
+        self.factor = float(config["factor"])
+        self.margen = float(config["margin"])
+        self.min_muestras = int(config["min_samples"])
+        self.min_timeout = float(config["min_timeout"])
+        self.max_timeout = float(config["max_timeout"])
+        self.max_muestras = int(config["max_samples"])
+        self.backoff = float(config["timeout_backoff"])
+
+        guardadas = leer_json(self.path, default={}) or {}
+        self.muestras: Dict[str, deque] = {
+            clave: deque(valores, maxlen=self.max_muestras) for clave, valores in guardadas.items()
+        }
+        self._sucio = False
+
+    def _agregar(self, clave: str, segundos: float):
+        if clave not in self.muestras:
+            self.muestras[clave] = deque(maxlen=self.max_muestras)
+        self.muestras[clave].append(round(segundos, 3))
+        self._sucio = True
+
+    def registrar(self, paso: str, org_code: Optional[str], segundos: float):
+        self._agregar(paso, segundos)
+        if org_code:
+            self._agregar(f"{paso}|{org_code}", segundos)
+
+    def registrar_timeout(self, paso: str, org_code: Optional[str], timeout: float):
+        """El paso se agotó tras `timeout` s: la latencia real fue al menos esa."""
+        if org_code:
+            self._agregar(f"{paso}|{org_code}", min(self.max_timeout, timeout * self.backoff))
+
+    def _desde_muestras(self, clave: str) -> Optional[float]:
+        valores = self.muestras.get(clave)
+        if not valores or len(valores) < self.min_muestras:
+            return None
+        ordenados = sorted(valores)
+        idx = min(len(ordenados) - 1, int(round(self.percentil * (len(ordenados) - 1))))
+        return ordenados[idx] * self.factor + self.margen
+
+    def timeout(self, paso: str, org_code: Optional[str], default: float) -> float:
+        aprendido = None
+        if org_code:
+            aprendido = self._desde_muestras(f"{paso}|{org_code}")
+        if aprendido is None:
+            aprendido = self._desde_muestras(paso)
+        if aprendido is None:
+            return default
+        return min(self.max_timeout, max(self.min_timeout, aprendido))
+
+    def guardar(self):
+        if self._sucio:
+            guardar_json(self.path, {clave: list(v) for clave, v in self.muestras.items()})
+            self._sucio = False
+
+
+_GESTOR: Optional[GestorTimeouts] = None
+_CONFIG: Dict[str, Any] = dict(DEFAULTS_TIMEOUTS)
+
+
+def cargar_gestor_timeouts(settings: Dict[str, Any], state_dir: str) -> Optional[GestorTimeouts]:
+    global _GESTOR, _CONFIG
+    _CONFIG = {**DEFAULTS_TIMEOUTS, **(settings.get("adaptive_timeouts") or {})}
+    if not _CONFIG.get("enabled"):
+        _GESTOR = None
+        return None
+    path = Path(state_dir) / "latencias.json"
+    if _GESTOR is None or _GESTOR.path != path:
+        _GESTOR = GestorTimeouts(path, _CONFIG)
+    return _GESTOR
+
+
+def crear_presupuesto() -> Optional[Presupuesto]:
+    """Presupuesto para una tarea (org, año) según adaptive_timeouts.task_budget_s."""
+    segundos = _CONFIG.get("task_budget_s")
+    return Presupuesto(segundos) if segundos else None
+
+
+def timeout_para(paso: str, org_code: Optional[str], default: float,
+                 presupuesto: Optional[Presupuesto] = None) -> float:
+    valor = _GESTOR.timeout(paso, org_code, default) if _GESTOR is not None else default
+    if presupuesto is not None:
+        # Nunca esperar más de lo que queda, pero dejar un mínimo para no fallar en seco
+        valor = min(valor, max(presupuesto.restante(), 0.1))
+    return valor
+
+
+def registrar_latencia(paso: str, org_code: Optional[str], segundos: float):
+    registrar_latencia_metrica(paso, segundos)
+    if _GESTOR is not None:
+        _GESTOR.registrar(paso, org_code, segundos)
+
+
+def registrar_timeout(paso: str, org_code: Optional[str], timeout: float):
+    if _GESTOR is not None:
+        _GESTOR.registrar_timeout(paso, org_code, timeout)
+
+
+def guardar_latencias():
+    if _GESTOR is not None:
+        _GESTOR.guardar()
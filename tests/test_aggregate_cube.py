@@ -0,0 +1,24 @@
+import pytest
+
+from src.utils.aggregate_cube import parsear_monto
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("$ 1.234.567", 1234567.0),
+    ("1.234.567", 1234567.0),
+    ("1234567,5", 1234567.5),
+    ("1.234.567,89", 1234567.89),
+    ("1,234,567", 1234567.0),
+    ("1,5", 1.5),
+    ("1.5", 1.5),
+    ("-2.000", -2000.0),
+    ("850000", 850000.0),
+    (" $850.000 ", 850000.0),
+])
+def test_parsear_monto(texto, esperado):
+    assert parsear_monto(texto) == esperado
+
+
+@pytest.mark.parametrize("texto", [None, "", "   ", "N/A", "$", "-"])
+def test_parsear_monto_sin_numero(texto):
+    assert parsear_monto(texto) is None
@@ -0,0 +1,73 @@
+from src.utils import delta_store
+from src.utils.delta_store import DEFAULTS_DELTA_STORE, GrupoDelta, almacenar_csv, leer_csv, nombres_en_delta
+
+MESES = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto"]
+
+
+def _csv_mes(mes: str, bajas=(), altas=()) -> bytes:
+    filas = ["Apellido paterno;Apellido materno;Nombres;Mes;Remuneración bruta"]
+    filas += [f"Pérez;Soto;Persona {i};{mes};{1000 + i}" for i in range(40) if i not in bajas]
+    filas += [f"Nueva;Alta;Persona {i};{mes};500" for i in altas]
+    return ("\r\n".join(filas) + "\r\n").encode("latin-1")
+
+
+def _config(**cambios):
+    return {**DEFAULTS_DELTA_STORE, "enabled": True, **cambios}
+
+
+def test_ida_y_vuelta_exacta_y_borra_el_crudo(tmp_path):
+    datos = {"Enero": _csv_mes("Enero"), "Febrero": _csv_mes("Febrero", bajas=[3], altas=[90])}
+    for mes, contenido in datos.items():
+        ruta = tmp_path / f"MU001_PLANTA_2023_{mes}.csv"
+        ruta.write_bytes(contenido)
+        assert almacenar_csv(ruta, _config())
+        assert not ruta.exists()
+
+    assert set(nombres_en_delta(tmp_path)) == {f"MU001_PLANTA_2023_{m}.csv" for m in datos}
+    for mes, contenido in datos.items():
+        assert leer_csv(tmp_path / f"MU001_PLANTA_2023_{mes}.csv") == contenido
+
+    grupo = GrupoDelta(tmp_path)
+    febrero = grupo.meses["MU001_PLANTA_2023_Febrero.csv"]
+    assert febrero["ref"] == "MU001_PLANTA_2023_Enero.csv"
+    assert febrero["cambios"] == {"altas": 1, "bajas": 1, "modificados": 0}
+
+
+def test_recodifica_el_grupo_si_cambia_un_mes_referenciado(tmp_path):
+    grupo = GrupoDelta(tmp_path)
+    originales = {m: _csv_mes(m) for m in MESES[:3]}
+    for mes, contenido in originales.items():
+        grupo.agregar(f"{mes}.csv", contenido, _config())
+    grupo.guardar()
+
+    enero_corregido = _csv_mes("Enero", bajas=[0, 1])
+    grupo = GrupoDelta(tmp_path)
+    grupo.agregar("Enero.csv", enero_corregido, _config())
+    grupo.guardar()
+
+    grupo = GrupoDelta(tmp_path)
+    assert grupo.manifiesto["orden"] == ["Enero.csv", "Febrero.csv", "Marzo.csv"]
+    assert grupo.reconstruir("Enero.csv", desde_disco=True) == enero_corregido
+    assert grupo.reconstruir("Febrero.csv", desde_disco=True) == originales["Febrero"]
+    assert grupo.reconstruir("Marzo.csv", desde_disco=True) == originales["Marzo"]
+    # guardar() borra los archivos que la recodificación dejó sin referencia
+    vigentes = {e["archivo"] for e in grupo.meses.values()} | {"manifest.json"}
+    assert {a.name for a in grupo.dir.iterdir()} == vigentes
+
+
+def test_max_chain_corta_la_cadena_con_una_base(tmp_path):
+    grupo = GrupoDelta(tmp_path)
+    for mes in MESES[:7]:
+        grupo.agregar(f"{mes}.csv", _csv_mes(mes), _config(max_chain=3))
+    grupo.guardar()
+
+    refs = [grupo.meses[f"{m}.csv"]["ref"] for m in MESES[:7]]
+    assert refs == [None, "Enero.csv", "Febrero.csv", None, "Abril.csv", "Mayo.csv", None]
+    for mes in MESES[:7]:
+        assert GrupoDelta(tmp_path).reconstruir(f"{mes}.csv", desde_disco=True) == _csv_mes(mes)
+
+
+def test_solo_recuerda_el_ultimo_grupo_escrito(tmp_path):
+    for carpeta in ("a", "b"):
+        GrupoDelta(tmp_path / carpeta).agregar("Enero.csv", _csv_mes("Enero"), _config())
+    assert delta_store._ULTIMO[0] == str(tmp_path / "b" / delta_store.CARPETA_DELTA)
@@ -0,0 +1,74 @@
+from src.utils import download_journal
+from src.utils.download_journal import DiarioDescargas, _rehacer, recuperar_descargas
+
+
+def _entrada(root, descargas, **extra):
+    return {"id": "x", "dir": str(descargas), "org": "MU001", "tipo": "PLANTA", "year": 2023,
+            "mes": "Enero", **extra}
+
+
+def _final(root):
+    return root / "MU001" / "PLANTA" / "2023" / "MU001_PLANTA_2023_Enero.csv"
+
+
+def test_rehace_desde_el_csv_que_quedo_en_la_carpeta_de_descargas(tmp_path):
+    descargas = tmp_path / "_prefetch" / "abc"
+    descargas.mkdir(parents=True)
+    (descargas / "export.csv").write_bytes(b"a;b\n1;2\n")
+    assert _rehacer(_entrada(tmp_path, descargas), str(tmp_path)) == "rehecha"
+    assert _final(tmp_path).read_bytes() == b"a;b\n1;2\n"
+    assert not (descargas / "export.csv").exists()
+
+
+def test_rehace_la_copia_interrumpida_y_borra_el_tmp(tmp_path):
+    apartado = tmp_path / "_postproceso" / "MU001_PLANTA_2023_Enero_x.csv"
+    apartado.parent.mkdir()
+    apartado.write_bytes(b"a;b\n1;2\n")
+    final = _final(tmp_path)
+    final.parent.mkdir(parents=True)
+    tmp = final.with_suffix(".tmp")
+    tmp.write_bytes(b"a;b\n")  # copia a medias
+    final.write_bytes(b"")  # final vacío de un corte anterior
+    entrada = _entrada(tmp_path, tmp_path, origen=str(apartado), tmp=str(tmp), final=str(final))
+
+    assert _rehacer(entrada, str(tmp_path)) == "rehecha"
+    assert final.read_bytes() == b"a;b\n1;2\n"
+    assert not tmp.exists() and not apartado.exists()
+
+
+def test_final_ya_completo_y_descarga_perdida(tmp_path):
+    final = _final(tmp_path)
+    final.parent.mkdir(parents=True)
+    final.write_bytes(b"a;b\n1;2\n")
+    descargas = tmp_path / "d"
+    descargas.mkdir()
+    assert _rehacer(_entrada(tmp_path, descargas), str(tmp_path)) == "completa"
+
+    final.unlink()
+    (descargas / "a.csv").write_bytes(b"x\n")
+    (descargas / "b.csv").write_bytes(b"y\n")  # dos candidatos: no se sabe cuál es
+    assert _rehacer(_entrada(tmp_path, descargas), str(tmp_path)) == "descartada"
+    assert not final.exists()
+
+
+def test_recuperar_lee_el_diario_y_lo_trunca(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_journal, "_DIARIO", None)
+    root, estado = tmp_path / "raw", tmp_path / "estado"
+    descargas = root / "_prefetch" / "abc"
+    descargas.mkdir(parents=True)
+    diario = DiarioDescargas(estado / "diario_descargas.jsonl")
+    terminada = diario.iniciar(root, "MU002", "PLANTA", 2023, "Enero")
+    diario.terminar(terminada, True)
+    diario.iniciar(descargas, "MU001", "PLANTA", 2023, "Enero")
+    (descargas / "export.csv").write_bytes(b"a;b\n1;2\n")
+    (root / "otra.crdownload").write_bytes(b"...")
+    (root / "_postproceso").mkdir()
+    (root / "_postproceso" / "MU003_PLANTA_2023_Enero_1700000000000.csv").write_bytes(b"a;b\n1;2\n")
+
+    conteo = recuperar_descargas(str(root), str(estado))
+    assert conteo == {"completa": 0, "rehecha": 1, "descartada": 0, "temporales": 2,
+                      "rutas": [str(_final(root))]}
+    assert not any((root / "_postproceso").iterdir())
+    assert _final(root).exists()
+    assert not descargas.exists()
+    assert (estado / "diario_descargas.jsonl").read_text() == ""
@@ -0,0 +1,43 @@
+from src.utils.historico import dividir_por_mes
+
+CALENDARIO = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio",
+              "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+
+
+def test_mes_numerico_usa_el_numero_del_calendario():
+    datos = (b"Anio;Mes;Nombre\r\n"
+             b"2023;1;Ana\r\n"
+             b"2023;03;Luis\r\n"
+             b"2023;4;Bea\r\n"
+             b"2023;12;Eva\r\n")
+    # Lista parcial y en orden inverso, como la que arma la prioridad por recencia
+    partes = dividir_por_mes(datos, CALENDARIO, 2023, meses=["Diciembre", "Abril", "Marzo"])
+
+    assert set(partes) == {"Diciembre", "Abril", "Marzo"}
+    assert partes["Marzo"] == b"Anio;Mes;Nombre\r\n2023;03;Luis\r\n"
+    assert partes["Abril"] == b"Anio;Mes;Nombre\r\n2023;4;Bea\r\n"
+    assert partes["Diciembre"] == b"Anio;Mes;Nombre\r\n2023;12;Eva\r\n"
+
+
+def test_nombres_de_mes_filtro_por_anio_y_bytes_originales():
+    datos = ("Año;Mes;Nombre;Remuneración bruta\r\n"
+             "2023;Enero;Ana;100\r\n"
+             "2023;febrero;\"Luis; J\";200\r\n"
+             "2022;Enero;X;1\r\n"
+             "2023;ENERO;Bea;300").encode("latin-1")
+    partes = dividir_por_mes(datos, CALENDARIO, 2023)
+
+    encabezado = "Año;Mes;Nombre;Remuneración bruta\r\n".encode("latin-1")
+    assert partes["Enero"] == encabezado + b"2023;Enero;Ana;100\r\n2023;ENERO;Bea;300\r\n"
+    assert partes["Febrero"] == encabezado + b"2023;febrero;\"Luis; J\";200\r\n"
+
+
+def test_sin_columna_de_mes():
+    assert dividir_por_mes(b"a,b\n1,2\n", CALENDARIO, 2023) == {}
+
+
+def test_sin_columna_de_anio_solo_si_se_confirma_un_solo_anio():
+    datos = b"Mes;Nombre\r\nEnero;Ana\r\nEnero;Luis\r\n"
+    # Sin año no se sabe si las dos filas de enero son del mismo año
+    assert dividir_por_mes(datos, CALENDARIO, 2023) == {}
+    assert dividir_por_mes(datos, CALENDARIO, 2023, un_solo_anio=True) == {"Enero": datos}
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+
+from src.utils.negative_cache import CacheNegativa, cargar_cache_negativa
+
+
+def test_registrar_limpiar_y_persistir(tmp_path):
+    path = tmp_path / "cache_negativa.json"
+    cache = CacheNegativa(path)
+    cache.registrar_ausente("MU001", "PLANTA", 2020)
+    cache.registrar_ausente("MU001", "PLANTA", 2021, "Marzo")
+    assert cache.esta_ausente("MU001", "PLANTA", 2020)
+    assert cache.esta_ausente("MU001", "PLANTA", 2021, "Marzo")
+    assert not cache.esta_ausente("MU001", "PLANTA", 2021)
+    assert not cache.esta_ausente("MU001", "CONTRATA", 2020)
+    cache.guardar()
+
+    cache = CacheNegativa(path)
+    assert cache.esta_ausente("MU001", "PLANTA", 2021, "Marzo")
+    cache.limpiar("MU001", "PLANTA", 2021, "Marzo")
+    cache.guardar()
+    assert not CacheNegativa(path).esta_ausente("MU001", "PLANTA", 2021, "Marzo")
+
+
+def test_vence_con_ttl_mas_corto_para_el_anio_en_curso(tmp_path):
+    cache = CacheNegativa(tmp_path / "c.json", ttl_days=30, ttl_days_anio_actual=3)
+    hace_10_dias = (datetime.now() - timedelta(days=10)).isoformat(timespec="seconds")
+    actual, anterior = datetime.now().year, datetime.now().year - 1
+    cache.entradas[f"MU001|PLANTA|{actual}"] = hace_10_dias
+    cache.entradas[f"MU001|PLANTA|{anterior}"] = hace_10_dias
+    assert not cache.esta_ausente("MU001", "PLANTA", actual)
+    assert cache.esta_ausente("MU001", "PLANTA", anterior)
+
+
+def test_desactivada_por_defecto(tmp_path):
+    assert cargar_cache_negativa({}, str(tmp_path)) is None
+    assert cargar_cache_negativa({"negative_cache": {"enabled": True}}, str(tmp_path)) is not None
+    cargar_cache_negativa({}, str(tmp_path))
@@ -0,0 +1,50 @@
+from src.query import iter_files, iter_records
+from src.utils.delta_store import DEFAULTS_DELTA_STORE, almacenar_csv
+
+
+def _escribir(root, org, tipo, year, mes, texto, encoding="utf-8"):
+    carpeta = root / org / tipo / str(year)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    ruta = carpeta / f"{org}_{tipo}_{year}_{mes}.csv"
+    ruta.write_bytes(texto.encode(encoding))
+    return ruta
+
+
+def _arbol(root):
+    _escribir(root, "MU001", "PLANTA", 2023, "Enero", "Nombres;Cargo o función\r\nAna;Alcaldesa\r\nLuis;Chofer\r\n")
+    _escribir(root, "MU001", "PLANTA", 2023, "Febrero", "Nombres;Cargo o función\r\nAna;Alcaldesa\r\n")
+    _escribir(root, "MU001", "CONTRATA", 2023, "Enero", "Nombres,Cargo o función\nBea,Abogada\n")
+    _escribir(root, "MU002", "PLANTA", 2022, "Enero", "Nombres;Cargo o función\r\nEva;Director\r\n",
+              encoding="latin-1")
+    (root / "_postproceso").mkdir()
+    (root / "MU001" / "PLANTA" / "2023" / "otro.txt").write_text("x")
+
+
+def test_filtros_de_particion_y_proyeccion(tmp_path):
+    _arbol(tmp_path)
+    filas = list(iter_records(orgs=["mu001"], tipos=["PLANTA"], months=["enero"],
+                              columns=["Nombres", "Grado"], root=str(tmp_path)))
+    assert filas == [
+        {"Nombres": "Ana", "Grado": None, "_org": "MU001", "_tipo": "PLANTA", "_year": 2023, "_mes": "Enero"},
+        {"Nombres": "Luis", "Grado": None, "_org": "MU001", "_tipo": "PLANTA", "_year": 2023, "_mes": "Enero"},
+    ]
+
+
+def test_where_separadores_y_encodings(tmp_path):
+    _arbol(tmp_path)
+    cargos = [f["Cargo o función"] for f in iter_records(root=str(tmp_path), include_partition=False)]
+    assert sorted(cargos) == ["Abogada", "Alcaldesa", "Alcaldesa", "Chofer", "Director"]
+
+    filas = list(iter_records(years=[2023], where=lambda f: f["_mes"] == "Febrero", root=str(tmp_path)))
+    assert [(f["Nombres"], f["_tipo"]) for f in filas] == [("Ana", "PLANTA")]
+
+
+def test_meses_guardados_solo_en_el_almacen_delta(tmp_path):
+    _arbol(tmp_path)
+    ruta = tmp_path / "MU001" / "PLANTA" / "2023" / "MU001_PLANTA_2023_Febrero.csv"
+    assert almacenar_csv(ruta, {**DEFAULTS_DELTA_STORE, "enabled": True})
+    assert not ruta.exists()
+
+    assert [a.mes for a in iter_files(orgs=["MU001"], tipos=["PLANTA"], root=str(tmp_path))] == ["Enero", "Febrero"]
+    filas = list(iter_records(orgs=["MU001"], tipos=["PLANTA"], months=["Febrero"], root=str(tmp_path)))
+    assert [f["Nombres"] for f in filas] == ["Ana"]
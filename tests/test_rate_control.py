@@ -0,0 +1,41 @@
+from src.utils.rate_control import ControladorAIMD
+
+CONFIG = {"enabled": True, "min_workers": 1, "max_workers": 8, "initial_workers": 4,
+          "min_delay": 0.0, "max_delay": 4.0, "delay_step": 0.5, "latency_target": 8.0,
+          "download_latency_target": 30.0, "max_error_rate": 0.2, "decrease_factor": 0.5,
+          "window": 5}
+
+
+def _registrar(controlador, paso, latencia, ok=True, veces=5):
+    for _ in range(veces):
+        controlador.registrar(paso, latencia, ok)
+
+
+def test_sube_de_a_uno_si_todo_va_bien():
+    c = ControladorAIMD(CONFIG)
+    _registrar(c, "carga", 2.0)
+    assert c.workers == 5 and c.delay == 0.0
+
+
+def test_baja_multiplicativo_por_errores_y_duplica_el_espaciado():
+    c = ControladorAIMD(CONFIG)
+    _registrar(c, "carga", 2.0, ok=False, veces=2)
+    _registrar(c, "carga", 2.0, veces=3)
+    assert c.workers == 2 and c.delay == 0.5
+    _registrar(c, "carga", 2.0, ok=False)
+    assert c.workers == 1 and c.delay == 1.0
+    _registrar(c, "carga", 2.0, ok=False)
+    assert c.workers == 1 and c.delay == 2.0  # nunca por debajo de min_workers
+
+
+def test_cada_paso_con_su_ventana_y_su_objetivo():
+    c = ControladorAIMD(CONFIG)
+    # 20 s es lento para una carga pero normal para una descarga
+    _registrar(c, "descarga", 20.0)
+    assert c.workers == 5
+    _registrar(c, "carga", 2.0, veces=4)
+    _registrar(c, "descarga", 20.0, veces=4)
+    assert c.workers == 5  # ninguna ventana se completó todavía
+    c.registrar("carga", 20.0, True)
+    assert c.workers == 2  # p90 de la ventana de carga sobre 8 s
+
@@ -0,0 +1,87 @@
+import pytest
+
+from src.utils import schema_registry
+from src.utils.schema_registry import (RegistroEsquemas, alias_canonicos, cargar_registro_esquemas,
+                                       huella_encabezado, normalizar_columna)
+
+ESQUEMA = {"columns": {"nombres": ["nombre", "nombre completo"],
+                       "cargo": ["cargo o funcion"],
+                       "remuneracion_bruta": ["remuneracion bruta mensualizada"]}}
+
+
+def test_normalizar_columna_y_huella():
+    assert normalizar_columna(" Remuneración Bruta  Mensualizada ") == "remuneracion bruta mensualizada"
+    assert normalizar_columna("Cargo o función") == "cargo o funcion"
+    assert huella_encabezado(["Nombres", "Cargo o función"]) == huella_encabezado(["NOMBRES ", "cargo o funcion"])
+    assert huella_encabezado(["Nombres", "Cargo"]) != huella_encabezado(["Cargo", "Nombres"])
+
+
+def test_alias_del_registro_igual_a_los_canonicos(tmp_path):
+    assert RegistroEsquemas(str(tmp_path)).alias == alias_canonicos()
+
+
+def test_compila_el_mapeo_una_vez_por_variante(tmp_path):
+    registro = RegistroEsquemas(str(tmp_path), ESQUEMA)
+    huella = registro.registrar_encabezado(["Nombre", "Cargo o Función", "Otra", "Nombres"])
+    variante = registro.variantes[huella]
+    # La segunda columna que cae en "nombres" queda sin mapear
+    assert variante["mapeo"] == ["nombres", "cargo", None, None]
+    assert variante["sin_mapear"] == ["Otra", "Nombres"]
+    assert variante["faltantes"] == ["remuneracion_bruta"]
+    assert registro.mapeo(huella).aplicar(["Ana", "Alcaldesa", "x"]) == {
+        "nombres": "Ana", "cargo": "Alcaldesa", "remuneracion_bruta": None}
+
+
+def test_cuenta_cada_archivo_una_vez(tmp_path):
+    registro = RegistroEsquemas(str(tmp_path / "estado"), ESQUEMA)
+    a, b = tmp_path / "MU001_PLANTA_2023_Enero.csv", tmp_path / "MU001_PLANTA_2023_Febrero.csv"
+    a.write_text("Nombres;Cargo\nAna;Alcaldesa\n", encoding="utf-8")
+    b.write_text("Nombres;Cargo\nAna;Alcaldesa\n", encoding="utf-8")
+    huella = registro.registrar_archivo(a, str(tmp_path))
+    registro.registrar_archivo(a, str(tmp_path))
+    registro.registrar_archivo(b, str(tmp_path))
+    assert registro.variantes[huella]["archivos"] == 2
+
+    # Si el archivo se vuelve a descargar con otro encabezado, pasa a la nueva variante
+    a.write_text("Nombres;Cargo;Remuneración bruta mensualizada\nAna;Alcaldesa;1\n", encoding="utf-8")
+    nueva = registro.registrar_archivo(a, str(tmp_path))
+    assert registro.variantes[huella]["archivos"] == 1
+    assert registro.variantes[nueva]["archivos"] == 1
+    assert registro.huella_de_archivo(a, str(tmp_path)) == nueva
+
+    registro.guardar()
+    guardado = RegistroEsquemas(str(tmp_path / "estado"), ESQUEMA)
+    assert guardado.archivos == {"MU001_PLANTA_2023_Enero.csv": nueva, "MU001_PLANTA_2023_Febrero.csv": huella}
+
+
+def test_opcional_por_defecto(tmp_path, monkeypatch):
+    monkeypatch.setattr(schema_registry, "_REGISTRO", None)
+    assert cargar_registro_esquemas({}, str(tmp_path)) is None
+    assert cargar_registro_esquemas({"schema_registry": {"enabled": True}}, str(tmp_path)) is not None
+
+
+def test_consolidar_fallido_conserva_el_consolidado_anterior(tmp_path, monkeypatch):
+    from src import staging
+
+    carpeta = tmp_path / "raw" / "MU001" / "PLANTA" / "2023"
+    carpeta.mkdir(parents=True)
+    for mes in ("Enero", "Febrero"):
+        (carpeta / f"MU001_PLANTA_2023_{mes}.csv").write_text("Nombres;Cargo\nAna;Alcaldesa\n", encoding="utf-8")
+    destino = tmp_path / "staging" / "MU001" / "PLANTA" / "2023" / "MU001_PLANTA_2023.csv"
+    destino.parent.mkdir(parents=True)
+    destino.write_text("anterior\n", encoding="utf-8")
+
+    abrir_original = staging.abrir_csv
+
+    def abrir_y_fallar_en_febrero(ruta):
+        if "Febrero" in str(ruta):
+            raise OSError("disco lleno")
+        return abrir_original(ruta)
+
+    monkeypatch.setattr(staging, "abrir_csv", abrir_y_fallar_en_febrero)
+    registro = RegistroEsquemas(str(tmp_path / "estado"), ESQUEMA)
+    with pytest.raises(OSError):
+        staging.consolidar(download_root=str(tmp_path / "raw"), staging_dir=str(tmp_path / "staging"),
+                           registro=registro)
+    assert destino.read_text(encoding="utf-8") == "anterior\n"
+    assert not destino.with_suffix(".csv.tmp").exists()
@@ -0,0 +1,54 @@
+from src.utils.search_index import IndiceBusqueda, _desempaquetar, _empaquetar
+
+
+def test_empaquetar_ida_y_vuelta():
+    offsets = [0, 1, 127, 128, 129, 16_383, 16_384, 2_000_000, 2_000_001]
+    blob = _empaquetar(offsets)
+    assert _desempaquetar(blob) == offsets
+    # Diferencias chicas ocupan un byte cada una
+    assert len(_empaquetar([10, 20, 30])) == 3
+    assert _desempaquetar(b"") == []
+
+
+def _csv(*filas: str) -> bytes:
+    return ("Nombres;Apellido paterno;Cargo o función\r\n" + "".join(f + "\r\n" for f in filas)).encode("utf-8")
+
+
+def _escribir(root, org, tipo, year, mes, datos):
+    carpeta = root / org / tipo / str(year)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    ruta = carpeta / f"{org}_{tipo}_{year}_{mes}.csv"
+    ruta.write_bytes(datos)
+    return ruta
+
+
+def test_busqueda_filtra_por_particion(tmp_path):
+    root = tmp_path / "raw"
+    indice = IndiceBusqueda(tmp_path / "indice.sqlite")
+    archivos = [
+        ("MU001", "PLANTA", 2023, "Enero", _csv("Juan;Pérez;Director de obras", "Ana;Soto;Secretaria")),
+        ("MU001", "PLANTA", 2023, "Febrero", _csv("Juan;Pérez;Director de obras")),
+        ("MU002", "CONTRATA", 2022, "Enero", _csv("Juan;Pérez;Chofer")),
+    ]
+    for org, tipo, year, mes, datos in archivos:
+        assert indice.indexar_archivo(_escribir(root, org, tipo, year, mes, datos), root) is not None
+
+    todas = list(indice.buscar(root, persona="juan perez"))
+    assert sorted((f["_org"], f["_mes"]) for f in todas) == [("MU001", "Enero"), ("MU001", "Febrero"),
+                                                             ("MU002", "Enero")]
+
+    filas = list(indice.buscar(root, persona="JUAN", orgs=["mu001"], months=["Febrero"]))
+    assert [(f["_org"], f["_mes"], f["Cargo o función"]) for f in filas] == [("MU001", "Febrero", "Director de obras")]
+
+    assert list(indice.buscar(root, persona="juan", tipos=["PLANTA"], years=[2022])) == []
+    assert [f["Nombres"] for f in indice.buscar(root, cargo="director", years=[2023], months=["Enero"])] == ["Juan"]
+    indice.cerrar()
+
+
+def test_reindexar_sin_cambios_no_reescribe(tmp_path):
+    root = tmp_path / "raw"
+    ruta = _escribir(root, "MU001", "PLANTA", 2023, "Enero", _csv("Juan;Pérez;Director"))
+    indice = IndiceBusqueda(tmp_path / "indice.sqlite")
+    assert indice.indexar_archivo(ruta, root) == 1
+    assert indice.indexar_archivo(ruta, root) is None
+    indice.cerrar()
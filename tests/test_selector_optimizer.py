@@ -0,0 +1,65 @@
+from lxml import html as lxml_html
+
+from src.config import load_actions, load_settings
+from src.selector_benchmark import pagina_sintetica, xpaths_expandidos
+from src.utils.navigation_helpers import obtener_modulo_generico
+from src.utils.selector_optimizer import IndiceLxml, compilar_xpath
+
+PAGINA = """
+<html><body>
+  <div class="menu"><a>Personal de Planta</a><a>Año 2023</a></div>
+  <div class="ui-tabs tabs-content">
+    <a> Personal  a
+        Contrata </a>
+    <a>PERSONAL DE PLANTA</a>
+    <a>Municipal 2023</a>
+    <a>Registro histórico</a>
+    <a>Enero</a><a>enero 2023</a><a>Febrero</a>
+  </div>
+  <div class="ui-tabs-panel tab-content month-selector"><a>Marzo</a><span>Abril</span></div>
+</body></html>
+"""
+
+
+def _rutas(elementos):
+    return sorted(e.getroottree().getpath(e) for e in elementos)
+
+
+def _comparar(doc, xpaths):
+    indice = IndiceLxml(doc)
+    compilados = 0
+    for xp in xpaths:
+        compilado = compilar_xpath(xp)
+        if compilado is None:
+            continue
+        compilados += 1
+        assert _rutas(indice.buscar(compilado)) == _rutas(doc.xpath(xp)), xp
+    return compilados
+
+
+def test_misma_seleccion_que_lxml_en_patrones_a_mano():
+    doc = lxml_html.fromstring(PAGINA)
+    xpaths = [
+        "//a[contains(normalize-space(.), 'Personal a Contrata')]",
+        "//div[contains(@class, 'tabs-content') or contains(@class, 'tab-content')]"
+        "//a[contains(translate(normalize-space(.), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', "
+        "'abcdefghijklmnopqrstuvwxyz'), 'personal de planta')]",
+        "//div[contains(@class, 'tab-content')]//a[normalize-space(.)='Enero']",
+        "//div[contains(@class, 'tabs-content') or contains(@class, 'month-selector')]"
+        "//a[contains(normalize-space(.), 'r') and not(contains(normalize-space(.), 'histórico'))]",
+    ]
+    assert _comparar(doc, xpaths) == len(xpaths)
+
+
+def test_misma_seleccion_que_lxml_con_los_patrones_configurados():
+    settings = load_settings()
+    years = list(range(settings["start_year"], settings["end_year"] + 1))
+    doc = lxml_html.fromstring(pagina_sintetica(years, settings["months"], ruido=200))
+    xpaths = xpaths_expandidos(obtener_modulo_generico(load_actions()), years, settings["months"])
+    assert _comparar(doc, xpaths) > 0
+
+
+def test_fuera_de_la_gramatica():
+    assert compilar_xpath("//*[contains(text(), 'MUNICIPAL')]") is None
+    assert compilar_xpath("//div[@id='x']//a") is None
+    assert compilar_xpath("//a[starts-with(normalize-space(.), 'A')]") is None
@@ -0,0 +1,64 @@
+import time
+
+from src.utils import timeouts
+from src.utils.timeouts import DEFAULTS_TIMEOUTS, GestorTimeouts, Presupuesto, timeout_para
+
+CONFIG = {**DEFAULTS_TIMEOUTS, "enabled": True, "percentile": 0.9, "factor": 2.0, "margin": 0.5,
+          "min_samples": 5, "min_timeout": 1.0, "max_timeout": 20.0, "max_samples": 10}
+
+
+def test_sin_muestras_suficientes_usa_el_default(tmp_path):
+    gestor = GestorTimeouts(tmp_path / "latencias.json", CONFIG)
+    for _ in range(4):
+        gestor.registrar("anio", "MU001", 1.0)
+    assert gestor.timeout("anio", "MU001", default=7) == 7
+
+
+def test_percentil_por_municipio_y_luego_global(tmp_path):
+    gestor = GestorTimeouts(tmp_path / "latencias.json", CONFIG)
+    for s in (1.0, 1.0, 1.0, 1.0, 2.0):
+        gestor.registrar("anio", "MU001", s)
+    for s in (3.0,) * 5:
+        gestor.registrar("anio", "MU002", s)
+    # MU001: p90 de sus 5 muestras (2.0) * 2 + 0.5
+    assert gestor.timeout("anio", "MU001", default=7) == 4.5
+    # MU003 no tiene muestras propias: p90 global de las 10 (3.0) * 2 + 0.5
+    assert gestor.timeout("anio", "MU003", default=7) == 6.5
+
+
+def test_limites_y_persistencia(tmp_path):
+    path = tmp_path / "latencias.json"
+    gestor = GestorTimeouts(path, CONFIG)
+    for _ in range(5):
+        gestor.registrar("csv_espera", None, 50.0)
+        gestor.registrar("tipo", None, 0.01)
+    assert gestor.timeout("csv_espera", None, default=15) == 20.0
+    assert gestor.timeout("tipo", None, default=3) == 1.0
+    gestor.guardar()
+    assert GestorTimeouts(path, CONFIG).timeout("csv_espera", "MU001", default=15) == 20.0
+
+
+def test_el_presupuesto_acota_el_timeout(monkeypatch):
+    monkeypatch.setattr(timeouts, "_GESTOR", None)
+    presupuesto = Presupuesto(2.0)
+    assert timeout_para("mes", "MU001", 10, presupuesto) <= 2.0
+    presupuesto.inicio = time.time() - 5
+    assert presupuesto.agotado()
+    assert timeout_para("mes", "MU001", 10, presupuesto) == 0.1
+
+
+def test_los_timeouts_hacen_crecer_el_del_municipio_lento(tmp_path):
+    gestor = GestorTimeouts(tmp_path / "latencias.json", {**CONFIG, "timeout_backoff": 1.5})
+    for _ in range(5):
+        gestor.registrar("anio", "MU001", 0.5)
+    t = gestor.timeout("anio", "MU002", default=7)
+    assert t == 1.5  # MU002 hereda el p90 global de MU001
+    for _ in range(5):
+        gestor.registrar_timeout("anio", "MU002", t)
+        t = gestor.timeout("anio", "MU002", default=7)
+    assert t > 1.5
+    # El global no se contamina con los timeouts de MU002
+    assert gestor.timeout("anio", "MU003", default=7) == 1.5
+    for _ in range(10):
+        gestor.registrar_timeout("anio", "MU002", gestor.timeout("anio", "MU002", default=7))
+    assert gestor.timeout("anio", "MU002", default=7) == 20.0